@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from earnings_predictor.src.features.streaming_tfidf import default_analyzer
+
+
+# numeric filing metadata appended after the term columns
+METADATA_COLUMNS : tuple[str, ...] = ("filing year", "report lag days")
+
+_ARRAYS : tuple[str, ...] = (
+    "counts_data", "counts_indices", "counts_indptr",
+    "features_data", "features_indices", "features_indptr",
+)
+
+
+def tfidf_weights(
+        counts : sp.csr_matrix,
+        document_frequencies : np.ndarray,
+        n_documents : int,
+        max_df : float = 0.8,
+        min_df : int = 2,
+) -> sp.csr_matrix:
+    '''
+    the rows TfidfVectorizer(sublinear_tf=True, smooth_idf=True, norm="l2") fitted on the same
+    documents gives, in the counts' column order: terms outside [min_df, max_df * documents] are
+    dropped and every row is l2 normalized over the rest
+    '''
+    frequencies = document_frequencies[: counts.shape[1]]
+    kept = (frequencies >= min_df) & (frequencies <= max_df * n_documents)
+    idf = np.log((1 + n_documents) / (1 + frequencies)) + 1
+
+    weights = counts.astype(np.float64)
+    weights.data = (1 + np.log(weights.data)) * idf[weights.indices]
+    weights.data[~kept[weights.indices]] = 0
+    weights.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    weights.data /= np.repeat(norms, np.diff(weights.indptr))
+    return weights
+
+
+def text_digest(text : str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def filing_metadata(filings : list[dict[str, Any]]) -> np.ndarray:
+    # (filings, METADATA_COLUMNS), zero where a date is unknown so estimators accept the rows
+    filing_dates = pd.to_datetime([filing.get("filing_date") for filing in filings])
+    report_dates = pd.to_datetime([filing.get("report_date") for filing in filings])
+    years = filing_dates.year + (filing_dates.dayofyear - 1) / 365.25
+    lags = (filing_dates - report_dates).days
+    metadata = np.column_stack([np.asarray(years, dtype=np.float64), np.asarray(lags, dtype=np.float64)])
+    return np.nan_to_num(metadata, nan=0.0)
+
+
+class FilingFeatureMatrix:
+    '''
+    one CSR row per filing, keyed by accession number: the filing's TF-IDF weights over the
+    corpus vocabulary followed by METADATA_COLUMNS
+
+    raw term counts are kept next to the weights. adding filings only tokenizes the new ones and
+    those whose text no longer matches the stored digest. the vocabulary is append-only, so
+    existing columns never move. the weights of every row are then recomputed from the counts
+    with the grown corpus' idf in one vectorized pass. with root set both matrices are written as
+    flat .npy arrays and reloaded memory-mapped, so a training run maps the matrix instead of
+    rebuilding it and memory follows the non-zeros
+    '''
+
+    VERSION : int = 1
+    META_FILE : str = "meta.json"
+
+    def __init__(
+            self,
+            root : Path | str | None = None,
+            max_df : float = 0.8,
+            min_df : int = 2,
+            analyzer : Callable[[str], list[str]] | None = None,
+    ) -> None:
+        self.root = None if root is None else Path(root)
+        self.max_df = max_df
+        self.min_df = min_df
+        self.__analyzer = analyzer or default_analyzer()
+
+        self.vocabulary : dict[str, int] = {}
+        self.filings : list[dict[str, Any]] = []
+        self.row_index : dict[str, int] = {}
+        self.__counts = sp.csr_matrix((0, 0), dtype=np.int32)
+        self.__features = sp.csr_matrix((0, len(METADATA_COLUMNS)), dtype=np.float64)
+        self.data_hash : str | None = None
+        self.__generation : int | None = None
+        if self.root is not None and (self.root / self.META_FILE).exists():
+            self._load()
+
+    @property
+    def accessions(self) -> list[str]:
+        return [filing["accession_number"] for filing in self.filings]
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.vocabulary)
+
+    def feature_names(self) -> list[str]:
+        return [*sorted(self.vocabulary, key=self.vocabulary.__getitem__), *METADATA_COLUMNS]
+
+    def filing_dates(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(pd.to_datetime([filing["filing_date"] for filing in self.filings]))
+
+    def matrix(self) -> sp.csr_matrix:
+        return self.__features
+
+    def rows(self, accessions : list[str]) -> sp.csr_matrix:
+        return self.__features[[self.row_index[accession] for accession in accessions]]
+
+    def counts(self) -> sp.csr_matrix:
+        # raw term counts, for weights fitted on a subset of the filings
+        return self.__counts
+
+    def metadata(self) -> np.ndarray:
+        return self.__features[:, self.n_terms:].toarray()
+
+    def _load(self) -> None:
+        meta = json.loads((self.root / self.META_FILE).read_text())
+        if meta["version"] != self.VERSION:
+            raise ValueError(f"feature matrix version {meta['version']} but reader expects {self.VERSION}")
+
+        # matrices saved before generations were recorded use the unnumbered file names
+        self.__generation = meta.get("generation")
+        terms = json.loads(self._path("vocabulary", ".json", self.__generation).read_text())
+        self.vocabulary = {term : position for position, term in enumerate(terms)}
+        self.filings = json.loads(self._path("filings", ".json", self.__generation).read_text())
+        self.row_index = {filing["accession_number"] : row for row, filing in enumerate(self.filings)}
+        self.max_df, self.min_df = meta["max_df"], meta["min_df"]
+        self.data_hash = meta["data_hash"]
+
+        arrays = {name : np.load(self._path(name, ".npy", self.__generation), mmap_mode="r") for name in _ARRAYS}
+        n_rows = len(self.filings)
+        self.__counts = sp.csr_matrix(
+            (arrays["counts_data"], arrays["counts_indices"], arrays["counts_indptr"]),
+            shape=(n_rows, self.n_terms),
+            copy=False,
+        )
+        self.__features = sp.csr_matrix(
+            (arrays["features_data"], arrays["features_indices"], arrays["features_indptr"]),
+            shape=(n_rows, self.n_terms + len(METADATA_COLUMNS)),
+            copy=False,
+        )
+
+    def _path(self, name : str, suffix : str, generation : int | None) -> Path:
+        return self.root / (name + suffix if generation is None else f"{name}_{generation:05d}{suffix}")
+
+    def _save(self) -> None:
+        # a save writes a new generation of files and then swaps in a meta.json pointing at it,
+        # its data hash identifies that generation and a crash part way leaves the previous one
+        self.root.mkdir(parents=True, exist_ok=True)
+        previous = self.__generation
+        generation = 0 if previous is None else previous + 1
+        arrays = {
+            "counts_data" : self.__counts.data, "counts_indices" : self.__counts.indices,
+            "counts_indptr" : self.__counts.indptr, "features_data" : self.__features.data,
+            "features_indices" : self.__features.indices, "features_indptr" : self.__features.indptr,
+        }
+        for name, values in arrays.items():
+            np.save(self._path(name, ".npy", generation), np.ascontiguousarray(values))
+        self._path("vocabulary", ".json", generation).write_text(json.dumps(self.feature_names()[: self.n_terms]))
+        self._path("filings", ".json", generation).write_text(json.dumps(self.filings))
+
+        temporary = self.root / f"{self.META_FILE}.tmp"
+        temporary.write_text(json.dumps({
+            "version" : self.VERSION,
+            "generation" : generation,
+            "max_df" : self.max_df,
+            "min_df" : self.min_df,
+            "data_hash" : self.data_hash,
+        }))
+        os.replace(temporary, self.root / self.META_FILE)
+        # hand back memory-mapped arrays rather than holding the freshly built ones
+        self._load()
+        for name, suffix in [*((name, ".npy") for name in _ARRAYS), ("vocabulary", ".json"), ("filings", ".json")]:
+            self._path(name, suffix, previous).unlink(missing_ok=True)
+
+    def _count_rows(self, texts : list[str]) -> sp.csr_matrix:
+        indptr = [0]
+        indices : list[int] = []
+        for text in texts:
+            for token in self.__analyzer(text):
+                indices.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+            indptr.append(len(indices))
+
+        counts = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(texts), len(self.vocabulary)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def _hash(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for values in (self.__features.data, self.__features.indices, self.__features.indptr):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        digest.update("\x1f".join(self.accessions).encode())
+        return digest.hexdigest()
+
+    def add(
+            self,
+            rows : Iterable[dict[str, Any]],
+            ticker : str | None = None,
+    ) -> int:
+        '''
+        adds NLPExtractor rows whose accession_number is not in the matrix yet, returns how many
+        were added or replaced. a known accession whose risk factor text differs from the stored
+        digest, say extracted by the other parser, is tokenized again in its row
+        '''
+        changed : list[dict[str, Any]] = []
+        texts : list[str] = []
+        seen : set[str] = set()
+        for row in rows:
+            accession = row["accession_number"]
+            if accession in seen:
+                continue
+            seen.add(accession)
+            text = row.get("risk_factor") or " "
+            digest = text_digest(text)
+            stored = self.row_index.get(accession)
+            if stored is not None and self.filings[stored].get("text_digest") == digest:
+                continue
+            changed.append({
+                "accession_number" : accession,
+                "filing_date" : None if row.get("filing_date") is None else str(row["filing_date"]),
+                "report_date" : None if row.get("report_date") is None else str(row["report_date"]),
+                "ticker" : row.get("ticker", ticker),
+                "text_digest" : digest,
+            })
+            texts.append(text)
+        if not changed:
+            return 0
+
+        fresh = self._count_rows(texts)
+        old = self.__counts
+        n_old = old.shape[0]
+        old = sp.csr_matrix((old.data, old.indices, old.indptr), shape=(n_old, self.n_terms))
+        # replaced filings keep their row, the new ones go after the existing rows
+        order = np.arange(n_old + len(changed))
+        n_rows = n_old
+        for position, filing in enumerate(changed):
+            stored = self.row_index.get(filing["accession_number"])
+            if stored is None:
+                stored = self.row_index[filing["accession_number"]] = n_rows
+                self.filings.append(filing)
+                n_rows += 1
+            else:
+                self.filings[stored] = filing
+            order[stored] = n_old + position
+        counts = sp.vstack([old, fresh], format="csr", dtype=np.int32)[order[:n_rows]]
+        counts.indices = counts.indices.astype(np.int32, copy=False)
+
+        document_frequencies = np.bincount(counts.indices, minlength=self.n_terms)
+        weights = tfidf_weights(counts, document_frequencies, counts.shape[0], self.max_df, self.min_df)
+        metadata = sp.csr_matrix(filing_metadata(self.filings))
+        self.__counts = counts
+        self.__features = sp.hstack([weights, metadata], format="csr")
+        self.data_hash = self._hash()
+
+        if self.root is not None:
+            self._save()
+        return len(changed)
@@ -0,0 +1,146 @@
+import html
+import mmap
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+
+# EDGAR's own form types for the annual report, amendments are not the filing we want
+ANNUAL_REPORT_TYPES : frozenset[bytes] = frozenset({b"10-K", b"10-K405", b"10-KT", b"10-KSB"})
+
+# bytes the accession header is guaranteed to fit in
+_HEADER_BYTES : int = 8192
+
+_DOCUMENT_TYPE = re.compile(rb"<DOCUMENT>\s*<TYPE>([^\s<]+)", re.IGNORECASE)
+_DOCUMENT_END = re.compile(rb"</DOCUMENT>", re.IGNORECASE)
+_TEXT_START = re.compile(rb"<TEXT>", re.IGNORECASE)
+_HTML_START = re.compile(rb"<(?:html|!DOCTYPE\s+html)", re.IGNORECASE)
+_FILED_AS_OF = re.compile(rb"FILED AS OF DATE:\s*(\d{8})")
+_PERIOD_OF_REPORT = re.compile(rb"CONFORMED PERIOD OF REPORT:\s*(\d{8})")
+
+# "Item 1A" / "Item 1B" / "Item 2" headings, in html the words can be split by tags and entities,
+# one alternation so a single scan over the document sees every boundary in order. anchors such as
+# href="#item1a" or id="item_1a" are tag internals, not headings, hence the lookbehind
+_GAP = rb"(?:\s|&nbsp;|&#160;|&#xa0;|<[^>]{0,400}>)*"
+_ITEM_BOUNDARY = re.compile(
+    rb"(?<![#\"'=_/.-])\bitem" + _GAP + rb"(?:(1a)|(1b)|(2))(?![0-9a-z])",
+    re.IGNORECASE,
+)
+
+# a heading starts its line or html block, a cross reference sits mid sentence
+_HEADING_LOOKBEHIND : int = 64
+_LINE_START = re.compile(rb"[\n>](?:\s|&nbsp;|&#160;|&#xa0;)*\Z")
+
+_SCRIPT_OR_STYLE = re.compile(r"<(script|style)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_BLOCK_TAG = re.compile(r"<\s*(?:br|/p|/div|/tr|/li|/h[1-6]|/table)\b[^>]*>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]*>")
+_INLINE_SPACE = re.compile(r"[ \t\r\f\v\xa0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+class FilingHeader(NamedTuple):
+    filing_date: str | None
+    report_date: str | None
+
+
+def _iso_date(match: re.Match | None) -> str | None:
+    if match is None:
+        return None
+    raw = match.group(1).decode("ascii")
+    return f"{raw[:4]}-{raw[4:6]}-{raw[6:]}"
+
+
+def read_filing_header(path: Path | str) -> FilingHeader:
+    '''
+    filing date and period of report from the SEC header of a full-submission.txt
+    '''
+    with open(path, "rb") as f:
+        head = f.read(_HEADER_BYTES)
+    return FilingHeader(_iso_date(_FILED_AS_OF.search(head)), _iso_date(_PERIOD_OF_REPORT.search(head)))
+
+
+def find_annual_report(buffer: mmap.mmap | bytes) -> tuple[int, int] | None:
+    '''
+    byte range of the <TEXT> body of the 10-K document inside a full submission, exhibits and
+    uuencoded graphics that follow it are never touched
+    '''
+    for match in _DOCUMENT_TYPE.finditer(buffer):
+        if match.group(1).upper() not in ANNUAL_REPORT_TYPES:
+            continue
+
+        end_match = _DOCUMENT_END.search(buffer, match.end())
+        end = end_match.start() if end_match is not None else len(buffer)
+        text_match = _TEXT_START.search(buffer, match.end(), end)
+        return (text_match.end() if text_match is not None else match.end()), end
+    return None
+
+
+def _is_heading(buffer: mmap.mmap | bytes, start: int, position: int) -> bool:
+    before = buffer[max(start, position - _HEADING_LOOKBEHIND) : position]
+    if position - start <= _HEADING_LOOKBEHIND:
+        before = b"\n" + before
+    return _LINE_START.search(before) is not None
+
+
+def find_risk_factors(
+        buffer: mmap.mmap | bytes,
+        start: int = 0,
+        end: int | None = None,
+) -> tuple[int, int] | None:
+    '''
+    byte range of Item 1A within [start, end), found in one pass over the item headings
+
+    every Item 1A heading opens a candidate and the next Item 1B, or Item 2 for filers without
+    unresolved staff comments, closes it. table of contents entries close after a few hundred
+    bytes, so the widest closed candidate is the section itself. a mention of Item 1A in running
+    text only opens a candidate when none is open, so a cross reference inside the section
+    ("as described in this Item 1A") does not cut it short
+    '''
+    end = len(buffer) if end is None else end
+    best : tuple[int, int] | None = None
+    opened : int | None = None
+    for match in _ITEM_BOUNDARY.finditer(buffer, start, end):
+        if match.group(1) is not None:
+            if opened is None or _is_heading(buffer, start, match.start()):
+                opened = match.start()
+        elif opened is not None:
+            if best is None or match.start() - opened > best[1] - best[0]:
+                best = (opened, match.start())
+            opened = None
+    return best
+
+
+def html_to_text(raw: str) -> str:
+    text = _SCRIPT_OR_STYLE.sub(" ", raw)
+    text = _BLOCK_TAG.sub("\n", text)
+    text = html.unescape(_TAG.sub(" ", text))
+    return _clean_text(text)
+
+
+def _clean_text(text: str) -> str:
+    text = _INLINE_SPACE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def extract_risk_factors(path: Path | str) -> str | None:
+    '''
+    Item 1A text of a local full-submission.txt, html or sgml, None when the filing has no such
+    section. the file is memory-mapped and only the section's byte range is ever decoded
+    '''
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            document = find_annual_report(buffer)
+            if document is None:
+                return None
+
+            section = find_risk_factors(buffer, *document)
+            if section is None:
+                return None
+
+            is_html = _HTML_START.search(buffer, document[0], min(document[1], document[0] + 2000)) is not None
+            raw = buffer[section[0] : section[1]].decode("utf-8", errors="replace")
+
+    return html_to_text(raw) if is_html else _clean_text(raw)
@@ -1,47 +1,164 @@
-from typing import Any
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from collections.abc import Iterable
+from typing import Any, Callable, TYPE_CHECKING
 import numpy as np
 import pandas as pd
-from edgar.entity import EntityFilings
-from utils import data_loader
+from utils import data_loader, instrumentation
+from utils.section_cache import SectionCache
+from earnings_predictor.src.features.feature_matrix import FilingFeatureMatrix, tfidf_weights
+from earnings_predictor.src.features.filing_sections import extract_risk_factors, read_filing_header
+from earnings_predictor.src.features.paragraph_store import DEFAULT_MODIFIED_THRESHOLD, ParagraphStore
+from earnings_predictor.src.features.streaming_tfidf import DEFAULT_CHUNK_SIZE, StreamingTfidf
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 import os
 
+if TYPE_CHECKING:
+    from edgar.entity import EntityFiling, EntityFilings
+
+RISK_FACTORS_SECTION : str = "risk_factors"
+# the native extractor's text differs from edgartools' rendering, so it is cached on its own
+LOCAL_RISK_FACTORS_SECTION : str = "risk_factors_local"
+
+
+def _risk_factors_of(entry: EntityFiling) -> str | None:
+    # runs in a pool worker, edgartools picks the SEC identity up from the inherited environment
+    risk_text = entry.obj().risk_factors
+    return None if risk_text is None else str(risk_text)
+
+
 class NLPExtractor:
     def __init__(
             self,
             data_loader_source: data_loader.DataLoader,
+            section_cache: SectionCache | None = None,
+            max_workers: int | None = None,
     ) -> None:
         self.__data_loader_source = data_loader_source
         self.__credentials : str = f"{os.getenv("SEC_EDGAR_USER_NAME")} {os.getenv("SEC_EDGAR_USER_EMAIL")}"
+        self.section_cache = section_cache or SectionCache(data_loader_source.data_dir / "sec_section_cache")
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    @instrumentation.instrumented()
+    def _parse_sections(
+            self,
+            parse : Callable[[Any], str | None],
+            jobs : dict[str, Any]
+    ) -> dict[str, str | None]:
+        # jobs maps accession number -> picklable argument of parse
+        parsed : dict[str, str | None] = {}
+        if self.max_workers == 1 or len(jobs) <= 1:
+            for accession, job in jobs.items():
+                try:
+                    parsed[accession] = parse(job)
+                except Exception as e:
+                    print(f"error {e}")
+            instrumentation.count("sections parsed", len(parsed))
+            return parsed
+
+        # spawn, not fork: the parent already runs BLAS and httpx threads
+        with ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(jobs)),
+            mp_context=get_context("spawn"),
+        ) as pool:
+            futures = {pool.submit(parse, job) : accession for accession, job in jobs.items()}
+            for future in as_completed(futures):
+                try:
+                    parsed[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"error {e}")
+        instrumentation.count("sections parsed", len(parsed))
+        return parsed
 
+    @instrumentation.instrumented()
     def extract_features_from_edgar_tools(
             self,
             ticker : str
     ) -> list[dict[str, Any]]:
-        tenk_filings : EntityFilings = self.__data_loader_source.load_data_sec_filings_ticker_edgar_tools(ticker)
+        tenk_filings : EntityFilings | None = self.__data_loader_source.load_data_sec_filings_ticker_edgar_tools(ticker)
+        if tenk_filings is None:
+            return []
+
+        entries : list[EntityFiling] = list(tenk_filings)
+        # published filings never change, so a section parsed once is served from the cache and
+        # only the misses are fetched and parsed, spread over a process pool
+        risk_texts = self.section_cache.get_many(
+            [entry.accession_number for entry in entries], RISK_FACTORS_SECTION
+        )
+        instrumentation.count("filings read", len(entries))
+        instrumentation.count("section cache hits", len(risk_texts))
+        parsed = self._parse_sections(
+            _risk_factors_of,
+            {entry.accession_number : entry for entry in entries if entry.accession_number not in risk_texts},
+        )
+        self.section_cache.put_many(parsed, RISK_FACTORS_SECTION)
+        risk_texts.update(parsed)
+
         risk_data : list[dict[str, Any]] = []
-        for entry in tenk_filings:
-            try:
-                form_objects = entry.obj()
-                risk_text = form_objects.risk_factors
-                risk_data.append({
-                    "filing_date" : entry.filing_date,
-                    "report_date" : entry.report_date,
-                    "accession_number" : entry.accession_number,
-                    "risk_factor" : risk_text
-                })
-
-            except Exception as e:
-                print(f"error {e}")
+        for entry in entries:
+            # filings that failed to parse are left out, as before, and retried on the next call
+            if entry.accession_number not in risk_texts:
+                continue
+            risk_data.append({
+                "filing_date" : entry.filing_date,
+                "report_date" : entry.report_date,
+                "accession_number" : entry.accession_number,
+                "risk_factor" : risk_texts[entry.accession_number]
+            })
 
         return risk_data
 
+    @instrumentation.instrumented()
+    def extract_features_from_local_filings(
+            self,
+            ticker : str
+    ) -> list[dict[str, Any]]:
+        # offline counterpart of extract_features_from_edgar_tools over the downloaded
+        # full-submission.txt files, same rows, Item 1A sliced straight out of the memory-mapped file
+        filings = self.__data_loader_source.open_data_sec_filings(ticker=ticker, form_type="10-K")
+        entries = [filings.entry(key) for key in filings]
+
+        risk_texts = self.section_cache.get_many(
+            [entry.accession for entry in entries], LOCAL_RISK_FACTORS_SECTION
+        )
+        instrumentation.count("filings read", len(entries))
+        instrumentation.count("section cache hits", len(risk_texts))
+        parsed = self._parse_sections(
+            extract_risk_factors,
+            {entry.accession : entry.path for entry in entries if entry.accession not in risk_texts},
+        )
+        self.section_cache.put_many(parsed, LOCAL_RISK_FACTORS_SECTION)
+        risk_texts.update(parsed)
+
+        risk_data : list[dict[str, Any]] = []
+        for entry in entries:
+            if entry.accession not in risk_texts:
+                continue
+            header = read_filing_header(entry.path)
+            risk_data.append({
+                "filing_date" : header.filing_date,
+                "report_date" : header.report_date,
+                "accession_number" : entry.accession,
+                "risk_factor" : risk_texts[entry.accession]
+            })
+
+        return risk_data
+
+    @instrumentation.instrumented()
     def get_top_n_words(
             self,
             n : int,
-            extracted_features : list[dict[str, Any]]
+            extracted_features : list[dict[str, Any]],
+            paragraph_store : ParagraphStore | None = None
     )-> pd.DataFrame:
+        # with a paragraph store the filings' term counts are summed from their stored paragraphs
+        # and only paragraphs it has never seen are tokenized, the scores are the same. filings the
+        # store holds with other text are split again from extracted_features first
+        if paragraph_store is not None:
+            return self._top_words_from_paragraphs(extracted_features, paragraph_store)
 
         vectorizer = TfidfVectorizer(
             lowercase=True,
@@ -59,6 +176,7 @@ class NLPExtractor:
                                         if item.get("risk_factor") is not None
                                         else " "
                                         for item in extracted_features]
+        instrumentation.count("documents", len(risk_factor_list))
         tfidf_matrix = vectorizer.fit_transform(risk_factor_list)
         feature_names = vectorizer.get_feature_names_out()
         mean_tfidf = np.asarray(tfidf_matrix.mean(axis=0)).flatten()
@@ -66,4 +184,75 @@ class NLPExtractor:
         word_scoring = list(zip(feature_names, mean_tfidf))
         word_scoring.sort(key=lambda x: x[1], reverse=True)
 
-        return pd.DataFrame(word_scoring, columns=["word", "tfdif score"])
\ No newline at end of file
+        return pd.DataFrame(word_scoring, columns=["word", "tfdif score"])
+
+    def _top_words_from_paragraphs(
+            self,
+            extracted_features : list[dict[str, Any]],
+            paragraph_store : ParagraphStore
+    ) -> pd.DataFrame:
+        paragraph_store.add(extracted_features)
+        instrumentation.count("documents", len(extracted_features))
+        counts = paragraph_store.filing_counts([item["accession_number"] for item in extracted_features])
+        n_documents = counts.shape[0]
+        frequencies = np.bincount(counts.indices, minlength=counts.shape[1])
+        weights = tfidf_weights(counts, frequencies, n_documents)
+        kept = np.flatnonzero((frequencies >= 2) & (frequencies <= 0.8 * n_documents))
+
+        # alphabetical first, so ties keep the vectorizer's feature name order
+        terms = np.array(paragraph_store.terms(), dtype=object)
+        kept = kept[np.argsort(terms[kept], kind="stable")]
+        mean_tfidf = np.asarray(weights[:, kept].mean(axis=0)).ravel() if n_documents else np.zeros(kept.size)
+        word_scoring = list(zip(terms[kept], mean_tfidf))
+        word_scoring.sort(key=lambda x: x[1], reverse=True)
+        return pd.DataFrame(word_scoring, columns=["word", "tfdif score"])
+
+    @instrumentation.instrumented()
+    def get_top_n_words_streaming(
+            self,
+            n : int,
+            extracted_features : Iterable[dict[str, Any]],
+            tfidf_index : StreamingTfidf | None = None,
+            chunk_size : int = DEFAULT_CHUNK_SIZE
+    ) -> pd.DataFrame:
+        # same scores as get_top_n_words, but documents are pulled chunk_size at a time from any
+        # iterable and folded into tfidf_index, pass a persisted index to only add new filings
+        tfidf_index = tfidf_index if tfidf_index is not None else StreamingTfidf()
+        tfidf_index.partial_fit(extracted_features, chunk_size=chunk_size)
+        return tfidf_index.scores()
+
+    @instrumentation.instrumented()
+    def build_feature_matrix(
+            self,
+            tickers : list[str],
+            feature_matrix : FilingFeatureMatrix | None = None,
+            local_filings : bool = False
+    ) -> FilingFeatureMatrix:
+        # persisted under data_dir by default, one matrix per extractor since their texts differ,
+        # only filings missing from it or whose text changed are tokenized
+        if feature_matrix is None:
+            name = "earnings_feature_matrix_local" if local_filings else "earnings_feature_matrix"
+            feature_matrix = FilingFeatureMatrix(self.__data_loader_source.data_dir / name)
+        extract = self.extract_features_from_local_filings if local_filings else self.extract_features_from_edgar_tools
+        rows = [{**row, "ticker" : ticker} for ticker in tickers for row in extract(ticker)]
+        instrumentation.count("filings added", feature_matrix.add(rows))
+        return feature_matrix
+
+    @instrumentation.instrumented()
+    def filing_changes(
+            self,
+            tickers : list[str],
+            paragraph_store : ParagraphStore | None = None,
+            local_filings : bool = False,
+            threshold : float = DEFAULT_MODIFIED_THRESHOLD
+    ) -> pd.DataFrame:
+        # ParagraphStore.changes for the tickers' 10-Ks, persisted under data_dir by default with
+        # one store per extractor, a filing whose text changed is split again
+        if paragraph_store is None:
+            name = "risk_factor_paragraphs_local" if local_filings else "risk_factor_paragraphs"
+            paragraph_store = ParagraphStore(self.__data_loader_source.data_dir / name)
+        extract = self.extract_features_from_local_filings if local_filings else self.extract_features_from_edgar_tools
+        rows = [{**row, "ticker" : ticker} for ticker in tickers for row in extract(ticker)]
+        instrumentation.count("filings added", paragraph_store.add(rows))
+        changes = paragraph_store.changes(threshold)
+        return changes[changes["ticker"].isin(tickers)]
@@ -0,0 +1,409 @@
+import hashlib
+import json
+import os
+import re
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from earnings_predictor.src.features.streaming_tfidf import default_analyzer
+from utils import instrumentation
+
+
+DEFAULT_NUM_PERM : int = 64
+# estimated jaccard above which an unmatched paragraph counts as a rewrite of an old one
+DEFAULT_MODIFIED_THRESHOLD : float = 0.5
+# mersenne prime the minhash permutations work modulo, term ids stay well below it
+_PRIME : int = (1 << 31) - 1
+_EMPTY_SIGNATURE : int = np.iinfo(np.uint32).max
+
+CHANGE_COLUMNS : tuple[str, ...] = (
+    "paragraphs", "unchanged", "modified", "added", "removed", "changed fraction", "similarity",
+)
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+_ARRAYS : tuple[str, ...] = (
+    "paragraph_hashes", "signatures", "counts_data", "counts_indices", "counts_indptr",
+    "filing_paragraphs", "filing_indptr",
+)
+
+
+def split_paragraphs(text : str | None) -> list[str]:
+    # blank line separated paragraphs with whitespace collapsed, no token spans a break
+    if not text:
+        return []
+    paragraphs = (" ".join(paragraph.split()) for paragraph in _PARAGRAPH_BREAK.split(text))
+    return [paragraph for paragraph in paragraphs if paragraph]
+
+
+def paragraph_hash(paragraph : str) -> bytes:
+    return hashlib.blake2b(paragraph.encode(), digest_size=16).digest()
+
+
+def minhash_parameters(num_perm : int = DEFAULT_NUM_PERM, seed : int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64),
+        rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64),
+    )
+
+
+def minhash_signatures(counts : sp.csr_matrix, a : np.ndarray, b : np.ndarray) -> np.ndarray:
+    '''
+    (rows, num_perm) minhash of every row's set of term ids under the permutations
+    (a * id + b) mod 2^31 - 1, rows without terms get the all-max signature
+    '''
+    signatures = np.full((counts.shape[0], a.size), _EMPTY_SIGNATURE, dtype=np.uint32)
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    if rows.size == 0:
+        return signatures
+    hashed = (counts.indices.astype(np.uint64)[:, None] * a + b) % _PRIME
+    starts = counts.indptr[:-1][np.diff(counts.indptr) > 0]
+    signatures[np.unique(rows)] = np.minimum.reduceat(hashed, starts, axis=0).astype(np.uint32)
+    return signatures
+
+
+class ParagraphStore:
+    '''
+    risk factor sections split into paragraphs and deduplicated by content hash
+
+    most of a 10-K's risk factors are carried over from the year before, so every distinct
+    paragraph is tokenized once: its term counts and a minhash signature of its terms are
+    stored and any later filing repeating it reuses them. a filing is kept as its list of
+    paragraphs, its term counts are the sum of theirs and match tokenizing the whole section.
+    comparing each filing with the ticker's previous one gives what changed: paragraphs carried
+    over verbatim, rewritten (a near duplicate by minhash), added and removed. a filing whose
+    text changes is split again, so a store only ever holds one extraction of it. with root set
+    the store is saved as .npy arrays and reloaded memory-mapped
+    '''
+
+    VERSION : int = 1
+    META_FILE : str = "meta.json"
+
+    def __init__(
+            self,
+            root : Path | str | None = None,
+            num_perm : int = DEFAULT_NUM_PERM,
+            seed : int = 0,
+            analyzer : Callable[[str], list[str]] | None = None,
+    ) -> None:
+        self.root = None if root is None else Path(root)
+        self.num_perm = num_perm
+        self.seed = seed
+        self.__analyzer = analyzer or default_analyzer()
+
+        self.vocabulary : dict[str, int] = {}
+        self.filings : list[dict[str, Any]] = []
+        self.row_index : dict[str, int] = {}
+        self.paragraph_index : dict[bytes, int] = {}
+        self.__hashes = np.zeros((0, 16), dtype=np.uint8)
+        self.__signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self.__counts = sp.csr_matrix((0, 0), dtype=np.int32)
+        self.__filing_paragraphs = np.zeros(0, dtype=np.int64)
+        self.__filing_indptr = np.zeros(1, dtype=np.int64)
+        self.__generation : int | None = None
+        if self.root is not None and (self.root / self.META_FILE).exists():
+            self._load()
+        self.__a, self.__b = minhash_parameters(self.num_perm, self.seed)
+
+    @property
+    def accessions(self) -> list[str]:
+        return [filing["accession_number"] for filing in self.filings]
+
+    @property
+    def n_paragraphs(self) -> int:
+        return len(self.paragraph_index)
+
+    def terms(self) -> list[str]:
+        return sorted(self.vocabulary, key=self.vocabulary.__getitem__)
+
+    def paragraphs_of(self, accession : str) -> np.ndarray:
+        # store rows of the filing's paragraphs in document order
+        row = self.row_index[accession]
+        return self.__filing_paragraphs[self.__filing_indptr[row]: self.__filing_indptr[row + 1]]
+
+    def paragraph_counts(self) -> sp.csr_matrix:
+        return self.__counts
+
+    def signatures(self) -> np.ndarray:
+        return self.__signatures
+
+    def _load(self) -> None:
+        meta = json.loads((self.root / self.META_FILE).read_text())
+        if meta["version"] != self.VERSION:
+            raise ValueError(f"paragraph store version {meta['version']} but reader expects {self.VERSION}")
+        self.num_perm, self.seed = meta["num_perm"], meta["seed"]
+        # stores saved before generations were recorded use the unnumbered file names
+        self.__generation = meta.get("generation")
+
+        terms = json.loads(self._path("vocabulary", ".json", self.__generation).read_text())
+        self.vocabulary = {term : position for position, term in enumerate(terms)}
+        self.filings = json.loads(self._path("filings", ".json", self.__generation).read_text())
+        self.row_index = {filing["accession_number"] : row for row, filing in enumerate(self.filings)}
+
+        arrays = {name : np.load(self._path(name, ".npy", self.__generation), mmap_mode="r") for name in _ARRAYS}
+        self.__hashes = arrays["paragraph_hashes"]
+        self.paragraph_index = {digest.tobytes() : row for row, digest in enumerate(self.__hashes)}
+        self.__signatures = arrays["signatures"]
+        self.__counts = sp.csr_matrix(
+            (arrays["counts_data"], arrays["counts_indices"], arrays["counts_indptr"]),
+            shape=(len(self.__hashes), len(self.vocabulary)),
+            copy=False,
+        )
+        self.__filing_paragraphs = arrays["filing_paragraphs"]
+        self.__filing_indptr = arrays["filing_indptr"]
+
+    def _path(self, name : str, suffix : str, generation : int | None) -> Path:
+        return self.root / (name + suffix if generation is None else f"{name}_{generation:05d}{suffix}")
+
+    def _save(self) -> None:
+        # arrays and json of a save are written as a new generation of files, meta.json is then
+        # swapped in to point at them, so a crash part way leaves the previous store readable
+        self.root.mkdir(parents=True, exist_ok=True)
+        previous = self.__generation
+        generation = 0 if previous is None else previous + 1
+        arrays = {
+            "paragraph_hashes" : self.__hashes, "signatures" : self.__signatures,
+            "counts_data" : self.__counts.data, "counts_indices" : self.__counts.indices,
+            "counts_indptr" : self.__counts.indptr, "filing_paragraphs" : self.__filing_paragraphs,
+            "filing_indptr" : self.__filing_indptr,
+        }
+        for name, values in arrays.items():
+            np.save(self._path(name, ".npy", generation), np.ascontiguousarray(values))
+        self._path("vocabulary", ".json", generation).write_text(json.dumps(self.terms()))
+        self._path("filings", ".json", generation).write_text(json.dumps(self.filings))
+
+        temporary = self.root / f"{self.META_FILE}.tmp"
+        temporary.write_text(json.dumps({
+            "version" : self.VERSION,
+            "generation" : generation,
+            "num_perm" : self.num_perm,
+            "seed" : self.seed,
+        }))
+        os.replace(temporary, self.root / self.META_FILE)
+        self._load()
+        for name, suffix in [*((name, ".npy") for name in _ARRAYS), ("vocabulary", ".json"), ("filings", ".json")]:
+            self._path(name, suffix, previous).unlink(missing_ok=True)
+
+    def _count_rows(self, texts : list[str]) -> sp.csr_matrix:
+        indptr = [0]
+        indices : list[int] = []
+        for text in texts:
+            for token in self.__analyzer(text):
+                indices.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+            indptr.append(len(indices))
+
+        counts = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(texts), len(self.vocabulary)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def add(
+            self,
+            rows : Iterable[dict[str, Any]],
+            ticker : str | None = None,
+    ) -> int:
+        '''
+        adds NLPExtractor rows whose accession_number is not stored yet, returns how many were
+        added or replaced. a known accession whose paragraphs no longer hash to the stored ones,
+        say extracted by the other parser, is split again in place. only paragraphs never seen
+        before are tokenized
+        '''
+        new_filings : list[dict[str, Any]] = []
+        filing_paragraphs : list[int] = []
+        filing_lengths : list[int] = []
+        replaced : dict[int, np.ndarray] = {}
+        new_texts : list[str] = []
+        new_hashes : list[bytes] = []
+        pending : dict[bytes, int] = {}
+        seen : set[str] = set()
+        reused = 0
+        for row in rows:
+            accession = row["accession_number"]
+            if accession in seen:
+                continue
+            seen.add(accession)
+            paragraphs = split_paragraphs(row.get("risk_factor"))
+            digests = [paragraph_hash(paragraph) for paragraph in paragraphs]
+            stored = self.row_index.get(accession)
+            if stored is not None and b"".join(digests) == self.__hashes[self.paragraphs_of(accession)].tobytes():
+                continue
+
+            positions = []
+            for paragraph, digest in zip(paragraphs, digests):
+                position = self.paragraph_index.get(digest, pending.get(digest))
+                if position is None:
+                    position = pending[digest] = self.n_paragraphs + len(new_texts)
+                    new_texts.append(paragraph)
+                    new_hashes.append(digest)
+                else:
+                    reused += 1
+                positions.append(position)
+            filing = {
+                "accession_number" : accession,
+                "filing_date" : None if row.get("filing_date") is None else str(row["filing_date"]),
+                "report_date" : None if row.get("report_date") is None else str(row["report_date"]),
+                "ticker" : row.get("ticker", ticker),
+            }
+            if stored is None:
+                new_filings.append(filing)
+                filing_paragraphs.extend(positions)
+                filing_lengths.append(len(positions))
+            else:
+                self.filings[stored] = filing
+                replaced[stored] = np.asarray(positions, dtype=np.int64)
+        if not new_filings and not replaced:
+            return 0
+        instrumentation.count("paragraphs reused", reused)
+        instrumentation.count("paragraphs tokenized", len(new_texts))
+
+        if new_texts:
+            fresh = self._count_rows(new_texts)
+            old = self.__counts
+            old = sp.csr_matrix((old.data, old.indices, old.indptr), shape=(old.shape[0], len(self.vocabulary)))
+            counts = sp.vstack([old, fresh], format="csr", dtype=np.int32)
+            counts.indices = counts.indices.astype(np.int32, copy=False)
+
+            hashes = np.frombuffer(b"".join(new_hashes), dtype=np.uint8).reshape(-1, 16)
+            self.__hashes = np.concatenate([self.__hashes, hashes])
+            self.__signatures = np.concatenate([self.__signatures, minhash_signatures(fresh, self.__a, self.__b)])
+            self.__counts = counts
+            self.paragraph_index.update(pending)
+
+        if replaced:
+            # paragraphs the replaced text dropped stay stored, no filing lists them anymore
+            indptr = self.__filing_indptr
+            lists = [
+                replaced.get(row, self.__filing_paragraphs[indptr[row]: indptr[row + 1]])
+                for row in range(len(self.filings))
+            ]
+            self.__filing_paragraphs = np.concatenate([np.zeros(0, dtype=np.int64), *lists])
+            self.__filing_indptr = np.concatenate([[0], np.cumsum([len(rows) for rows in lists], dtype=np.int64)])
+        self.__filing_paragraphs = np.concatenate([self.__filing_paragraphs, np.asarray(filing_paragraphs, dtype=np.int64)])
+        self.__filing_indptr = np.concatenate([
+            self.__filing_indptr, self.__filing_indptr[-1] + np.cumsum(filing_lengths, dtype=np.int64)
+        ])
+        for row, filing in enumerate(new_filings, start=len(self.filings)):
+            self.row_index[filing["accession_number"]] = row
+        self.filings.extend(new_filings)
+
+        if self.root is not None:
+            self._save()
+        return len(new_filings) + len(replaced)
+
+    def _incidence(self, paragraph_rows : list[np.ndarray]) -> sp.csr_matrix:
+        # (filings, paragraphs) with how often each paragraph appears in the filing
+        lengths = [len(rows) for rows in paragraph_rows]
+        return sp.csr_matrix(
+            (
+                np.ones(sum(lengths), dtype=np.int32),
+                np.concatenate([*paragraph_rows, np.zeros(0, dtype=np.int64)]),
+                np.concatenate([[0], np.cumsum(lengths)]),
+            ),
+            shape=(len(paragraph_rows), self.n_paragraphs),
+        )
+
+    def filing_counts(self, accessions : list[str] | None = None) -> sp.csr_matrix:
+        '''
+        (filings, terms) term counts of whole filings, the sum of their paragraphs' counts
+        '''
+        accessions = self.accessions if accessions is None else accessions
+        incidence = self._incidence([self.paragraphs_of(accession) for accession in accessions])
+        counts = (incidence @ self.__counts).tocsr()
+        counts.sum_duplicates()
+        return counts
+
+    def _previous(self) -> dict[str, str | None]:
+        # each filing's predecessor in its ticker's history, by filing date
+        order = sorted(range(len(self.filings)), key=lambda row: (
+            str(self.filings[row]["ticker"]), self.filings[row]["filing_date"] or "", self.filings[row]["accession_number"]
+        ))
+        previous : dict[str, str | None] = {}
+        last : dict[Any, str] = {}
+        for row in order:
+            filing = self.filings[row]
+            previous[filing["accession_number"]] = last.get(filing["ticker"])
+            last[filing["ticker"]] = filing["accession_number"]
+        return previous
+
+    def _rewrites(self, fresh : np.ndarray, gone : np.ndarray, threshold : float) -> int:
+        # new paragraphs paired one to one with dropped ones they are near duplicates of
+        if fresh.size == 0 or gone.size == 0:
+            return 0
+        similarity = (self.__signatures[fresh][:, None, :] == self.__signatures[gone][None, :, :]).mean(axis=2)
+        pairs = np.argwhere(similarity >= threshold)
+        pairs = pairs[np.argsort(-similarity[pairs[:, 0], pairs[:, 1]], kind="stable")]
+        used_fresh : set[int] = set()
+        used_gone : set[int] = set()
+        for i, j in pairs:
+            if i not in used_fresh and j not in used_gone:
+                used_fresh.add(i)
+                used_gone.add(j)
+        return len(used_fresh)
+
+    def changes(self, threshold : float = DEFAULT_MODIFIED_THRESHOLD) -> pd.DataFrame:
+        '''
+        one row per filing, indexed by accession number, comparing it with the ticker's previous
+        filing: distinct paragraphs, how many were carried over verbatim, rewritten (estimated
+        jaccard of their terms >= threshold with a dropped paragraph), added and removed, the
+        fraction of its paragraphs that are new or rewritten and the cosine similarity of the
+        two filings' term counts. a ticker's first filing has everything added and NaN fraction
+        and similarity
+        '''
+        previous = self._previous()
+        counts = self.filing_counts()
+        norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1), dtype=np.float64).ravel())
+
+        records : list[dict[str, Any]] = []
+        for row, filing in enumerate(self.filings):
+            current = np.unique(self.paragraphs_of(filing["accession_number"]))
+            before_accession = previous[filing["accession_number"]]
+            record = {"accession_number" : filing["accession_number"], "ticker" : filing["ticker"],
+                      "filing_date" : filing["filing_date"], "paragraphs" : current.size}
+            if before_accession is None:
+                records.append({**record, "unchanged" : 0, "modified" : 0, "added" : current.size, "removed" : 0,
+                                "changed fraction" : np.nan, "similarity" : np.nan})
+                continue
+
+            before = np.unique(self.paragraphs_of(before_accession))
+            unchanged = np.intersect1d(current, before).size
+            modified = self._rewrites(np.setdiff1d(current, before), np.setdiff1d(before, current), threshold)
+            before_row = self.row_index[before_accession]
+            dot = counts[row].multiply(counts[before_row]).sum()
+            denominator = norms[row] * norms[before_row]
+            records.append({
+                **record,
+                "unchanged" : unchanged,
+                "modified" : modified,
+                "added" : current.size - unchanged - modified,
+                "removed" : before.size - unchanged - modified,
+                "changed fraction" : (current.size - unchanged) / current.size if current.size else np.nan,
+                "similarity" : float(dot / denominator) if denominator > 0 else np.nan,
+            })
+        columns = ["accession_number", "ticker", "filing_date", *CHANGE_COLUMNS]
+        return pd.DataFrame(records, columns=columns).set_index("accession_number")
+
+    def change_counts(self, accessions : list[str] | None = None) -> sp.csr_matrix:
+        '''
+        (filings, terms) term counts of only the paragraphs a filing did not carry over verbatim
+        from the ticker's previous filing, the new language of the year
+        '''
+        accessions = self.accessions if accessions is None else accessions
+        previous = self._previous()
+        paragraph_rows : list[np.ndarray] = []
+        for accession in accessions:
+            current = self.paragraphs_of(accession)
+            before = previous[accession]
+            if before is not None:
+                current = current[~np.isin(current, self.paragraphs_of(before))]
+            paragraph_rows.append(current)
+        counts = (self._incidence(paragraph_rows) @ self.__counts).tocsr()
+        counts.sum_duplicates()
+        return counts
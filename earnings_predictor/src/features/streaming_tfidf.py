@@ -0,0 +1,212 @@
+import json
+import os
+import tempfile
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+DEFAULT_CHUNK_SIZE : int = 256
+
+
+def default_analyzer() -> Callable[[str], list[str]]:
+    # same tokenization get_top_n_words has always used
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    return CountVectorizer(
+        lowercase=True,
+        stop_words="english",
+        token_pattern=r"(?u)\b[A-Za-z]{3,}\b",
+    ).build_analyzer()
+
+
+def _chunks(items: Iterable[Any], chunk_size: int) -> Iterator[list[Any]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+class StreamingTfidf:
+    '''
+    incrementally maintained TF-IDF index reproducing the TfidfVectorizer settings of
+    NLPExtractor.get_top_n_words without ever fitting on the whole corpus at once
+
+    documents are consumed in chunks: each chunk is tokenized, mapped onto a growing vocabulary,
+    its raw term counts are stored as one sparse block and the document frequencies are bumped.
+    scoring streams those blocks once more with the current idf, so adding filings costs their own
+    tokenization only and memory stays bounded by one chunk plus the vocabulary. count blocks are
+    always spilled to disk, under root when it is set, where the vocabulary and frequencies are
+    kept too and survive between sessions, or else to a temporary directory removed with the index
+    '''
+
+    VERSION : int = 1
+
+    def __init__(
+            self,
+            root: Path | str | None = None,
+            max_df: float = 0.8,
+            min_df: int = 2,
+            analyzer: Callable[[str], list[str]] | None = None,
+    ) -> None:
+        self.root = None if root is None else Path(root)
+        self.max_df = max_df
+        self.min_df = min_df
+        self.__analyzer = analyzer or default_analyzer()
+
+        self.vocabulary : dict[str, int] = {}
+        self.document_frequencies : np.ndarray = np.zeros(0, dtype=np.int64)
+        self.n_documents : int = 0
+        self.keys : set[str] = set()
+        self.__spill : tempfile.TemporaryDirectory[str] | None = None
+        self.__n_blocks : int = 0
+        self.__generation : int | None = None
+        if self.root is not None and (self.root / "meta.json").exists():
+            self._load()
+
+    def _load(self) -> None:
+        meta = json.loads((self.root / "meta.json").read_text())
+        if meta["version"] != self.VERSION:
+            raise ValueError(f"tfidf index version {meta['version']} but reader expects {self.VERSION}")
+
+        # indexes saved before generations were recorded use the unnumbered file names
+        self.__generation = meta.get("generation")
+        terms = json.loads(self._state_path("vocabulary", ".json", self.__generation).read_text())
+        self.vocabulary = {term : position for position, term in enumerate(terms)}
+        self.document_frequencies = np.load(self._state_path("document_frequencies", ".npy", self.__generation))
+        self.n_documents = meta["n_documents"]
+        self.keys = set(meta["keys"])
+        self.__n_blocks = meta["n_blocks"]
+
+    def _state_path(self, name: str, suffix: str, generation: int | None) -> Path:
+        return self.root / (name + suffix if generation is None else f"{name}_{generation:05d}{suffix}")
+
+    def _save(self) -> None:
+        # every save writes a new generation of the vocabulary and frequencies, named after the
+        # block count, and only then swaps in a meta.json pointing at it, so a crash part way
+        # leaves the previous meta, its files and its blocks intact
+        self.root.mkdir(parents=True, exist_ok=True)
+        previous, generation = self.__generation, self.__n_blocks
+        terms = sorted(self.vocabulary, key=self.vocabulary.__getitem__)
+        self._state_path("vocabulary", ".json", generation).write_text(json.dumps(terms))
+        np.save(self._state_path("document_frequencies", ".npy", generation), self.document_frequencies)
+
+        temporary = self.root / "meta.json.tmp"
+        temporary.write_text(json.dumps({
+            "version" : self.VERSION,
+            "generation" : generation,
+            "n_documents" : self.n_documents,
+            "n_blocks" : self.__n_blocks,
+            "keys" : sorted(self.keys),
+        }))
+        os.replace(temporary, self.root / "meta.json")
+        self.__generation = generation
+        if previous != generation:
+            self._state_path("vocabulary", ".json", previous).unlink(missing_ok=True)
+            self._state_path("document_frequencies", ".npy", previous).unlink(missing_ok=True)
+
+    def _block_path(self, block: int) -> Path:
+        if self.root is not None:
+            return self.root / "blocks" / f"counts_{block:05d}.npz"
+        if self.__spill is None:
+            self.__spill = tempfile.TemporaryDirectory(prefix="streaming_tfidf_")
+        return Path(self.__spill.name) / f"counts_{block:05d}.npz"
+
+    def _iter_blocks(self) -> Iterator[sp.csr_matrix]:
+        for block in range(self.__n_blocks):
+            yield sp.load_npz(self._block_path(block)).tocsr()
+
+    def _count_block(self, texts: list[str]) -> sp.csr_matrix:
+        indptr = [0]
+        indices : list[int] = []
+        for text in texts:
+            for token in self.__analyzer(text):
+                position = self.vocabulary.setdefault(token, len(self.vocabulary))
+                indices.append(position)
+            indptr.append(len(indices))
+
+        counts = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(texts), len(self.vocabulary)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def partial_fit(
+            self,
+            documents: Iterable[str | dict[str, Any]],
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> int:
+        '''
+        adds documents from any iterable, plain strings or NLPExtractor rows, returns how many
+        were new. rows whose accession_number is already indexed are skipped, so feeding a
+        ticker's full history again only indexes its new filings
+        '''
+        added = 0
+        for chunk in _chunks(documents, chunk_size):
+            texts : list[str] = []
+            for document in chunk:
+                if isinstance(document, dict):
+                    key = document.get("accession_number")
+                    if key is not None:
+                        if key in self.keys:
+                            continue
+                        self.keys.add(key)
+                    document = document.get("risk_factor")
+                texts.append(document if document is not None else " ")
+            if not texts:
+                continue
+
+            counts = self._count_block(texts)
+            frequencies = np.bincount(counts.indices, minlength=len(self.vocabulary))
+            self.document_frequencies = np.pad(
+                self.document_frequencies, (0, len(self.vocabulary) - len(self.document_frequencies))
+            ) + frequencies
+            self.n_documents += len(texts)
+            added += len(texts)
+
+            path = self._block_path(self.__n_blocks)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            sp.save_npz(path, counts)
+            self.__n_blocks += 1
+
+        if self.root is not None and added:
+            self._save()
+        return added
+
+    def scores(self) -> pd.DataFrame:
+        '''
+        mean l2 normalized sublinear tf * smooth idf per kept term, sorted best first, the same
+        frame get_top_n_words returns
+        '''
+        frequencies = self.document_frequencies
+        max_count = self.max_df * self.n_documents
+        kept = np.flatnonzero((frequencies >= self.min_df) & (frequencies <= max_count))
+        if self.n_documents == 0 or kept.size == 0:
+            return pd.DataFrame({"word" : pd.Series(dtype=object), "tfdif score" : pd.Series(dtype=float)})
+
+        # alphabetical column order, ties then sort the way the vectorizer's feature names did
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.__getitem__), dtype=object)
+        kept = kept[np.argsort(terms[kept], kind="stable")]
+        idf = np.log((1 + self.n_documents) / (1 + frequencies[kept])) + 1
+
+        positions = np.full(len(self.vocabulary), -1)
+        positions[kept] = np.arange(kept.size)
+        totals = np.zeros(kept.size)
+        for counts in self._iter_blocks():
+            # older blocks were written before later terms existed, they simply have no counts for them
+            block_positions = positions[: counts.shape[1]]
+            selected = np.flatnonzero(block_positions >= 0)
+            weights = counts[:, selected].astype(np.float64)
+            weights.data = (1 + np.log(weights.data)) * idf[block_positions[selected]][weights.indices]
+            norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+            norms[norms == 0] = 1
+            totals[block_positions[selected]] += np.asarray((sp.diags(1 / norms) @ weights).sum(axis=0)).ravel()
+
+        word_scoring = list(zip(terms[kept], totals / self.n_documents))
+        word_scoring.sort(key=lambda x: x[1], reverse=True)
+        return pd.DataFrame(word_scoring, columns=["word", "tfdif score"])
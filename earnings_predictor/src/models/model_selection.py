@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, NamedTuple, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import log_loss, roc_auc_score
+
+from earnings_predictor.src.features.feature_matrix import tfidf_weights
+from utils import instrumentation
+from utils.shared_arrays import shared_array_pool, worker_array
+
+if TYPE_CHECKING:
+    from earnings_predictor.src.features.feature_matrix import FilingFeatureMatrix
+
+
+# inverse regularization strengths, walked from the strongest penalty up
+DEFAULT_CS : tuple[float, ...] = tuple(np.logspace(-3, 3, 13))
+# a fold needs this many labelled filings dated before its test period
+DEFAULT_MIN_TRAIN : int = 20
+
+FOLD_COLUMNS : tuple[str, ...] = ("test start", "test end", "n_train", "n_test")
+METRICS : tuple[str, ...] = ("log loss", "roc auc", "accuracy")
+
+
+class Fold(NamedTuple):
+    # test filings are dated in [test_start, test_end), training filings before test_start - gap
+    test_start : pd.Timestamp
+    test_end : pd.Timestamp
+    train : np.ndarray
+    test : np.ndarray
+
+
+class FoldModel(NamedTuple):
+    Cs : np.ndarray
+    # vocabulary columns weighted in the fold and their idf over its training filings
+    terms : np.ndarray
+    idf : np.ndarray
+    # training mean and standard deviation the metadata columns are scaled with
+    metadata_mean : np.ndarray
+    metadata_scale : np.ndarray
+    # (Cs, terms + metadata columns) and (Cs,)
+    coefficients : np.ndarray
+    intercepts : np.ndarray
+    n_iter : np.ndarray
+    # per C on the fold's test filings
+    log_loss : np.ndarray
+    roc_auc : np.ndarray
+    accuracy : np.ndarray
+
+
+def time_series_folds(
+        filing_dates : pd.DatetimeIndex,
+        freq : str = "Y",
+        gap_days : int = 0,
+        min_train : int = DEFAULT_MIN_TRAIN,
+) -> list[Fold]:
+    '''
+    expanding window splits keyed by filing date: every calendar period is tested on a model
+    trained on all filings dated before it, less a gap of gap_days. NaT dates are left out.
+    periods are fixed calendar spans, so filings added later only touch the folds whose
+    period or training window they fall into
+    '''
+    assert gap_days >= 0, f"Expected gap_days >= 0 got {gap_days}"
+    dates = pd.DatetimeIndex(filing_dates)
+    valid = np.flatnonzero(~dates.isna())
+    periods = dates[valid].to_period(freq)
+
+    folds : list[Fold] = []
+    for period in periods.unique().sort_values():
+        test_start = period.start_time
+        train = valid[dates[valid] < test_start - np.timedelta64(gap_days, "D")]
+        if len(train) < min_train:
+            continue
+        folds.append(Fold(test_start, (period + 1).start_time, train, valid[periods == period]))
+    return folds
+
+
+def fold_design(
+        counts : sp.csr_matrix,
+        metadata : np.ndarray,
+        train : np.ndarray,
+        test : np.ndarray,
+        max_df : float = 0.8,
+        min_df : int = 2,
+) -> tuple[sp.csr_matrix, sp.csr_matrix, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    (train rows, test rows, terms, idf, metadata mean, metadata scale) with the TF-IDF weights
+    and metadata scaling fitted on the training filings alone, so nothing of the test period
+    leaks into the features. only the terms inside [min_df, max_df] of the training filings
+    are kept as columns
+    '''
+    train_counts = counts[train]
+    document_frequencies = np.bincount(train_counts.indices, minlength=counts.shape[1])
+    n_documents = len(train)
+    terms = np.flatnonzero((document_frequencies >= min_df) & (document_frequencies <= max_df * n_documents))
+    idf = np.log((1 + n_documents) / (1 + document_frequencies[terms])) + 1
+
+    mean = metadata[train].mean(axis=0)
+    scale = metadata[train].std(axis=0)
+    scale[scale == 0] = 1
+
+    def design(rows : np.ndarray, row_counts : sp.csr_matrix) -> sp.csr_matrix:
+        weights = tfidf_weights(row_counts, document_frequencies, n_documents, max_df, min_df)[:, terms]
+        return sp.hstack([weights, sp.csr_matrix((metadata[rows] - mean) / scale)], format="csr")
+
+    return design(train, train_counts), design(test, counts[test]), terms, idf, mean, scale
+
+
+def fit_fold(
+        counts : sp.csr_matrix,
+        metadata : np.ndarray,
+        labels : np.ndarray,
+        train : np.ndarray,
+        test : np.ndarray,
+        Cs : tuple[float, ...] = DEFAULT_CS,
+        max_df : float = 0.8,
+        min_df : int = 2,
+        max_iter : int = 1000,
+        tol : float = 1e-6,
+) -> FoldModel:
+    '''
+    the l2 logistic regression path over Cs on one fold, each fit warm started from the
+    coefficients of the previous, more regularized one
+    '''
+    train_x, test_x, terms, idf, mean, scale = fold_design(counts, metadata, train, test, max_df, min_df)
+    train_y = labels[train].astype(np.int64)
+    test_y = labels[test].astype(np.int64)
+
+    Cs = np.sort(np.asarray(Cs, dtype=np.float64))
+    coefficients = np.empty((Cs.size, train_x.shape[1]))
+    intercepts = np.empty(Cs.size)
+    n_iter = np.empty(Cs.size, dtype=np.int64)
+    scores = {metric : np.full(Cs.size, np.nan) for metric in METRICS}
+
+    model = LogisticRegression(solver="lbfgs", warm_start=True, max_iter=max_iter, tol=tol)
+    for position, C in enumerate(Cs):
+        model.set_params(C=C)
+        model.fit(train_x, train_y)
+        coefficients[position] = model.coef_[0]
+        intercepts[position] = model.intercept_[0]
+        n_iter[position] = model.n_iter_[0]
+
+        probabilities = model.predict_proba(test_x)[:, 1]
+        scores["log loss"][position] = log_loss(test_y, probabilities, labels=[0, 1])
+        scores["accuracy"][position] = np.mean((probabilities >= 0.5) == test_y)
+        if np.unique(test_y).size == 2:
+            scores["roc auc"][position] = roc_auc_score(test_y, probabilities)
+
+    return FoldModel(
+        Cs, terms, idf, mean, scale, coefficients, intercepts, n_iter,
+        scores["log loss"], scores["roc auc"], scores["accuracy"],
+    )
+
+
+def _fit_fold_shared(n_terms : int, train : np.ndarray, test : np.ndarray, **options : Any) -> FoldModel:
+    counts = sp.csr_matrix(
+        (worker_array("data"), worker_array("indices"), worker_array("indptr")),
+        shape=(len(worker_array("indptr")) - 1, n_terms),
+        copy=False,
+    )
+    return fit_fold(counts, worker_array("metadata"), worker_array("labels"), train, test, **options)
+
+
+def best_c(scores : pd.DataFrame, metric : str = "log loss") -> float:
+    # the C with the best mean fold score, lowest for log loss and highest otherwise
+    assert metric in METRICS, f"Expected one of {METRICS} got {metric}"
+    means = scores.groupby("C")[metric].mean()
+    return float(means.idxmin() if metric == "log loss" else means.idxmax())
+
+
+class TimeSeriesModelSelection:
+    '''
+    tunes the regularization of a logistic regression on a FilingFeatureMatrix with time
+    ordered folds from time_series_folds
+
+    labels are keyed by accession number, filings without one are left out, as are folds whose
+    training filings all share one label. every fold walks
+    the whole C path with warm starts and folds run on a process pool reading the term counts
+    from shared memory. fitted fold models are cached as .npz files under a key of the
+    parameters and a hash of the fold's own counts, metadata and labels, so adding filings to
+    the matrix only refits the folds whose rows changed
+    '''
+
+    VERSION : int = 1
+
+    def __init__(
+            self,
+            feature_matrix : FilingFeatureMatrix,
+            labels : pd.Series,
+            Cs : tuple[float, ...] = DEFAULT_CS,
+            freq : str = "Y",
+            gap_days : int = 0,
+            min_train : int = DEFAULT_MIN_TRAIN,
+            cache_dir : Path | str | None = None,
+            n_workers : int = 1,
+            max_iter : int = 1000,
+            tol : float = 1e-6,
+    ) -> None:
+        assert n_workers >= 1, f"Expected n_workers >= 1 got {n_workers}"
+        assert len(Cs) > 0, "Expected at least one C"
+        self.feature_matrix = feature_matrix
+        self.labels = labels.reindex(feature_matrix.accessions).to_numpy(dtype=np.float64)
+        observed = self.labels[~np.isnan(self.labels)]
+        assert np.isin(observed, (0, 1)).all(), "Expected binary 0 / 1 labels"
+        self.Cs = tuple(sorted(float(C) for C in Cs))
+        self.freq = freq
+        self.gap_days = gap_days
+        self.min_train = min_train
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.n_workers = n_workers
+        self.max_iter = max_iter
+        self.tol = tol
+
+        self.__metadata = np.ascontiguousarray(feature_matrix.metadata())
+
+    def options(self) -> dict[str, Any]:
+        return {
+            "Cs" : self.Cs,
+            "max_df" : self.feature_matrix.max_df,
+            "min_df" : self.feature_matrix.min_df,
+            "max_iter" : self.max_iter,
+            "tol" : self.tol,
+        }
+
+    def folds(self) -> list[Fold]:
+        dates = self.feature_matrix.filing_dates()
+        dates = dates.where(~np.isnan(self.labels))
+        folds = time_series_folds(dates, self.freq, self.gap_days, self.min_train)
+        # an early expanding window can hold a single outcome, there is nothing to fit on it
+        return [fold for fold in folds if np.unique(self.labels[fold.train]).size == 2]
+
+    def fold_key(self, fold : Fold) -> str:
+        counts = self.feature_matrix.counts()
+        digest = hashlib.blake2b(digest_size=16)
+        for rows in (fold.train, fold.test):
+            block = counts[rows]
+            for values in (block.data, block.indices, block.indptr):
+                digest.update(np.asarray(values, dtype=np.int64).tobytes())
+            digest.update(np.ascontiguousarray(self.__metadata[rows]).tobytes())
+            digest.update(np.ascontiguousarray(self.labels[rows]).tobytes())
+        payload = {"version" : self.VERSION, "options" : self.options(), "data" : digest.hexdigest()}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _cached(self, key : str) -> FoldModel | None:
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.npz"
+        if not path.exists():
+            return None
+        with np.load(path) as arrays:
+            return FoldModel(**{field : arrays[field] for field in FoldModel._fields})
+
+    def _store(self, key : str, model : FoldModel) -> None:
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        partial = self.cache_dir / f"{key}.npz.part"
+        with open(partial, "wb") as f:
+            np.savez(f, **model._asdict())
+        os.replace(partial, self.cache_dir / f"{key}.npz")
+
+    @instrumentation.instrumented()
+    def fit(self) -> list[tuple[Fold, FoldModel]]:
+        folds = self.folds()
+        keys = [self.fold_key(fold) for fold in folds]
+        models : list[FoldModel | None] = [self._cached(key) for key in keys]
+        missing = [position for position, model in enumerate(models) if model is None]
+        instrumentation.count("folds cached", len(folds) - len(missing))
+        instrumentation.count("folds fitted", len(missing))
+
+        counts = self.feature_matrix.counts()
+        if self.n_workers == 1 or len(missing) <= 1:
+            for position in missing:
+                fold = folds[position]
+                models[position] = fit_fold(
+                    counts, self.__metadata, self.labels, fold.train, fold.test, **self.options()
+                )
+        else:
+            arrays = {
+                "data" : counts.data, "indices" : counts.indices, "indptr" : counts.indptr,
+                "metadata" : self.__metadata, "labels" : self.labels,
+            }
+            with shared_array_pool(arrays, min(self.n_workers, len(missing))) as pool:
+                # the latest folds train on the most filings, start them first
+                futures = {
+                    position : pool.submit(
+                        _fit_fold_shared, counts.shape[1], folds[position].train, folds[position].test,
+                        **self.options(),
+                    )
+                    for position in reversed(missing)
+                }
+                for position, future in futures.items():
+                    models[position] = future.result()
+
+        for position in missing:
+            self._store(keys[position], models[position])
+        return list(zip(folds, models))
+
+    def run(self) -> pd.DataFrame:
+        '''
+        one row per fold and C, FOLD_COLUMNS, C and the warm started fit's iterations then
+        METRICS on the fold's test filings
+        '''
+        rows : list[dict[str, Any]] = []
+        for fold, model in self.fit():
+            for position, C in enumerate(model.Cs):
+                rows.append({
+                    "test start" : fold.test_start,
+                    "test end" : fold.test_end,
+                    "n_train" : len(fold.train),
+                    "n_test" : len(fold.test),
+                    "C" : float(C),
+                    "n_iter" : int(model.n_iter[position]),
+                    "log loss" : float(model.log_loss[position]),
+                    "roc auc" : float(model.roc_auc[position]),
+                    "accuracy" : float(model.accuracy[position]),
+                })
+        return pd.DataFrame(rows, columns=[*FOLD_COLUMNS, "C", "n_iter", *METRICS])
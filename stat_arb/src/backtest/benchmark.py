@@ -0,0 +1,66 @@
+import argparse
+import time
+
+import numpy as np
+
+from stat_arb.src.backtest.pairs_backtest import backtest_positions
+
+
+def synthetic_book(
+        n_pairs : int,
+        n_days : int,
+        n_tickers : int = 500,
+        seed : int = 0,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # random-walk closes and band-like positions that change a few times a month
+    rng = np.random.default_rng(seed)
+    prices = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, size=(n_days, n_tickers)), axis=0))
+    changes = rng.random((n_days, n_pairs)) < 0.15
+    positions = np.where(changes, rng.integers(-1, 2, size=(n_days, n_pairs)), 0)
+    rows = np.where(changes, np.arange(n_days)[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    positions = np.take_along_axis(positions, rows, axis=0).astype(np.int8)
+
+    dependents = rng.integers(0, n_tickers, n_pairs)
+    independents = (dependents + rng.integers(1, n_tickers, n_pairs)) % n_tickers
+    hedge_ratios = rng.uniform(0.5, 1.5, n_pairs)
+    return prices, positions, dependents, independents, hedge_ratios
+
+
+def benchmark_backtest(
+        n_pairs : int = 2000,
+        n_days : int = 2520,
+        repeats : int = 3,
+        seed : int = 0,
+) -> dict[str, float]:
+    '''
+    best of repeats wall time of backtest_positions on a synthetic book, and its throughput
+    '''
+    book = synthetic_book(n_pairs, n_days, seed=seed)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backtest_positions(*book)
+        timings.append(time.perf_counter() - start)
+
+    seconds = min(timings)
+    return {
+        "n_pairs" : n_pairs,
+        "n_days" : n_days,
+        "seconds" : seconds,
+        "pair_days_per_second" : n_pairs * n_days / seconds,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pairs backtester throughput")
+    parser.add_argument("--pairs", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=2520)
+    parser.add_argument("--repeats", type=int, default=3)
+    arguments = parser.parse_args()
+
+    report = benchmark_backtest(arguments.pairs, arguments.days, arguments.repeats)
+    print(
+        f"{report['n_pairs']} pairs x {report['n_days']} days in {report['seconds']:.3f}s, "
+        f"{report['pair_days_per_second'] / 1e6:.1f}M pair-days/s"
+    )
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from typing import NamedTuple, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from stat_arb.src.features.batched_cointegrations import FloatArray, IntArray
+
+if TYPE_CHECKING:
+    from utils import data_loader
+
+
+TRADING_DAYS_PER_YEAR : int = 252
+DEFAULT_COST_BPS : float = 5.0
+
+
+class BacktestResult(NamedTuple):
+    # (dates, pairs) arrays are per unit of gross capital in each pair, not compounded
+    pair_returns: FloatArray
+    gross_returns: FloatArray
+    costs: FloatArray
+    turnover: FloatArray
+    pair_pnl: FloatArray
+    pair_drawdowns: FloatArray
+    # (dates,) portfolio with capital split equally over the pairs
+    portfolio_returns: FloatArray
+    portfolio_pnl: FloatArray
+    portfolio_drawdown: FloatArray
+
+
+def leg_weights(
+        positions : np.ndarray,
+        hedge_ratios : FloatArray,
+) -> tuple[FloatArray, FloatArray]:
+    '''
+    (dates, pairs) weights of the dependent and independent legs, one spread unit is long 1 of
+    the dependent and short hedge ratio of the independent, scaled to a gross of 1
+    '''
+    gross = 1 + np.abs(hedge_ratios)
+    dependent_weights = positions / gross
+    return dependent_weights, -dependent_weights * hedge_ratios
+
+
+def drawdowns(pnl : FloatArray) -> FloatArray:
+    # the book starts flat, so zero is the first peak and a curve that only falls draws down too
+    return pnl - np.maximum.accumulate(np.maximum(pnl, 0), axis=0)
+
+
+def backtest_positions(
+        prices : FloatArray,
+        positions : np.ndarray,
+        dependents : IntArray,
+        independents : IntArray,
+        hedge_ratios : FloatArray,
+        cost_bps : float = DEFAULT_COST_BPS,
+) -> BacktestResult:
+    '''
+    P&L, costs, turnover and drawdowns of every pair from (dates, tickers) close prices and
+    (dates, pairs) spread positions, all as whole-array operations
+
+    the position decided on a close is held over the next bar, so returns on day t come from
+    positions[t - 1]. costs are cost_bps of the traded notional, charged on the day the weights
+    change. missing prices contribute no return
+    '''
+    with np.errstate(divide="ignore", invalid="ignore"):
+        asset_returns = np.zeros_like(prices, dtype=np.float64)
+        asset_returns[1:] = prices[1:] / prices[:-1] - 1
+    asset_returns[~np.isfinite(asset_returns)] = 0
+
+    dependent_weights, independent_weights = leg_weights(positions.astype(np.float64), hedge_ratios)
+    held_dependent = np.zeros_like(dependent_weights)
+    held_independent = np.zeros_like(independent_weights)
+    held_dependent[1:] = dependent_weights[:-1]
+    held_independent[1:] = independent_weights[:-1]
+
+    gross_returns = (
+        held_dependent * asset_returns[:, dependents]
+        + held_independent * asset_returns[:, independents]
+    )
+
+    turnover = np.abs(np.diff(dependent_weights, axis=0, prepend=0)) + np.abs(
+        np.diff(independent_weights, axis=0, prepend=0)
+    )
+    costs = turnover * (cost_bps / 1e4)
+    pair_returns = gross_returns - costs
+    pair_pnl = np.cumsum(pair_returns, axis=0)
+
+    portfolio_returns = pair_returns.mean(axis=1) if pair_returns.shape[1] else np.zeros(pair_returns.shape[0])
+    portfolio_pnl = np.cumsum(portfolio_returns)
+
+    return BacktestResult(
+        pair_returns,
+        gross_returns,
+        costs,
+        turnover,
+        pair_pnl,
+        drawdowns(pair_pnl),
+        portfolio_returns,
+        portfolio_pnl,
+        drawdowns(portfolio_pnl),
+    )
+
+
+def annualized_sharpe(
+        returns : FloatArray,
+        periods_per_year : int,
+) -> FloatArray:
+    mean = returns.mean(axis=0)
+    std = returns.std(axis=0, ddof=1) if returns.shape[0] > 1 else np.zeros_like(mean)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = mean / std * np.sqrt(periods_per_year)
+    return np.where(std > 0, sharpe, np.nan)
+
+
+class PairsBacktester:
+    '''
+    backtests the position frames of CointegrationEngine.spread_signals against the close
+    prices of the data loader
+    '''
+
+    def __init__(
+            self,
+            data_loader_source : data_loader.DataLoader,
+            cost_bps : float = DEFAULT_COST_BPS,
+            periods_per_year : int = TRADING_DAYS_PER_YEAR,
+    ) -> None:
+        self.__prices : pd.DataFrame = data_loader_source.load_data_nyse()
+        self.cost_bps = cost_bps
+        self.periods_per_year = periods_per_year
+
+    def run(
+            self,
+            positions : pd.DataFrame,
+            cointegration_results : pd.DataFrame,
+    ) -> BacktestResult:
+        '''
+        positions has one "dependent~independent" column per pair, hedge ratios are looked up
+        by direction in an engel_granger frame
+        '''
+        hedge_ratios = cointegration_results.drop_duplicates("direction").set_index("direction")["hedge ratio"]
+        legs = [direction.split("~") for direction in positions.columns]
+        column_positions = {ticker: i for i, ticker in enumerate(self.__prices.columns)}
+        prices = self.__prices.reindex(positions.index).to_numpy(dtype=np.float64)
+
+        return backtest_positions(
+            prices,
+            positions.to_numpy(),
+            np.array([column_positions[a] for a, _ in legs], dtype=np.int64),
+            np.array([column_positions[b] for _, b in legs], dtype=np.int64),
+            hedge_ratios.reindex(positions.columns).to_numpy(dtype=np.float64),
+            self.cost_bps,
+        )
+
+    def pair_summary(
+            self,
+            result : BacktestResult,
+            directions : list[str],
+    ) -> pd.DataFrame:
+        years = max(result.pair_returns.shape[0], 1) / self.periods_per_year
+        return pd.DataFrame(
+            {
+                "total pnl" : result.pair_pnl[-1] if len(result.pair_pnl) else np.zeros(len(directions)),
+                "sharpe" : annualized_sharpe(result.pair_returns, self.periods_per_year),
+                "max drawdown" : result.pair_drawdowns.min(axis=0, initial=0),
+                "costs" : result.costs.sum(axis=0),
+                "annual turnover" : result.turnover.sum(axis=0) / years,
+            },
+            index=pd.Index(directions, name="direction"),
+        )
+
+    def portfolio_frame(
+            self,
+            result : BacktestResult,
+            dates : pd.Index,
+    ) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "returns" : result.portfolio_returns,
+                "gross returns" : result.gross_returns.mean(axis=1) if result.gross_returns.shape[1] else 0.0,
+                "costs" : result.costs.mean(axis=1) if result.costs.shape[1] else 0.0,
+                "turnover" : result.turnover.mean(axis=1) if result.turnover.shape[1] else 0.0,
+                "pnl" : result.portfolio_pnl,
+                "drawdown" : result.portfolio_drawdown,
+            },
+            index=dates,
+        )
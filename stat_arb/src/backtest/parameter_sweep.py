@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+from pathlib import Path
+from typing import Any, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from stat_arb.src.backtest.pairs_backtest import (
+    DEFAULT_COST_BPS,
+    TRADING_DAYS_PER_YEAR,
+    annualized_sharpe,
+    backtest_positions,
+    drawdowns,
+)
+from stat_arb.src.features import spread_signals
+from stat_arb.src.features.batched_cointegrations import FloatArray
+from stat_arb.src.features.price_features import PriceFeatures
+from utils.shared_arrays import shared_array_pool, worker_array
+
+if TYPE_CHECKING:
+    from utils import data_loader
+
+
+PARAMETERS : tuple[str, ...] = ("window", "entry_z", "exit_z", "stop_z", "max_p")
+
+DEFAULT_GRID : dict[str, list[float]] = {
+    "window" : [spread_signals.DEFAULT_WINDOW],
+    "entry_z" : [spread_signals.DEFAULT_ENTRY_Z],
+    "exit_z" : [spread_signals.DEFAULT_EXIT_Z],
+    "stop_z" : [spread_signals.DEFAULT_STOP_Z],
+    "max_p" : [0.05],
+}
+
+METRICS : tuple[str, ...] = ("n_pairs", "total pnl", "sharpe", "max drawdown", "annual turnover", "trades")
+
+
+def expand_grid(grid : dict[str, list[Any]]) -> list[dict[str, Any]]:
+    '''
+    every combination of the grid values, parameters left out take DEFAULT_GRID's value and
+    band orderings that zscore_positions would reject (exit < entry < stop) are dropped
+    '''
+    unknown = set(grid) - set(PARAMETERS)
+    assert not unknown, f"Unknown sweep parameters {sorted(unknown)}"
+
+    values = [list(grid.get(name, DEFAULT_GRID[name])) for name in PARAMETERS]
+    points = [dict(zip(PARAMETERS, combination)) for combination in itertools.product(*values)]
+    return [
+        {name : int(value) if name == "window" else float(value) for name, value in point.items()}
+        for point in points
+        if 0 <= point["exit_z"] < point["entry_z"] < point["stop_z"]
+    ]
+
+
+def portfolio_metrics(
+        pair_returns : FloatArray,
+        turnover : FloatArray,
+        entries : np.ndarray,
+        periods_per_year : int,
+) -> dict[str, float]:
+    # equal capital over the selected pairs, P&L, sharpe and drawdown as PairsBacktester gives them
+    n_days, n_pairs = pair_returns.shape
+    if n_pairs == 0:
+        return {"n_pairs" : 0, "total pnl" : 0.0, "sharpe" : float("nan"), "max drawdown" : 0.0,
+                "annual turnover" : 0.0, "trades" : 0}
+
+    returns = pair_returns.mean(axis=1)
+    pnl = np.cumsum(returns)
+    return {
+        "n_pairs" : int(n_pairs),
+        "total pnl" : float(pnl[-1]),
+        "sharpe" : float(annualized_sharpe(returns, periods_per_year)),
+        "max drawdown" : float(drawdowns(pnl).min(initial=0)),
+        "annual turnover" : float(turnover.mean(axis=1).sum() / (n_days / periods_per_year)),
+        "trades" : int(entries.sum()),
+    }
+
+
+def _sweep_window(
+        spreads : FloatArray,
+        prices : FloatArray,
+        legs : tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        window : int,
+        points : list[dict[str, Any]],
+        cost_bps : float,
+        periods_per_year : int,
+) -> list[dict[str, float]]:
+    '''
+    every grid point sharing one window: the rolling z-scores are computed once, each band
+    triple is backtested once over all pairs and the p-value cutoffs only pick columns
+    '''
+    dependents, independents, hedge_ratios, p_values = legs
+    zscores = spread_signals.rolling_zscores(spreads, window)
+
+    backtests : dict[tuple[float, float, float], tuple[Any, np.ndarray]] = {}
+    metrics : list[dict[str, float]] = []
+    for point in points:
+        bands = (point["entry_z"], point["exit_z"], point["stop_z"])
+        if bands not in backtests:
+            positions, entries, _, _ = spread_signals.zscore_positions(zscores, *bands)
+            result = backtest_positions(prices, positions, dependents, independents, hedge_ratios, cost_bps)
+            backtests[bands] = (result, entries)
+
+        result, entries = backtests[bands]
+        selected = p_values <= point["max_p"]
+        metrics.append(portfolio_metrics(
+            result.pair_returns[:, selected],
+            result.turnover[:, selected],
+            entries[:, selected],
+            periods_per_year,
+        ))
+    return metrics
+
+
+def _sweep_window_shared(
+        legs : tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        window : int,
+        points : list[dict[str, Any]],
+        cost_bps : float,
+        periods_per_year : int,
+) -> list[dict[str, float]]:
+    return _sweep_window(worker_array("spreads"), worker_array("prices"), legs, window, points, cost_bps, periods_per_year)
+
+
+class ParameterSweep:
+    '''
+    grid search of the z-score band strategy over window, entry / exit / stop thresholds and
+    the engel_granger p-value cutoff
+
+    spreads are built once for every pair of the cointegration frame. grid points are grouped
+    by window so each group shares its rolling statistics, and groups run on a process pool
+    reading prices and spreads from shared memory. each point's metrics are cached as json under
+    a key of its parameters, the costs and a hash of the prices and pair estimates, so growing
+    the grid only runs the new points and changed data never serves stale results
+    '''
+
+    def __init__(
+            self,
+            data_loader_source : data_loader.DataLoader,
+            cointegration_results : pd.DataFrame,
+            cache_dir : Path | str | None = None,
+            cost_bps : float = DEFAULT_COST_BPS,
+            periods_per_year : int = TRADING_DAYS_PER_YEAR,
+            n_workers : int = 1,
+    ) -> None:
+        assert n_workers >= 1, f"Expected n_workers >= 1 got {n_workers}"
+        prices = data_loader_source.load_data_nyse()
+        self.__features = PriceFeatures(prices)
+        self.__prices = np.ascontiguousarray(prices.to_numpy(dtype=np.float64))
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.cost_bps = cost_bps
+        self.periods_per_year = periods_per_year
+        self.n_workers = n_workers
+
+        pairs = cointegration_results.drop_duplicates("direction")
+        column_positions = {ticker: i for i, ticker in enumerate(prices.columns)}
+        legs = [direction.split("~") for direction in pairs["direction"]]
+        self.directions : list[str] = pairs["direction"].tolist()
+        self.__legs = (
+            np.array([column_positions[a] for a, _ in legs], dtype=np.int64),
+            np.array([column_positions[b] for _, b in legs], dtype=np.int64),
+            pairs["hedge ratio"].to_numpy(dtype=np.float64),
+            pairs["p"].to_numpy(dtype=np.float64),
+        )
+        self.__constants = pairs["constant"].to_numpy(dtype=np.float64)
+        self.data_hash = self._hash_inputs()
+
+    def _hash_inputs(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.__features.data_hash.encode())
+        for values in (*self.__legs, self.__constants):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+    def point_key(self, point : dict[str, Any]) -> str:
+        payload = {
+            "parameters" : {name : point[name] for name in PARAMETERS},
+            "cost_bps" : self.cost_bps,
+            "periods_per_year" : self.periods_per_year,
+            "data" : self.data_hash,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _cached(self, point : dict[str, Any]) -> dict[str, float] | None:
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{self.point_key(point)}.json"
+        return json.loads(path.read_text()) if path.exists() else None
+
+    def _store(self, point : dict[str, Any], metrics : dict[str, float]) -> None:
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / f"{self.point_key(point)}.json"
+        partial = path.with_suffix(".part")
+        partial.write_text(json.dumps(metrics))
+        partial.replace(path)
+
+    def spreads(self) -> FloatArray:
+        dependents, independents, hedge_ratios, _ = self.__legs
+        return np.ascontiguousarray(spread_signals.pair_spreads(
+            self.__features.log_price_matrix(), dependents, independents, self.__constants, hedge_ratios
+        ))
+
+    def run(self, grid : dict[str, list[Any]]) -> pd.DataFrame:
+        '''
+        one row per valid grid point, parameters then METRICS, in grid order
+        '''
+        points = expand_grid(grid)
+        results : list[dict[str, float] | None] = [self._cached(point) for point in points]
+
+        by_window : dict[int, list[int]] = {}
+        for position, point in enumerate(points):
+            if results[position] is None:
+                by_window.setdefault(point["window"], []).append(position)
+
+        if by_window:
+            spreads = self.spreads()
+            groups = list(by_window.items())
+            if self.n_workers == 1 or len(groups) == 1:
+                computed = [
+                    _sweep_window(
+                        spreads, self.__prices, self.__legs, window,
+                        [points[position] for position in positions],
+                        self.cost_bps, self.periods_per_year,
+                    )
+                    for window, positions in groups
+                ]
+            else:
+                arrays = {"spreads" : spreads, "prices" : self.__prices}
+                with shared_array_pool(arrays, min(self.n_workers, len(groups))) as pool:
+                    futures = [
+                        pool.submit(
+                            _sweep_window_shared,
+                            self.__legs, window,
+                            [points[position] for position in positions],
+                            self.cost_bps, self.periods_per_year,
+                        )
+                        for window, positions in groups
+                    ]
+                    computed = [future.result() for future in futures]
+
+            for (_, positions), metrics in zip(groups, computed):
+                for position, point_metrics in zip(positions, metrics):
+                    results[position] = point_metrics
+                    self._store(points[position], point_metrics)
+
+        return pd.DataFrame(
+            [{**point, **metrics} for point, metrics in zip(points, results)],
+            columns=[*PARAMETERS, *METRICS],
+        )
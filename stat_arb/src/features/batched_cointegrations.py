@@ -0,0 +1,273 @@
+from typing import Any
+from utils import instrumentation
+from utils.shared_arrays import shared_array_pool, worker_array
+
+import numpy as np
+
+
+FloatArray = np.ndarray[Any, np.dtype[np.float64]]
+IntArray = np.ndarray[Any, np.dtype[np.int64]]
+
+# number of pairs regressed together, bounds the (pairs, observations, lags) design tensor
+DEFAULT_CHUNK_SIZE : int = 128
+# shards handed to each worker, more than one keeps the pool busy when shards finish unevenly
+SHARDS_PER_WORKER : int = 4
+
+# MacKinnon (1994) response surface for the p-value of a constant-only ADF test on one series,
+# the tables statsmodels.tsa.adfvalues.mackinnonp reads for regression="c", N=1
+# https://www.jstor.org/stable/1391481 (updated 2010 estimates)
+_TAU_MAX_C : float = 2.74
+_TAU_MIN_C : float = -18.83
+_TAU_STAR_C : float = -1.61
+_TAU_SMALL_P_C : tuple[float, ...] = (2.1659, 1.4412, 0.038269)
+_TAU_LARGE_P_C : tuple[float, ...] = (1.7339, 0.93202, -0.12745, -0.010368)
+
+
+def default_adf_maxlag(observations : int) -> int:
+    '''
+    same rule as statsmodels.tsa.stattools.adfuller with regression="c"
+    12 * (nobs / 100) ^ (1/4) capped so the regression keeps enough degrees of freedom
+    '''
+    maxlag : int = int(np.ceil(12.0 * np.power(observations / 100.0, 1 / 4.0)))
+    return min(observations // 2 - 2, maxlag)
+
+
+def mackinnon_p_values(t_statistics : FloatArray) -> FloatArray:
+    '''
+    vectorised statsmodels.tsa.adfvalues.mackinnonp for regression="c" and N=1,
+    the same surface adfuller uses on the residuals
+    '''
+    # normal cdf, imported here so loading the module stays free of scipy
+    from scipy.special import ndtr
+
+    t_statistics = np.asarray(t_statistics, dtype=np.float64)
+    small_p = ndtr(np.polyval(_TAU_SMALL_P_C[::-1], t_statistics))
+    large_p = ndtr(np.polyval(_TAU_LARGE_P_C[::-1], t_statistics))
+    p_values = np.where(t_statistics <= _TAU_STAR_C, small_p, large_p)
+    p_values = np.where(t_statistics > _TAU_MAX_C, 1.0, p_values)
+    p_values = np.where(t_statistics < _TAU_MIN_C, 0.0, p_values)
+    return p_values
+
+
+@instrumentation.instrumented("engel_granger.ols")
+def batched_hedge_ratios(
+        dependents : FloatArray,
+        independents : FloatArray,
+) -> tuple[FloatArray, FloatArray, FloatArray]:
+    '''
+    closed form of sm.OLS(dependent, add_constant(independent)) for every column at once
+    returns hedge ratios, constants and the (observations, pairs) residual matrix
+    '''
+    dependent_mean = dependents.mean(axis=0)
+    independent_mean = independents.mean(axis=0)
+    independent_centered = independents - independent_mean
+
+    beta = (
+        np.einsum("tp,tp->p", independent_centered, dependents - dependent_mean)
+        / np.einsum("tp,tp->p", independent_centered, independent_centered)
+    )
+    constant = dependent_mean - beta * independent_mean
+    residuals = dependents - constant - beta * independents
+    return beta, constant, residuals
+
+
+def _adf_design(
+        residuals : FloatArray,
+        lags : int,
+) -> tuple[FloatArray, FloatArray]:
+    '''
+    (pairs, 2 + lags, observations) regressors [const, lagged level, lagged differences]
+    and the (pairs, observations) differenced target, aligned like adfuller's lagmat
+    '''
+    series = np.ascontiguousarray(residuals.T)
+    observations = series.shape[1]
+    difference = np.diff(series, axis=1)
+    usable = observations - 1 - lags
+
+    design = np.empty((series.shape[0], lags + 2, usable))
+    design[:, 0] = 1.0
+    design[:, 1] = series[:, lags: observations - 1]
+    for lag in range(1, lags + 1):
+        design[:, lag + 1] = difference[:, lags - lag: observations - 1 - lag]
+
+    return design, difference[:, lags:]
+
+
+@instrumentation.instrumented("engel_granger.adf")
+def batched_adf(
+        residuals : FloatArray,
+        maxlag : int | None = None,
+) -> tuple[FloatArray, IntArray]:
+    '''
+    augmented Dickey-Fuller t-statistics of every residual column with AIC lag selection
+
+    mirrors adfuller(residual) defaults: every candidate lag is fitted on the common
+    maxlag-trimmed sample, AIC picks the lag, then the chosen lag is refitted on its own
+    longer sample. one Cholesky factor of each pair's normal equations gives every nested
+    lag model at once
+    '''
+    observations = residuals.shape[0]
+    if maxlag is None:
+        maxlag = default_adf_maxlag(observations)
+
+    design, target = _adf_design(residuals, maxlag)
+    usable = target.shape[1]
+    gram, moment = _normal_equations(design, target)
+    # forward substitution through the Cholesky factor, its squares are each column's SSR reduction
+    projection = np.linalg.solve(np.linalg.cholesky(gram), moment[:, :, None])[:, :, 0]
+    target_ss = np.einsum("pn,pn->p", target, target)
+
+    # prefix models [const, level] ... [const, level, maxlag differences]
+    ssr = target_ss[:, None] - np.cumsum(projection ** 2, axis=1)[:, 1:]
+    parameters = np.arange(2, maxlag + 3)
+    aic = usable * (np.log(2 * np.pi) + np.log(ssr / usable) + 1) + 2 * parameters
+    # argmin keeps the first minimum, same tie break as adfuller's min over (aic, lag)
+    best_lags = np.argmin(aic, axis=1)
+
+    t_statistics = np.empty(residuals.shape[1])
+    for lag in np.unique(best_lags):
+        members = np.flatnonzero(best_lags == lag)
+        t_statistics[members] = _adf_t_statistics(residuals[:, members], int(lag))
+
+    return t_statistics, best_lags
+
+
+def _adf_t_statistics(
+        residuals : FloatArray,
+        lags : int,
+) -> FloatArray:
+    design, target = _adf_design(residuals, lags)
+    usable = target.shape[1]
+    gram, moment = _normal_equations(design, target)
+    gram_inverse = np.linalg.inv(gram)
+    coefficients = np.einsum("pkj,pj->pk", gram_inverse, moment)
+
+    ssr = np.einsum("pn,pn->p", target, target) - np.einsum("pk,pk->p", coefficients, moment)
+    sigma_squared = ssr / (usable - lags - 2)
+    return coefficients[:, 1] / np.sqrt(sigma_squared * gram_inverse[:, 1, 1])
+
+
+def _normal_equations(
+        design : FloatArray,
+        target : FloatArray,
+) -> tuple[FloatArray, FloatArray]:
+    return (
+        np.matmul(design, design.transpose(0, 2, 1)),
+        np.matmul(design, target[:, :, None])[:, :, 0],
+    )
+
+
+@instrumentation.instrumented("engel_granger.half_life")
+def batched_half_lives(residuals : FloatArray) -> FloatArray:
+    '''
+    AR(1) half-life -ln(2) / lambda from the OLS of diff(residual) on [const, lagged residual]
+    '''
+    lagged = residuals[:-1]
+    difference = residuals[1:] - lagged
+    lagged_centered = lagged - lagged.mean(axis=0)
+    lambda_ = (
+        np.einsum("tp,tp->p", lagged_centered, difference - difference.mean(axis=0))
+        / np.einsum("tp,tp->p", lagged_centered, lagged_centered)
+    )
+    return -np.log(2) / lambda_
+
+
+def engel_granger_pairs(
+        log_prices : FloatArray,
+        first_legs : IntArray,
+        second_legs : IntArray,
+        crit_value : float,
+        chunk_size : int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, np.ndarray]:
+    '''
+    both regression directions of every (first, second) column pair of a (observations, tickers)
+    log price matrix, keeping the direction with the lower ADF p-value like
+    CointegrationEngine._engel_granger_determinant
+
+    pairs are processed in fixed chunks so a pair's numbers never depend on how the list is split
+    '''
+    pair_count = len(first_legs)
+    results : dict[str, np.ndarray] = {
+        "is forward" : np.empty(pair_count, dtype=bool),
+        "p" : np.empty(pair_count),
+        "constant" : np.empty(pair_count),
+        "hedge ratio" : np.empty(pair_count),
+        "t-statistic" : np.empty(pair_count),
+        "is cointegrated" : np.empty(pair_count, dtype=bool),
+        "half_life" : np.empty(pair_count),
+    }
+
+    for start in range(0, pair_count, chunk_size):
+        chunk = slice(start, min(start + chunk_size, pair_count))
+        a = log_prices[:, first_legs[chunk]]
+        b = log_prices[:, second_legs[chunk]]
+
+        beta_ab, constant_ab, residual_ab = batched_hedge_ratios(a, b)
+        beta_ba, constant_ba, residual_ba = batched_hedge_ratios(b, a)
+        t_ab, _ = batched_adf(residual_ab)
+        t_ba, _ = batched_adf(residual_ba)
+        p_ab = mackinnon_p_values(t_ab)
+        p_ba = mackinnon_p_values(t_ba)
+
+        is_forward = p_ab <= p_ba
+        t_statistic = np.where(is_forward, t_ab, t_ba)
+        is_cointegrated = t_statistic < crit_value
+        residual = np.where(is_forward, residual_ab, residual_ba)
+
+        results["is forward"][chunk] = is_forward
+        results["p"][chunk] = np.where(is_forward, p_ab, p_ba)
+        results["constant"][chunk] = np.where(is_forward, constant_ab, constant_ba)
+        results["hedge ratio"][chunk] = np.where(is_forward, beta_ab, beta_ba)
+        results["t-statistic"][chunk] = t_statistic
+        results["is cointegrated"][chunk] = is_cointegrated
+        results["half_life"][chunk] = np.where(is_cointegrated, batched_half_lives(residual), np.inf)
+
+    return results
+
+
+def _engel_granger_shard(
+        first_legs : IntArray,
+        second_legs : IntArray,
+        crit_value : float,
+        chunk_size : int,
+) -> dict[str, np.ndarray]:
+    return engel_granger_pairs(worker_array("log_prices"), first_legs, second_legs, crit_value, chunk_size)
+
+
+def parallel_engel_granger_pairs(
+        log_prices : FloatArray,
+        first_legs : IntArray,
+        second_legs : IntArray,
+        crit_value : float,
+        n_workers : int,
+        chunk_size : int = DEFAULT_CHUNK_SIZE,
+) -> dict[str, np.ndarray]:
+    '''
+    engel_granger_pairs spread over a process pool
+
+    the log prices are placed in shared memory once, tasks only carry pair indices. shard
+    boundaries fall on chunk boundaries and shards are gathered in submission order, so the
+    output is identical for any worker count
+    '''
+    pair_count = len(first_legs)
+    chunk_count = -(-pair_count // chunk_size)
+    chunks_per_shard = max(1, -(-chunk_count // (n_workers * SHARDS_PER_WORKER)))
+    shard_size = chunks_per_shard * chunk_size
+
+    with shared_array_pool({"log_prices" : np.asarray(log_prices, dtype=np.float64)}, n_workers) as pool:
+        futures = [
+            pool.submit(
+                _engel_granger_shard,
+                first_legs[start: start + shard_size],
+                second_legs[start: start + shard_size],
+                crit_value,
+                chunk_size,
+            )
+            for start in range(0, pair_count, shard_size)
+        ]
+        shards = [future.result() for future in futures]
+
+    if not shards:
+        return engel_granger_pairs(log_prices, first_legs, second_legs, crit_value, chunk_size)
+
+    return {key : np.concatenate([shard[key] for shard in shards]) for key in shards[0]}
@@ -1,12 +1,16 @@
-from statsmodels.regression.linear_model import RegressionResults
-from statsmodels.tsa.stattools import coint, adfuller
-from utils import data_loader
-from typing import Any
+from __future__ import annotations
+
+from stat_arb.src.features import batched_cointegrations, kalman_hedge, pair_screens, rolling_cointegrations, spread_signals
+from stat_arb.src.features.price_features import PriceFeatures
+from utils import data_loader, instrumentation
+from typing import Any, TYPE_CHECKING
 
-import statsmodels.api as sm
 import pandas as pd
 import numpy as np
 
+if TYPE_CHECKING:
+    from statsmodels.regression.linear_model import RegressionResults
+
 
 def determine_top_cointegrated_pairs(given_stack: pd.DataFrame, n: int) -> pd.DataFrame:
     given_stack.sort_values(by=["p"], inplace=True)
@@ -15,27 +19,42 @@ def determine_top_cointegrated_pairs(given_stack: pd.DataFrame, n: int) -> pd.Da
 
 
 class CointegrationEngine:
+    @instrumentation.instrumented()
     def __init__(
             self,
-            data_loader_source: data_loader.DataLoader
+            data_loader_source: data_loader.DataLoader,
+            feature_dtype: type | np.dtype = np.float64,
     ) -> None:
         self.__data_loader: data_loader.DataLoader = data_loader_source
         self.__data: pd.DataFrame = self.__data_loader.load_data_nyse()
-        self.__log_returns: pd.DataFrame = pd.DataFrame()
         self.__ticker_columns = self.__data.columns
+        # log prices, returns and correlations are memoized on the data hash and read-only
+        self.features: PriceFeatures = PriceFeatures(self.__data, feature_dtype)
+
+    @instrumentation.instrumented()
+    def reload_data(self) -> bool:
+        '''
+        reloads prices from the data loader, memoized features are only dropped when they changed
+        '''
+        self.__data = self.__data_loader.load_data_nyse()
+        self.__ticker_columns = self.__data.columns
+        return self.features.update(self.__data)
 
     def conduct_log_transformations_on_prices(
             self,
             is_corr_exclusionary=True
     ) -> tuple[pd.DataFrame, pd.Series]:
-        log_prices: pd.DataFrame = pd.DataFrame()
-        log_prices.index = pd.to_datetime(self.__data.index)
-
-        for ticker in self.__ticker_columns:
-            results: np.ndarray = np.log(self.__data[ticker])
-            log_prices.insert(loc=0, column=ticker, value=results)
+        log_prices, high_corr_stack = self._log_transformations(is_corr_exclusionary)
+        return log_prices.copy(), high_corr_stack
 
-        corr_stack = log_prices.corr().stack()
+    @instrumentation.instrumented("CointegrationEngine.conduct_log_transformations_on_prices")
+    def _log_transformations(
+            self,
+            is_corr_exclusionary : bool,
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        # the log prices frame shared with every engine on the same data, it must not be written to
+        log_prices: pd.DataFrame = self.features.log_prices(copy=False)
+        corr_stack = self.features.correlation_stack(copy=False)
 
         if is_corr_exclusionary:
             high_corr_stack_criterion = (corr_stack.values > 0.7) & (
@@ -51,24 +70,48 @@ class CointegrationEngine:
         high_corr_stack.columns = ["correlation"]
         return log_prices, high_corr_stack
 
-    def compute_log_returns(self) -> pd.DataFrame:
-        self.__log_returns.index = pd.to_datetime(self.__data.index)
+    def screen_candidate_pairs(
+            self,
+            screens : list[pair_screens.PairScreen],
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        '''
+        unique unordered candidate pairs left after the screens, shaped like the
+        correlation stack so engel_granger can test them instead of every ordered pair
+        '''
+        log_prices, candidates = self._screen_candidate_pairs(screens)
+        return log_prices.copy(), candidates
 
-        for ticker in self.__ticker_columns:
-            results: np.ndarray = np.log(
-                self.__data[ticker] / self.__data[ticker].shift(1)
-            )
-            self.__log_returns.insert(loc=0, column=ticker, value=results)
+    @instrumentation.instrumented("CointegrationEngine.screen_candidate_pairs")
+    def _screen_candidate_pairs(
+            self,
+            screens : list[pair_screens.PairScreen],
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        log_prices, _ = self._log_transformations(False)
+        first_legs, second_legs = pair_screens.screen_pairs(log_prices, screens)
+
+        tickers = log_prices.columns
+        correlation = self.features.correlation_matrix()
+        candidates = pd.DataFrame(
+            {"correlation" : correlation[first_legs, second_legs]},
+            index=pd.MultiIndex.from_arrays([tickers[first_legs], tickers[second_legs]]),
+        )
+        instrumentation.count("candidate pairs", len(candidates))
+        return log_prices, candidates
 
-        # aimed to zero the first row and as failsafe since it is the first value and will be Nan
-        self.__log_returns = self.__log_returns.fillna(0)
-        return self.__log_returns
+    @instrumentation.instrumented()
+    def compute_log_returns(self) -> pd.DataFrame:
+        # the first row, and any gap, is zero rather than NaN
+        return self.features.log_returns()
 
     def _engel_granger_fun(
             self,
             pairs : tuple[str, str],
             log_prices : pd.DataFrame,
     ) -> dict[str, float | str]:
+        # statsmodels is only needed by the reference per-pair path, keep it off the import path
+        import statsmodels.api as sm
+        from statsmodels.tsa.stattools import adfuller
+
         x = sm.add_constant(log_prices[pairs[1]])
         model = sm.OLS(log_prices[pairs[0]], x).fit()
         residual = model.resid
@@ -122,6 +165,8 @@ class CointegrationEngine:
             residuals : np.ndarray[Any, np.dtype[np.float64]],
     ) -> float:
         if is_cointegrated:
+            import statsmodels.api as sm
+
             residual_lag : np.ndarray[Any, np.dtype[np.float64]] = np.roll(residuals, 1)
             residual_lag[0] = 0
             residual_difference : np.ndarray[tuple[Any]]= residuals - residual_lag
@@ -135,11 +180,26 @@ class CointegrationEngine:
 
         return np.inf
 
+    @instrumentation.instrumented()
     def engel_granger(
-            self
+            self,
+            is_batched : bool = True,
+            n_workers : int = 1,
+            screens : list[pair_screens.PairScreen] | None = None,
     ) -> pd.DataFrame:
-        log_prices, corr_stack = self.conduct_log_transformations_on_prices(False)
+        assert n_workers >= 1, f"Expected n_workers >= 1 got {n_workers}"
+        assert is_batched or n_workers == 1, "parallel pair testing requires is_batched=True"
+
+        # without screens every ordered pair is tested, an empty list still dedupes (A,B) / (B,A)
+        if screens is None:
+            log_prices, corr_stack = self._log_transformations(False)
+        else:
+            log_prices, corr_stack = self._screen_candidate_pairs(screens)
         crit_value = self._MacKinnon_Critical_Value_formula(self.__data.shape[0])
+        instrumentation.count("pairs tested", len(corr_stack))
+
+        if is_batched:
+            return self._engel_granger_batched(log_prices, corr_stack, crit_value, n_workers)
 
         p_residual : list[float] = []
         directions : list[str] = []
@@ -163,12 +223,228 @@ class CointegrationEngine:
             t_statistic.append(choice["t-statistic"])
             half_life.append(self._halflife_fun(is_cointegrated, resid))
 
-        corr_stack.insert(loc=0, column="p", value=p_residual)
-        corr_stack.insert(loc=0, column="direction", value=directions)
-        corr_stack.insert(loc=0, column="constant", value=constant)
-        corr_stack.insert(loc=0, column="hedge ratio", value=hedge_ratio)
-        corr_stack.insert(loc=0, column="is cointegrated", value=cointegrated)
-        corr_stack.insert(loc=0, column="t_statistic", value=t_statistic)
-        corr_stack.insert(loc=0, column="half_life", value=half_life)
+        return self._engel_granger_frame(
+            corr_stack,
+            {
+                "p" : p_residual,
+                "direction" : directions,
+                "constant" : constant,
+                "hedge ratio" : hedge_ratio,
+                "is cointegrated" : cointegrated,
+                "t_statistic" : t_statistic,
+                "half_life" : half_life,
+            }
+        )
+
+    @instrumentation.instrumented()
+    def _engel_granger_batched(
+            self,
+            log_prices : pd.DataFrame,
+            corr_stack : pd.DataFrame,
+            crit_value : float,
+            n_workers : int = 1,
+    ) -> pd.DataFrame:
+        column_positions = {ticker: i for i, ticker in enumerate(log_prices.columns)}
+        first_legs = np.array([column_positions[a] for a, _ in corr_stack.index], dtype=np.int64)
+        second_legs = np.array([column_positions[b] for _, b in corr_stack.index], dtype=np.int64)
+
+        log_price_matrix = np.ascontiguousarray(log_prices.to_numpy(dtype=np.float64))
+        if n_workers > 1:
+            results = batched_cointegrations.parallel_engel_granger_pairs(
+                log_price_matrix,
+                first_legs,
+                second_legs,
+                crit_value,
+                n_workers,
+            )
+        else:
+            results = batched_cointegrations.engel_granger_pairs(
+                log_price_matrix,
+                first_legs,
+                second_legs,
+                crit_value,
+            )
+
+        directions : list[str] = [
+            f"{a}~{b}" if is_forward else f"{b}~{a}"
+            for (a, b), is_forward in zip(corr_stack.index, results["is forward"])
+        ]
+
+        return self._engel_granger_frame(
+            corr_stack,
+            {
+                "p" : results["p"],
+                "direction" : directions,
+                "constant" : results["constant"],
+                "hedge ratio" : results["hedge ratio"],
+                "is cointegrated" : results["is cointegrated"],
+                "t_statistic" : results["t-statistic"],
+                "half_life" : results["half_life"],
+            }
+        )
+
+    def _engel_granger_frame(
+            self,
+            corr_stack : pd.DataFrame,
+            columns : dict[str, Any],
+    ) -> pd.DataFrame:
+        # every insert goes to the front so the frame reads half_life ... p, correlation
+        for name, values in columns.items():
+            corr_stack.insert(loc=0, column=name, value=values)
 
         return corr_stack
+
+    @instrumentation.instrumented()
+    def rolling_engel_granger(
+            self,
+            window : int,
+            pairs : list[tuple[str, str]] | None = None,
+            screens : list[pair_screens.PairScreen] | None = None,
+    ) -> pd.DataFrame:
+        '''
+        walk-forward Engle-Granger statistics re-estimated on every trailing window
+
+        pairs are (dependent, independent) tuples, by default every unordered pair left by
+        the screens with the first leg as dependent. returns a (Date, direction) indexed panel,
+        the date being the last day of each window
+        '''
+        log_prices, _ = self._log_transformations(False)
+        crit_value = self._MacKinnon_Critical_Value_formula(window)
+
+        if pairs is None:
+            dependents, independents = pair_screens.screen_pairs(log_prices, screens or [])
+        else:
+            column_positions = {ticker: i for i, ticker in enumerate(log_prices.columns)}
+            dependents = np.array([column_positions[a] for a, _ in pairs], dtype=np.int64)
+            independents = np.array([column_positions[b] for _, b in pairs], dtype=np.int64)
+
+        results = rolling_cointegrations.rolling_engel_granger_pairs(
+            log_prices.to_numpy(dtype=np.float64),
+            dependents,
+            independents,
+            window,
+            crit_value,
+        )
+
+        tickers = log_prices.columns
+        directions = [f"{tickers[a]}~{tickers[b]}" for a, b in zip(dependents, independents)]
+        index = pd.MultiIndex.from_product(
+            [log_prices.index[window - 1:], directions],
+            names=["Date", "direction"],
+        )
+
+        return pd.DataFrame(
+            {
+                "half_life" : results["half_life"].ravel(),
+                "t_statistic" : results["t-statistic"].ravel(),
+                "is cointegrated" : results["is cointegrated"].ravel(),
+                "hedge ratio" : results["hedge ratio"].ravel(),
+                "constant" : results["constant"].ravel(),
+                "p" : results["p"].ravel(),
+            },
+            index=index,
+        )
+
+    def pair_legs(
+            self,
+            cointegration_results : pd.DataFrame,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # (dependent, independent) column positions from the "dependent~independent" directions
+        column_positions = {ticker: i for i, ticker in enumerate(self.__ticker_columns)}
+        legs = [direction.split("~") for direction in cointegration_results["direction"]]
+        dependents = np.array([column_positions[a] for a, _ in legs], dtype=np.int64)
+        independents = np.array([column_positions[b] for _, b in legs], dtype=np.int64)
+        return dependents, independents
+
+    def kalman_hedge_ratios(
+            self,
+            cointegration_results : pd.DataFrame | None = None,
+            delta : float = kalman_hedge.DEFAULT_DELTA,
+            only_cointegrated : bool = True,
+    ) -> kalman_hedge.KalmanHedgeRatios:
+        '''
+        online hedge ratio filter for the pairs of an engel_granger frame, seeded with its
+        constant and hedge ratio columns and the residual variance of those over the loaded
+        history. feed it the log prices of bars after that history
+        '''
+        if cointegration_results is None:
+            cointegration_results = self.engel_granger()
+        if only_cointegrated:
+            cointegration_results = cointegration_results[cointegration_results["is cointegrated"].astype(bool)]
+        # one filter per direction, in the pair order RiskEngine and strategy_stages use
+        cointegration_results = cointegration_results.drop_duplicates("direction")
+
+        dependents, independents = self.pair_legs(cointegration_results)
+        constants = cointegration_results["constant"].to_numpy(dtype=np.float64)
+        hedge_ratios = cointegration_results["hedge ratio"].to_numpy(dtype=np.float64)
+        observation_variances = kalman_hedge.residual_variances(
+            self.features.log_price_matrix().astype(np.float64, copy=False),
+            dependents,
+            independents,
+            constants,
+            hedge_ratios,
+        )
+        return kalman_hedge.KalmanHedgeRatios(
+            dependents, independents, constants, hedge_ratios, delta, observation_variances
+        )
+
+    @instrumentation.instrumented()
+    def spread_signals(
+            self,
+            cointegration_results : pd.DataFrame | None = None,
+            window : int | None = None,
+            half_life_multiplier : float = 2.0,
+            entry_z : float = spread_signals.DEFAULT_ENTRY_Z,
+            exit_z : float = spread_signals.DEFAULT_EXIT_Z,
+            stop_z : float = spread_signals.DEFAULT_STOP_Z,
+            only_cointegrated : bool = True,
+    ) -> pd.DataFrame:
+        '''
+        z-score band signals for every pair of an engel_granger frame, computed in one array pass
+
+        each spread is y - constant - hedge ratio * x with the frame's estimates, standardized over
+        a trailing window, a fixed one when window is given, else half_life_multiplier half-lives
+        per pair. returns a Date indexed frame with (field, direction) columns, fields being
+        spread, zscore, position, entry, exit and stop
+        '''
+        if cointegration_results is None:
+            cointegration_results = self.engel_granger()
+        if only_cointegrated:
+            cointegration_results = cointegration_results[cointegration_results["is cointegrated"].astype(bool)]
+        # without screens both orders of a pair are tested and resolve to the same direction
+        cointegration_results = cointegration_results.drop_duplicates("direction")
+
+        dependents, independents = self.pair_legs(cointegration_results)
+        if window is None:
+            windows = spread_signals.half_life_windows(
+                cointegration_results["half_life"].to_numpy(dtype=np.float64), half_life_multiplier
+            )
+        else:
+            windows = np.full(len(dependents), window, dtype=np.int64)
+
+        signals = spread_signals.spread_signals(
+            self.features.log_price_matrix().astype(np.float64, copy=False),
+            dependents,
+            independents,
+            cointegration_results["constant"].to_numpy(dtype=np.float64),
+            cointegration_results["hedge ratio"].to_numpy(dtype=np.float64),
+            windows,
+            entry_z,
+            exit_z,
+            stop_z,
+        )
+
+        directions = cointegration_results["direction"].tolist()
+        dates = self.features.log_prices(copy=False).index
+        fields = {
+            "spread" : signals.spreads,
+            "zscore" : signals.zscores,
+            "position" : signals.positions,
+            "entry" : signals.entries,
+            "exit" : signals.exits,
+            "stop" : signals.stops,
+        }
+        return pd.concat(
+            {name : pd.DataFrame(values, index=dates, columns=directions) for name, values in fields.items()},
+            axis=1,
+        )
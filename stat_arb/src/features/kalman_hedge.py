@@ -0,0 +1,137 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from stat_arb.src.features.batched_cointegrations import FloatArray, IntArray
+
+
+# state noise as a fraction of the state per bar, Chan's delta: Q = delta / (1 - delta) * I
+DEFAULT_DELTA : float = 1e-4
+# variance of the log price residual around the state's line when nothing better is known
+DEFAULT_OBSERVATION_VARIANCE : float = 1e-3
+# prior variance of the seeded constant and hedge ratio
+DEFAULT_INITIAL_VARIANCE : float = 1e-4
+
+
+class KalmanPath(NamedTuple):
+    # (bars, pairs) state and innovations after every bar of a block
+    constants : FloatArray
+    hedge_ratios : FloatArray
+    innovations : FloatArray
+    innovation_variances : FloatArray
+
+
+class KalmanHedgeRatios:
+    '''
+    online intercept and hedge ratio of many pairs, one Kalman filter per pair
+
+    each pair's log prices follow y = constant + hedge_ratio * x + e with the (constant,
+    hedge_ratio) state a random walk. the state and its 2x2 covariance live in flat per-pair
+    arrays, so one bar is a handful of elementwise operations over all pairs: O(1) per pair,
+    no history kept. pairs with a missing leg on a bar keep their state. the innovation over
+    the square root of its variance is the filter's spread z-score
+    '''
+
+    def __init__(
+            self,
+            dependents : IntArray,
+            independents : IntArray,
+            constants : FloatArray,
+            hedge_ratios : FloatArray,
+            delta : float = DEFAULT_DELTA,
+            observation_variance : float | FloatArray = DEFAULT_OBSERVATION_VARIANCE,
+            initial_variance : float = DEFAULT_INITIAL_VARIANCE,
+    ) -> None:
+        assert 0 < delta < 1, f"Expected delta in (0, 1) got {delta}"
+        self.dependents = np.asarray(dependents, dtype=np.int64)
+        self.independents = np.asarray(independents, dtype=np.int64)
+        n_pairs = len(self.dependents)
+        assert len(self.independents) == n_pairs, "dependents and independents differ in length"
+
+        self.constants = np.array(constants, dtype=np.float64)
+        self.hedge_ratios = np.array(hedge_ratios, dtype=np.float64)
+        self.state_noise = delta / (1 - delta)
+        self.observation_variance = np.broadcast_to(
+            np.asarray(observation_variance, dtype=np.float64), (n_pairs,)
+        ).copy()
+
+        # symmetric state covariance [[p00, p01], [p01, p11]]
+        self.__p00 = np.full(n_pairs, initial_variance, dtype=np.float64)
+        self.__p01 = np.zeros(n_pairs, dtype=np.float64)
+        self.__p11 = np.full(n_pairs, initial_variance, dtype=np.float64)
+        self.n_updates = 0
+
+    @property
+    def n_pairs(self) -> int:
+        return len(self.dependents)
+
+    def state_covariances(self) -> FloatArray:
+        # (pairs, 2, 2)
+        return np.stack([
+            np.stack([self.__p00, self.__p01], axis=-1),
+            np.stack([self.__p01, self.__p11], axis=-1),
+        ], axis=-2)
+
+    def update(self, log_prices : FloatArray) -> tuple[FloatArray, FloatArray]:
+        '''
+        folds in one bar of (tickers,) log prices, returns each pair's innovation and its
+        variance, both measured against the state before the bar
+        '''
+        y = log_prices[self.dependents]
+        x = log_prices[self.independents]
+        observed = ~(np.isnan(x) | np.isnan(y))
+        x = np.where(observed, x, 0.0)
+
+        # predict: the state is a random walk
+        p00 = self.__p00 + self.state_noise
+        p01 = self.__p01
+        p11 = self.__p11 + self.state_noise
+
+        # observe y = [1, x] . state
+        innovations = np.where(observed, y, 0.0) - self.constants - self.hedge_ratios * x
+        ph0 = p00 + p01 * x
+        ph1 = p01 + p11 * x
+        variances = ph0 + ph1 * x + self.observation_variance
+        gain0 = ph0 / variances
+        gain1 = ph1 / variances
+
+        # P - K H P with K = P H' / S, a pair missing a leg skips the bar entirely
+        gain0 = np.where(observed, gain0, 0.0)
+        gain1 = np.where(observed, gain1, 0.0)
+        self.constants += gain0 * innovations
+        self.hedge_ratios += gain1 * innovations
+        self.__p00 = np.where(observed, p00 - gain0 * ph0, self.__p00)
+        self.__p01 = np.where(observed, p01 - gain0 * ph1, self.__p01)
+        self.__p11 = np.where(observed, p11 - gain1 * ph1, self.__p11)
+        self.n_updates += 1
+
+        innovations[~observed] = np.nan
+        variances[~observed] = np.nan
+        return innovations, variances
+
+    def update_block(self, log_prices : FloatArray) -> KalmanPath:
+        '''
+        bar by bar update over a (bars, tickers) block, recording the path
+        '''
+        n_bars = len(log_prices)
+        path = KalmanPath(*(np.empty((n_bars, self.n_pairs)) for _ in KalmanPath._fields))
+        for bar in range(n_bars):
+            path.innovations[bar], path.innovation_variances[bar] = self.update(log_prices[bar])
+            path.constants[bar] = self.constants
+            path.hedge_ratios[bar] = self.hedge_ratios
+        return path
+
+
+def residual_variances(
+        log_prices : FloatArray,
+        dependents : IntArray,
+        independents : IntArray,
+        constants : FloatArray,
+        hedge_ratios : FloatArray,
+) -> FloatArray:
+    '''
+    per pair variance of y - constant - hedge_ratio * x over a (bars, tickers) history, the
+    observation noise a filter seeded from those estimates should start with
+    '''
+    residuals = log_prices[:, dependents] - constants - hedge_ratios * log_prices[:, independents]
+    return np.nanvar(residuals, axis=0, ddof=1)
@@ -0,0 +1,146 @@
+import abc
+from typing import Any, Iterable
+
+import pandas as pd
+import numpy as np
+
+
+FloatArray = np.ndarray[Any, np.dtype[np.float64]]
+IntArray = np.ndarray[Any, np.dtype[np.int64]]
+
+
+class PairScreen(abc.ABC):
+    '''
+    one pre-screening stage ahead of the cointegration tests
+
+    candidates are unordered pairs given as two column position arrays with first < second,
+    a screen returns the boolean mask of candidates it keeps
+    '''
+
+    @abc.abstractmethod
+    def keep(
+            self,
+            log_prices : pd.DataFrame,
+            first_legs : IntArray,
+            second_legs : IntArray,
+    ) -> np.ndarray:
+        raise NotImplementedError
+
+
+class CorrelationScreen(PairScreen):
+    def __init__(
+            self,
+            threshold : float = 0.7,
+    ) -> None:
+        self.__threshold = threshold
+
+    def keep(
+            self,
+            log_prices : pd.DataFrame,
+            first_legs : IntArray,
+            second_legs : IntArray,
+    ) -> np.ndarray:
+        correlation = correlation_matrix(log_prices.to_numpy(dtype=np.float64))
+        return correlation[first_legs, second_legs] > self.__threshold
+
+
+class GroupScreen(PairScreen):
+    '''
+    keeps pairs whose legs share a sector / cluster label, tickers without a label are dropped
+    '''
+
+    def __init__(
+            self,
+            groups : dict[str, Any],
+    ) -> None:
+        self.__groups = groups
+
+    @classmethod
+    def from_correlation_clusters(
+            cls,
+            log_prices : pd.DataFrame,
+            n_clusters : int,
+    ) -> "GroupScreen":
+        from scipy.cluster.hierarchy import fcluster, linkage
+        from scipy.spatial.distance import squareform
+
+        # average linkage on the 1 - correlation distance of log returns
+        log_returns = np.diff(log_prices.to_numpy(dtype=np.float64), axis=0)
+        distance = 1 - correlation_matrix(log_returns)
+        np.fill_diagonal(distance, 0)
+        tree = linkage(squareform(np.clip(distance, 0, None), checks=False), method="average")
+        labels = fcluster(tree, t=n_clusters, criterion="maxclust")
+        return cls(dict(zip(log_prices.columns, labels)))
+
+    def keep(
+            self,
+            log_prices : pd.DataFrame,
+            first_legs : IntArray,
+            second_legs : IntArray,
+    ) -> np.ndarray:
+        labels = pd.Series(log_prices.columns).map(self.__groups)
+        codes, _ = pd.factorize(labels)
+        # factorize marks missing labels as -1
+        return (codes[first_legs] == codes[second_legs]) & (codes[first_legs] >= 0)
+
+
+class DistanceScreen(PairScreen):
+    '''
+    Gatev et al. distance method: keeps the top_n pairs with the smallest sum of squared
+    differences between prices normalised to start at 1
+    '''
+
+    def __init__(
+            self,
+            top_n : int,
+    ) -> None:
+        self.__top_n = top_n
+
+    def keep(
+            self,
+            log_prices : pd.DataFrame,
+            first_legs : IntArray,
+            second_legs : IntArray,
+    ) -> np.ndarray:
+        values = log_prices.to_numpy(dtype=np.float64)
+        normalized = np.exp(values - values[0])
+        squared_norms = np.einsum("tn,tn->n", normalized, normalized)
+        gram = normalized.T @ normalized
+
+        distance = (
+            squared_norms[first_legs]
+            + squared_norms[second_legs]
+            - 2 * gram[first_legs, second_legs]
+        )
+        mask = np.zeros(len(first_legs), dtype=bool)
+        if len(first_legs) <= self.__top_n:
+            mask[:] = True
+        else:
+            mask[np.argpartition(distance, self.__top_n - 1)[: self.__top_n]] = True
+        return mask
+
+
+def correlation_matrix(values : FloatArray) -> FloatArray:
+    # column correlation of an (observations, tickers) matrix, same as DataFrame.corr()
+    return np.corrcoef(values, rowvar=False)
+
+
+def unordered_pair_positions(ticker_count : int) -> tuple[IntArray, IntArray]:
+    first_legs, second_legs = np.triu_indices(ticker_count, k=1)
+    return first_legs.astype(np.int64), second_legs.astype(np.int64)
+
+
+def screen_pairs(
+        log_prices : pd.DataFrame,
+        screens : Iterable[PairScreen],
+) -> tuple[IntArray, IntArray]:
+    '''
+    every unordered pair of log_prices columns narrowed by each screen in turn,
+    later screens only see what earlier ones kept
+    '''
+    first_legs, second_legs = unordered_pair_positions(log_prices.shape[1])
+    for screen in screens:
+        mask = screen.keep(log_prices, first_legs, second_legs)
+        first_legs, second_legs = first_legs[mask], second_legs[mask]
+
+    return first_legs, second_legs
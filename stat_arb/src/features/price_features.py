@@ -0,0 +1,148 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable
+
+import pandas as pd
+import numpy as np
+
+from utils import instrumentation
+
+
+# feature sets kept alive across engines, each holds a few price-panel sized matrices
+MAX_SHARED_FEATURE_SETS : int = 4
+
+_shared_features : OrderedDict[tuple[str, str], dict[str, Any]] = OrderedDict()
+
+
+def hash_prices(prices : pd.DataFrame) -> str:
+    '''
+    content hash of a price panel: values, dates and tickers, in column order
+    '''
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(prices.to_numpy(dtype=np.float64)).tobytes())
+    digest.update(np.asarray(pd.to_datetime(prices.index).asi8).tobytes())
+    digest.update("\x1f".join(map(str, prices.columns)).encode())
+    return digest.hexdigest()
+
+
+def _read_only(values : np.ndarray) -> np.ndarray:
+    values.flags.writeable = False
+    return values
+
+
+class PriceFeatures:
+    '''
+    memoized whole-matrix transforms of one price panel: log prices, log returns and the
+    log price correlation matrix
+
+    every feature is computed once per distinct panel, identified by hash_prices, and shared
+    with any other PriceFeatures built on the same data, so re-running an analysis or building a
+    second engine does not redo the transforms. update swaps in new data and drops the features
+    only if the hash moved. matrices are contiguous (dates, tickers) arrays in dtype, float32
+    halves their memory, and are read-only. the frames and series are handed out as writable
+    copies, copy=False returns the shared ones wrapping the read-only matrices instead
+    '''
+
+    def __init__(
+            self,
+            prices : pd.DataFrame,
+            dtype : type | np.dtype = np.float64,
+    ) -> None:
+        self.dtype = np.dtype(dtype)
+        self.__data_hash : str | None = None
+        self.update(prices)
+
+    @property
+    def data_hash(self) -> str | None:
+        return self.__data_hash
+
+    def update(
+            self,
+            prices : pd.DataFrame,
+    ) -> bool:
+        '''
+        points the features at prices, returns True when they differ from the current data
+        '''
+        data_hash = hash_prices(prices)
+        if data_hash == self.__data_hash:
+            return False
+
+        self.__prices = prices
+        self.__data_hash = data_hash
+        key = (data_hash, self.dtype.str)
+        if key not in _shared_features:
+            _shared_features[key] = {}
+            while len(_shared_features) > MAX_SHARED_FEATURE_SETS:
+                _shared_features.popitem(last=False)
+        _shared_features.move_to_end(key)
+        self.__cache = _shared_features[key]
+        return True
+
+    def _memoized(
+            self,
+            name : str,
+            compute : Callable[[], Any],
+    ) -> Any:
+        if name not in self.__cache:
+            with instrumentation.stage(f"PriceFeatures.{name}"):
+                self.__cache[name] = compute()
+        return self.__cache[name]
+
+    def _dates(self) -> pd.DatetimeIndex:
+        return self._memoized("dates", lambda: pd.DatetimeIndex(pd.to_datetime(self.__prices.index)))
+
+    def log_price_matrix(self) -> np.ndarray:
+        return self._memoized(
+            "log_price_matrix",
+            lambda: _read_only(np.ascontiguousarray(np.log(self.__prices.to_numpy(dtype=self.dtype)))),
+        )
+
+    def log_return_matrix(self) -> np.ndarray:
+        def compute() -> np.ndarray:
+            log_prices = self.log_price_matrix()
+            log_returns = np.zeros_like(log_prices)
+            np.subtract(log_prices[1:], log_prices[:-1], out=log_returns[1:])
+            # first row and gaps are zero, as the old fillna(0) left them
+            log_returns[np.isnan(log_returns)] = 0
+            return _read_only(log_returns)
+
+        return self._memoized("log_return_matrix", compute)
+
+    def correlation_matrix(self) -> np.ndarray:
+        def compute() -> np.ndarray:
+            log_prices = self.log_price_matrix()
+            if np.isnan(log_prices).any():
+                # pairwise complete observations, what DataFrame.corr does with gaps
+                return _read_only(self.log_prices(copy=False).corr().to_numpy(dtype=np.float64))
+            correlation = np.corrcoef(log_prices, rowvar=False)
+            # exactly one on the diagonal like DataFrame.corr, callers drop self pairs by value
+            np.fill_diagonal(correlation, 1.0)
+            return _read_only(correlation)
+
+        return self._memoized("correlation_matrix", compute)
+
+    def log_prices(self, copy : bool = True) -> pd.DataFrame:
+        log_prices = self._memoized(
+            "log_prices",
+            lambda: pd.DataFrame(self.log_price_matrix(), index=self._dates(), columns=self.__prices.columns, copy=False),
+        )
+        return log_prices.copy() if copy else log_prices
+
+    def log_returns(self, copy : bool = True) -> pd.DataFrame:
+        log_returns = self._memoized(
+            "log_returns",
+            lambda: pd.DataFrame(self.log_return_matrix(), index=self._dates(), columns=self.__prices.columns, copy=False),
+        )
+        return log_returns.copy() if copy else log_returns
+
+    def correlation_stack(self, copy : bool = True) -> pd.Series:
+        # ordered (ticker, ticker) correlation series, diagonal included, as DataFrame.corr().stack()
+        def compute() -> pd.Series:
+            columns = self.__prices.columns
+            correlation = self.correlation_matrix()
+            index = pd.MultiIndex.from_product([columns, columns])
+            stack = pd.Series(correlation.ravel(), index=index)
+            return stack[~np.isnan(correlation.ravel())]
+
+        stack = self._memoized("correlation_stack", compute)
+        return stack.copy() if copy else stack
@@ -0,0 +1,220 @@
+from typing import NamedTuple
+
+from stat_arb.src.features.batched_cointegrations import FloatArray, IntArray
+
+import numpy as np
+
+
+DEFAULT_ENTRY_Z : float = 2.0
+DEFAULT_EXIT_Z : float = 0.5
+DEFAULT_STOP_Z : float = 4.0
+DEFAULT_WINDOW : int = 60
+
+
+class SpreadSignals(NamedTuple):
+    # every array is (dates, pairs), positions are +1 long spread, -1 short spread, 0 flat
+    spreads: FloatArray
+    zscores: FloatArray
+    positions: np.ndarray
+    entries: np.ndarray
+    exits: np.ndarray
+    stops: np.ndarray
+    windows: IntArray
+
+
+def half_life_windows(
+        half_lives : FloatArray,
+        multiplier : float = 2.0,
+        min_window : int = 10,
+        max_window : int = 250,
+        default_window : int = DEFAULT_WINDOW,
+) -> IntArray:
+    '''
+    per pair lookback of multiplier half-lives clipped to [min_window, max_window], pairs that
+    do not mean revert (infinite, negative or missing half-life) fall back to default_window
+    '''
+    half_lives = np.asarray(half_lives, dtype=np.float64)
+    usable = np.isfinite(half_lives) & (half_lives > 0)
+    windows = np.full(half_lives.shape, default_window, dtype=np.int64)
+    windows[usable] = np.ceil(multiplier * half_lives[usable])
+    return np.clip(windows, min_window, max_window)
+
+
+def pair_spreads(
+        log_prices : FloatArray,
+        dependents : IntArray,
+        independents : IntArray,
+        constants : FloatArray,
+        hedge_ratios : FloatArray,
+) -> FloatArray:
+    # (dates, pairs) residual y - constant - beta x of every pair in one broadcast
+    return log_prices[:, dependents] - hedge_ratios * log_prices[:, independents] - constants
+
+
+def rolling_mean_std(
+        values : FloatArray,
+        windows : IntArray | int,
+) -> tuple[FloatArray, FloatArray]:
+    '''
+    trailing mean and sample standard deviation of every column, each over its own window,
+    from two running sums instead of a rolling object per pair. NaN until a window fills, like
+    pandas rolling(window).mean() / .std()
+    '''
+    n_dates, n_pairs = values.shape
+    windows = np.broadcast_to(np.asarray(windows, dtype=np.int64), (n_pairs,))
+
+    # shifting by the column mean does not move mean offsets or variances but keeps the running
+    # sums of squares small enough not to cancel catastrophically
+    offsets = np.nanmean(values, axis=0) if n_dates else np.zeros(n_pairs)
+    centered = values - offsets
+    sums = np.zeros((n_dates + 1, n_pairs))
+    squares = np.zeros((n_dates + 1, n_pairs))
+    np.cumsum(centered, axis=0, out=sums[1:])
+    np.square(centered, out=centered)
+    np.cumsum(centered, axis=0, out=squares[1:])
+
+    # row t of the window starting at t + 1 - window, gathered through flat positions in one take
+    starts = np.arange(1, n_dates + 1)[:, None] - windows[None, :]
+    filled = starts >= 0
+    np.maximum(starts, 0, out=starts)
+    starts *= n_pairs
+    starts += np.arange(n_pairs)
+
+    window_sums = sums[1:] - np.take(sums, starts)
+    window_squares = squares[1:] - np.take(squares, starts)
+    mean = window_sums / windows
+    window_sums *= mean
+    window_squares -= window_sums
+    window_squares /= np.maximum(windows - 1, 1)
+    np.maximum(window_squares, 0, out=window_squares)
+    std = np.sqrt(window_squares, out=window_squares)
+
+    mean += offsets
+    mean[~filled] = np.nan
+    std[~(filled & (windows > 1))] = np.nan
+    return mean, std
+
+
+def rolling_zscores(
+        spreads : FloatArray,
+        windows : IntArray | int,
+) -> FloatArray:
+    mean, std = rolling_mean_std(spreads, windows)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscores = (spreads - mean) / std
+    zscores[~np.isfinite(zscores)] = np.nan
+    return zscores
+
+
+_HOLD : int = -128
+
+
+def _forward_fill(events : np.ndarray) -> np.ndarray:
+    # int8 events, each _HOLD takes the last event at or before it, leading holds stay _HOLD
+    n_dates, n_pairs = events.shape
+    rows = np.where(events == _HOLD, 0, np.arange(n_dates, dtype=np.int32)[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    rows *= n_pairs
+    rows += np.arange(n_pairs, dtype=np.int32)
+    return np.take(events, rows)
+
+
+def zscore_positions(
+        zscores : FloatArray,
+        entry_z : float = DEFAULT_ENTRY_Z,
+        exit_z : float = DEFAULT_EXIT_Z,
+        stop_z : float = DEFAULT_STOP_Z,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    positions of the classic band rules for every pair at once, no per-bar loop:
+    short the spread above entry_z, long below -entry_z, flatten inside exit_z, and cut the
+    position beyond stop_z. after a stop the pair stays flat until the z-score is back inside
+    exit_z, so a blown-out spread is not re-entered on the way back
+
+    the path dependence is resolved with forward fills: each row either sets a target
+    (entry, exit, stop) or keeps the previous one
+    '''
+    assert 0 <= exit_z < entry_z < stop_z, f"Expected 0 <= exit < entry < stop got {exit_z}, {entry_z}, {stop_z}"
+
+    magnitude = np.abs(zscores)
+    is_stop = magnitude >= stop_z
+    is_exit = magnitude <= exit_z
+    is_entry = (magnitude >= entry_z) & ~is_stop
+
+    locks = np.full(zscores.shape, _HOLD, dtype=np.int8)
+    locks[is_exit] = 0
+    locks[is_stop] = 1
+    locked = _forward_fill(locks) == 1
+
+    targets = np.full(zscores.shape, _HOLD, dtype=np.int8)
+    targets[is_entry & ~locked & (zscores > 0)] = -1
+    targets[is_entry & ~locked & (zscores < 0)] = 1
+    targets[is_exit | is_stop] = 0
+    positions = _forward_fill(targets)
+    positions[positions == _HOLD] = 0
+
+    previous = np.zeros_like(positions)
+    previous[1:] = positions[:-1]
+    entries = (positions != 0) & (positions != previous)
+    stops = is_stop & (previous != 0)
+    exits = (positions == 0) & (previous != 0) & ~stops
+    return positions, entries, exits, stops
+
+
+class StreamingBands:
+    '''
+    zscore_positions one bar at a time for live or replayed z-scores: every pair's position and
+    stop lock are carried between bars, so feeding the rows of a matrix reproduces the batch
+    positions, entries, exits and stops exactly
+    '''
+
+    def __init__(
+            self,
+            n_pairs : int,
+            entry_z : float = DEFAULT_ENTRY_Z,
+            exit_z : float = DEFAULT_EXIT_Z,
+            stop_z : float = DEFAULT_STOP_Z,
+    ) -> None:
+        assert 0 <= exit_z < entry_z < stop_z, f"Expected 0 <= exit < entry < stop got {exit_z}, {entry_z}, {stop_z}"
+        self.entry_z = entry_z
+        self.exit_z = exit_z
+        self.stop_z = stop_z
+        self.positions = np.zeros(n_pairs, dtype=np.int8)
+        self.__locked = np.zeros(n_pairs, dtype=bool)
+
+    def update(self, zscores : FloatArray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        magnitude = np.abs(zscores)
+        is_stop = magnitude >= self.stop_z
+        is_exit = magnitude <= self.exit_z
+        is_entry = (magnitude >= self.entry_z) & ~is_stop
+
+        self.__locked = (self.__locked & ~is_exit) | is_stop
+        previous = self.positions
+        positions = previous.copy()
+        positions[is_entry & ~self.__locked & (zscores > 0)] = -1
+        positions[is_entry & ~self.__locked & (zscores < 0)] = 1
+        positions[is_exit | is_stop] = 0
+        self.positions = positions
+
+        entries = (positions != 0) & (positions != previous)
+        stops = is_stop & (previous != 0)
+        exits = (positions == 0) & (previous != 0) & ~stops
+        return positions, entries, exits, stops
+
+
+def spread_signals(
+        log_prices : FloatArray,
+        dependents : IntArray,
+        independents : IntArray,
+        constants : FloatArray,
+        hedge_ratios : FloatArray,
+        windows : IntArray | int = DEFAULT_WINDOW,
+        entry_z : float = DEFAULT_ENTRY_Z,
+        exit_z : float = DEFAULT_EXIT_Z,
+        stop_z : float = DEFAULT_STOP_Z,
+) -> SpreadSignals:
+    spreads = pair_spreads(log_prices, dependents, independents, constants, hedge_ratios)
+    windows = np.broadcast_to(np.asarray(windows, dtype=np.int64), (spreads.shape[1],)).copy()
+    zscores = rolling_zscores(spreads, windows)
+    positions, entries, exits, stops = zscore_positions(zscores, entry_z, exit_z, stop_z)
+    return SpreadSignals(spreads, zscores, positions, entries, exits, stops, windows)
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import inspect
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any, Callable, NamedTuple, TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+from stat_arb.src.features.batched_cointegrations import FloatArray
+from stat_arb.src.features.kalman_hedge import DEFAULT_DELTA, DEFAULT_OBSERVATION_VARIANCE, KalmanHedgeRatios
+from stat_arb.src.features.spread_signals import DEFAULT_ENTRY_Z, DEFAULT_EXIT_Z, DEFAULT_STOP_Z, StreamingBands
+from stat_arb.src.risk.risk_engine import DEFAULT_DECAY, RiskEngine
+
+if TYPE_CHECKING:
+    from utils.intraday_store import IntradayStore
+    from utils.price_store import PriceStore
+
+
+# bars in flight between two stages before the upstream one waits
+DEFAULT_QUEUE_SIZE : int = 64
+# rows read from the store per slice, the memory-mapped panel is never copied whole
+DEFAULT_CHUNK_ROWS : int = 256
+LATENCY_PERCENTILES : tuple[int, ...] = (50, 90, 99)
+END_TO_END : str = "end_to_end"
+
+
+class Bar(NamedTuple):
+    sequence : int
+    timestamp : pd.Timestamp
+    closes : FloatArray
+    # perf_counter_ns when the source released the bar into the pipeline
+    released_ns : int
+
+
+class Stage(NamedTuple):
+    name : str
+    # (bar, output of the stage before, the bar's closes for the first) -> output passed on,
+    # a coroutine function is awaited
+    process : Callable[[Bar, Any], Any]
+
+
+class ReplayReport(NamedTuple):
+    bars : int
+    seconds : float
+    bars_per_second : float
+    # per stage service time and bar release to last stage done, in microseconds
+    latencies : dict[str, dict[str, float]]
+
+
+def frame_bars(frames : Iterable[pd.DataFrame]) -> Iterator[tuple[pd.Timestamp, FloatArray]]:
+    # (timestamp, closes) rows of consecutive (timestamps x tickers) chunks
+    for frame in frames:
+        values = frame.to_numpy(dtype=np.float64)
+        for timestamp, closes in zip(frame.index, values):
+            yield timestamp, closes
+
+
+def price_store_bars(
+        store : PriceStore,
+        tickers : list[str] | None = None,
+        start : Any = None,
+        end : Any = None,
+        chunk_rows : int = DEFAULT_CHUNK_ROWS,
+) -> Iterator[tuple[pd.Timestamp, FloatArray]]:
+    # segment by segment, a store grown by syncs would otherwise be concatenated up front
+    return frame_bars(
+        prices.iloc[row: row + chunk_rows]
+        for prices in store.iter_segments(tickers=tickers, start=start, end=end)
+        for row in range(0, len(prices), chunk_rows)
+    )
+
+
+def intraday_store_bars(
+        store : IntradayStore,
+        tickers : list[str] | None = None,
+        start : Any = None,
+        end : Any = None,
+        rule : str | None = None,
+) -> Iterator[tuple[pd.Timestamp, FloatArray]]:
+    return frame_bars(store.iter_days(tickers, start, end, rule))
+
+
+def latency_summary(samples_ns : list[int]) -> dict[str, float]:
+    if not samples_ns:
+        return {"count" : 0}
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e3
+    summary = {"count" : len(samples), "mean" : float(samples.mean())}
+    for percentile, value in zip(LATENCY_PERCENTILES, np.percentile(samples, LATENCY_PERCENTILES)):
+        summary[f"p{percentile}"] = float(value)
+    summary["max"] = float(samples.max())
+    return summary
+
+
+_DONE = object()
+
+
+class ReplayEngine:
+    '''
+    replays historical bars through a chain of stages as an asyncio pipeline
+
+    every stage runs as its own task reading a bounded queue, so a slow consumer makes the
+    stages before it, and in the end the source, wait instead of buffering the whole history.
+    speed=None replays as fast as the stages go, otherwise bars are released on the wall clock
+    at speed times their original spacing (speed=60 plays an hour of minute bars in a minute).
+    each stage's service time and every bar's release-to-last-stage latency are recorded
+    '''
+
+    def __init__(
+            self,
+            bars : Iterable[tuple[pd.Timestamp, FloatArray]],
+            stages : list[Stage],
+            speed : float | None = None,
+            queue_size : int = DEFAULT_QUEUE_SIZE,
+            on_output : Callable[[Bar, Any], None] | None = None,
+    ) -> None:
+        assert stages, "Expected at least one stage"
+        assert speed is None or speed > 0, f"Expected speed > 0 or None got {speed}"
+        assert queue_size >= 1, f"Expected queue_size >= 1 got {queue_size}"
+        self.bars = bars
+        self.stages = list(stages)
+        self.speed = speed
+        self.queue_size = queue_size
+        self.on_output = on_output
+
+    async def _release(self, queue : asyncio.Queue) -> int:
+        released = 0
+        first_timestamp : pd.Timestamp | None = None
+        wall_start = time.perf_counter()
+        for sequence, (timestamp, closes) in enumerate(self.bars):
+            if self.speed is not None:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                due = wall_start + (timestamp - first_timestamp).total_seconds() / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            # the first stage receives the closes as its upstream value
+            await queue.put((Bar(sequence, timestamp, closes, time.perf_counter_ns()), closes))
+            released += 1
+            # hand the loop to the stages, at max speed this keeps bars flowing through rather
+            # than filling the first queue before anything runs
+            await asyncio.sleep(0)
+        await queue.put(_DONE)
+        return released
+
+    async def _consume(
+            self,
+            stage : Stage,
+            inbox : asyncio.Queue,
+            outbox : asyncio.Queue | None,
+            service_ns : list[int],
+            end_to_end_ns : list[int],
+    ) -> None:
+        is_coroutine = inspect.iscoroutinefunction(stage.process)
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                if outbox is not None:
+                    await outbox.put(_DONE)
+                return
+
+            bar, upstream = item
+            started = time.perf_counter_ns()
+            output = stage.process(bar, upstream)
+            if is_coroutine:
+                output = await output
+            finished = time.perf_counter_ns()
+            service_ns.append(finished - started)
+
+            if outbox is not None:
+                await outbox.put((bar, output))
+            else:
+                end_to_end_ns.append(finished - bar.released_ns)
+                if self.on_output is not None:
+                    self.on_output(bar, output)
+
+    async def run_async(self) -> ReplayReport:
+        queues : list[asyncio.Queue] = [asyncio.Queue(self.queue_size) for _ in self.stages]
+        service_ns : dict[str, list[int]] = {stage.name : [] for stage in self.stages}
+        end_to_end_ns : list[int] = []
+
+        started = time.perf_counter()
+        async with asyncio.TaskGroup() as tasks:
+            release = tasks.create_task(self._release(queues[0]))
+            for position, stage in enumerate(self.stages):
+                outbox = queues[position + 1] if position + 1 < len(queues) else None
+                tasks.create_task(self._consume(
+                    stage, queues[position], outbox, service_ns[stage.name], end_to_end_ns
+                ))
+        seconds = time.perf_counter() - started
+
+        bars = release.result()
+        latencies = {name : latency_summary(samples) for name, samples in service_ns.items()}
+        latencies[END_TO_END] = latency_summary(end_to_end_ns)
+        return ReplayReport(bars, seconds, bars / seconds if seconds > 0 else 0.0, latencies)
+
+    def run(self) -> ReplayReport:
+        return asyncio.run(self.run_async())
+
+
+def strategy_stages(
+        tickers : list[str],
+        cointegration_results : pd.DataFrame,
+        entry_z : float = DEFAULT_ENTRY_Z,
+        exit_z : float = DEFAULT_EXIT_Z,
+        stop_z : float = DEFAULT_STOP_Z,
+        delta : float = DEFAULT_DELTA,
+        observation_variance : float | FloatArray = DEFAULT_OBSERVATION_VARIANCE,
+        decay : float | None = DEFAULT_DECAY,
+        kalman : KalmanHedgeRatios | None = None,
+) -> list[Stage]:
+    '''
+    the pairs strategy as streaming stages over bars of closes in tickers order:
+
+    features  Kalman filter hedge ratios seeded from the engel_granger frame, emits the
+              innovation z-scores
+    signals   the z-score band rules, emits positions
+    risk      streaming spread covariance, emits portfolio volatility and net ticker exposure
+
+    pass CointegrationEngine.kalman_hedge_ratios(results, only_cointegrated=False) as kalman
+    to start from each pair's residual variance over the history, otherwise every pair starts
+    from the flat observation_variance and delta
+    '''
+    risk = RiskEngine.from_cointegration_results(tickers, cointegration_results, decay)
+    if kalman is None:
+        pairs = cointegration_results.drop_duplicates("direction")
+        kalman = KalmanHedgeRatios(
+            risk.dependents,
+            risk.independents,
+            pairs["constant"].to_numpy(dtype=np.float64),
+            pairs["hedge ratio"].to_numpy(dtype=np.float64),
+            delta,
+            observation_variance,
+        )
+    assert np.array_equal(kalman.dependents, risk.dependents) and np.array_equal(kalman.independents, risk.independents), \
+        "Expected a filter over the frame's directions in order"
+    bands = StreamingBands(kalman.n_pairs, entry_z, exit_z, stop_z)
+
+    def features(bar : Bar, closes : FloatArray) -> FloatArray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            innovations, variances = kalman.update(np.log(closes))
+            return innovations / np.sqrt(variances)
+
+    def signals(bar : Bar, zscores : FloatArray) -> np.ndarray:
+        positions, _, _, _ = bands.update(zscores)
+        return positions
+
+    def risk_check(bar : Bar, positions : np.ndarray) -> dict[str, Any]:
+        risk.update_prices(bar.closes)
+        risk.set_positions(positions)
+        return {
+            "positions" : positions,
+            "volatility" : risk.portfolio_volatility(),
+            "gross exposure" : float(np.abs(risk.ticker_exposure().to_numpy()).sum()),
+        }
+
+    return [Stage("features", features), Stage("signals", signals), Stage("risk", risk_check)]
+
+
+if __name__ == "__main__":
+    from stat_arb.src.features.cointegrations import CointegrationEngine
+    from stat_arb.src.features.pair_screens import DistanceScreen
+    from utils.data_loader import DataLoader
+
+    parser = argparse.ArgumentParser(description="replay the local price store through the pairs strategy")
+    parser.add_argument("--pairs", type=int, default=200, help="distance screen budget")
+    parser.add_argument("--speed", type=float, default=None, help="wall clock multiple, max speed when left out")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    arguments = parser.parse_args()
+
+    loader = DataLoader()
+    prices = loader.load_data_nyse()
+    cointegration = CointegrationEngine(loader)
+    results = cointegration.engel_granger(screens=[DistanceScreen(arguments.pairs)])
+    kalman = cointegration.kalman_hedge_ratios(results, only_cointegrated=False)
+    engine = ReplayEngine(
+        price_store_bars(loader.price_store_nyse),
+        strategy_stages(prices.columns.tolist(), results, kalman=kalman),
+        speed=arguments.speed,
+        queue_size=arguments.queue_size,
+    )
+    report = engine.run()
+    print(f"{report.bars} bars in {report.seconds:.3f}s, {report.bars_per_second:,.0f} bars/s")
+    for name, summary in report.latencies.items():
+        print(f"{name:<12} " + "  ".join(f"{key} {value:,.1f}" for key, value in summary.items() if key != "count") + " us")
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+from stat_arb.src.backtest.pairs_backtest import leg_weights
+from stat_arb.src.features.batched_cointegrations import FloatArray, IntArray
+
+
+# RiskMetrics daily decay
+DEFAULT_DECAY : float = 0.94
+
+
+def spread_returns(
+        prices : FloatArray,
+        dependents : IntArray,
+        independents : IntArray,
+        hedge_ratios : FloatArray,
+) -> FloatArray:
+    '''
+    (dates - 1, pairs) returns of one long spread unit scaled to a gross of 1, the same leg
+    weights the backtester trades
+    '''
+    with np.errstate(divide="ignore", invalid="ignore"):
+        asset_returns = prices[1:] / prices[:-1] - 1
+    asset_returns[~np.isfinite(asset_returns)] = 0
+    dependent_weights, independent_weights = leg_weights(np.ones(len(dependents)), hedge_ratios)
+    return (
+        dependent_weights * asset_returns[:, dependents]
+        + independent_weights * asset_returns[:, independents]
+    )
+
+
+class RiskEngine:
+    '''
+    streaming covariance of pair spread returns with portfolio risk queries
+
+    each bar is one rank-one update of an exponentially weighted, zero-mean covariance
+    (RiskMetrics style, decay=None weighs every bar equally), O(pairs^2) and no history kept.
+    Ledoit-Wolf shrinkage towards a scaled identity is available at query time: the only extra
+    state it needs is the weighted mean of (r'r)^2 and the effective sample size, so it streams
+    too. portfolio volatility and risk contributions are cached until the next bar or positions
+    change, per ticker net exposure only depends on positions and hedge ratios
+    '''
+
+    def __init__(
+            self,
+            tickers : list[str],
+            dependents : IntArray,
+            independents : IntArray,
+            hedge_ratios : FloatArray,
+            decay : float | None = DEFAULT_DECAY,
+            shrink : bool = True,
+    ) -> None:
+        assert decay is None or 0 < decay < 1, f"Expected decay in (0, 1) or None got {decay}"
+        self.tickers = list(tickers)
+        self.dependents = np.asarray(dependents, dtype=np.int64)
+        self.independents = np.asarray(independents, dtype=np.int64)
+        self.hedge_ratios = np.asarray(hedge_ratios, dtype=np.float64)
+        self.decay = decay
+        self.shrink = shrink
+
+        n_pairs = len(self.dependents)
+        self.__covariance = np.zeros((n_pairs, n_pairs))
+        self.__fourth_moment = 0.0
+        self.__weight = 0.0
+        self.__squared_weight = 0.0
+        self.n_updates = 0
+        self.__last_prices : FloatArray | None = None
+        self.__positions = np.zeros(n_pairs)
+        self.__cache : dict[str, FloatArray | float] = {}
+
+    @classmethod
+    def from_cointegration_results(
+            cls,
+            tickers : list[str],
+            cointegration_results : pd.DataFrame,
+            decay : float | None = DEFAULT_DECAY,
+            shrink : bool = True,
+    ) -> "RiskEngine":
+        # one pair per "dependent~independent" direction of an engel_granger frame
+        pairs = cointegration_results.drop_duplicates("direction")
+        column_positions = {ticker: i for i, ticker in enumerate(tickers)}
+        legs = [direction.split("~") for direction in pairs["direction"]]
+        return cls(
+            tickers,
+            np.array([column_positions[a] for a, _ in legs], dtype=np.int64),
+            np.array([column_positions[b] for _, b in legs], dtype=np.int64),
+            pairs["hedge ratio"].to_numpy(dtype=np.float64),
+            decay,
+            shrink,
+        )
+
+    @property
+    def n_pairs(self) -> int:
+        return len(self.dependents)
+
+    @property
+    def effective_observations(self) -> float:
+        return self.__weight ** 2 / self.__squared_weight if self.__squared_weight else 0.0
+
+    def update_returns(self, returns : FloatArray) -> None:
+        '''
+        folds in one bar of spread returns, shape (pairs,), or a block of bars (bars, pairs)
+        '''
+        returns = np.asarray(returns, dtype=np.float64)
+        if returns.ndim == 1:
+            returns = returns[None, :]
+        if not len(returns):
+            return
+
+        # a block is the same as its bars one by one: bar k of n carries decay^(n - 1 - k)
+        decay = 1.0 if self.decay is None else self.decay
+        bar_weights = decay ** np.arange(len(returns) - 1, -1, -1)
+        carried = decay ** len(returns)
+
+        weight = carried * self.__weight + bar_weights.sum()
+        weighted = returns * np.sqrt(bar_weights)[:, None]
+        self.__covariance *= carried * self.__weight / weight
+        self.__covariance += (weighted.T @ weighted) / weight
+
+        squared_norms = np.einsum("tp,tp->t", returns, returns)
+        self.__fourth_moment = (
+            carried * self.__weight * self.__fourth_moment + bar_weights @ squared_norms ** 2
+        ) / weight
+        self.__squared_weight = carried ** 2 * self.__squared_weight + (bar_weights ** 2).sum()
+        self.__weight = weight
+        self.n_updates += len(returns)
+        self.__cache.clear()
+
+    def update_prices(self, prices : FloatArray) -> None:
+        '''
+        folds in one bar of (tickers,) closes, or a (bars, tickers) block, the first bar ever
+        seen only primes the previous close
+        '''
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.ndim == 1:
+            prices = prices[None, :]
+        if self.__last_prices is not None:
+            prices = np.vstack([self.__last_prices, prices])
+        if len(prices) > 1:
+            self.update_returns(spread_returns(prices, self.dependents, self.independents, self.hedge_ratios))
+        self.__last_prices = prices[-1].copy()
+
+    def shrinkage_intensity(self) -> float:
+        # Ledoit-Wolf (2004) intensity with the weighted sample size in place of n
+        if "shrinkage" not in self.__cache:
+            covariance = self.__covariance
+            n_pairs = self.n_pairs
+            observations = self.effective_observations
+            if n_pairs == 0 or observations == 0:
+                self.__cache["shrinkage"] = 0.0
+                return 0.0
+
+            mu = np.trace(covariance) / n_pairs
+            squared_norm = np.einsum("ij,ij->", covariance, covariance)
+            delta = (squared_norm - n_pairs * mu ** 2) / n_pairs
+            beta = min((self.__fourth_moment - squared_norm) / (n_pairs * observations), delta)
+            self.__cache["shrinkage"] = float(beta / delta) if delta > 0 else 0.0
+        return self.__cache["shrinkage"]
+
+    def covariance(self, shrink : bool | None = None) -> FloatArray:
+        # a copy on both branches, callers may not write into the cached estimate
+        return self._covariance(shrink).copy()
+
+    def _covariance(self, shrink : bool | None = None) -> FloatArray:
+        shrink = self.shrink if shrink is None else shrink
+        if not shrink:
+            return self.__covariance
+
+        if "shrunk" not in self.__cache:
+            intensity = self.shrinkage_intensity()
+            mu = np.trace(self.__covariance) / max(self.n_pairs, 1)
+            shrunk = (1 - intensity) * self.__covariance
+            shrunk[np.diag_indices_from(shrunk)] += intensity * mu
+            self.__cache["shrunk"] = shrunk
+        return self.__cache["shrunk"]
+
+    def set_positions(
+            self,
+            positions : FloatArray,
+            capital_per_pair : float = 1.0,
+    ) -> None:
+        # spread units per pair, as produced by spread_signals, times the capital behind each
+        self.__positions = np.asarray(positions, dtype=np.float64) * capital_per_pair
+        self.__cache.pop("covariance_times_positions", None)
+
+    def _covariance_times_positions(self) -> FloatArray:
+        if "covariance_times_positions" not in self.__cache:
+            self.__cache["covariance_times_positions"] = self._covariance() @ self.__positions
+        return self.__cache["covariance_times_positions"]
+
+    def portfolio_volatility(self) -> float:
+        return float(np.sqrt(max(self.__positions @ self._covariance_times_positions(), 0.0)))
+
+    def marginal_contributions(self) -> FloatArray:
+        # d volatility / d position of every pair
+        volatility = self.portfolio_volatility()
+        if volatility == 0:
+            return np.zeros(self.n_pairs)
+        return self._covariance_times_positions() / volatility
+
+    def risk_contributions(self) -> FloatArray:
+        # position * marginal contribution, sums to the portfolio volatility
+        return self.__positions * self.marginal_contributions()
+
+    def ticker_exposure(self) -> pd.Series:
+        dependent_weights, independent_weights = leg_weights(self.__positions, self.hedge_ratios)
+        exposure = np.bincount(self.dependents, dependent_weights, minlength=len(self.tickers))
+        exposure += np.bincount(self.independents, independent_weights, minlength=len(self.tickers))
+        return pd.Series(exposure, index=self.tickers, name="net exposure")
@@ -0,0 +1,58 @@
+import json
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from utils.benchmark_suite import STAGES, run_benchmarks
+from utils.synthetic_market import synthetic_filings, synthetic_prices
+
+
+class PanelLoader:
+    def __init__(self, prices):
+        self._prices = prices
+
+    def load_data_nyse(self):
+        return self._prices.copy()
+
+
+class TestUnitSyntheticMarket:
+
+    def test_prices_are_seeded_and_plant_cointegrated_pairs(self):
+        prices, planted = synthetic_prices(12, 500, n_planted_pairs=3, seed=5)
+        again, _ = synthetic_prices(12, 500, n_planted_pairs=3, seed=5)
+        assert prices.shape == (500, 12) and prices.equals(again)
+        assert (prices > 0).all().all()
+
+        results = CointegrationEngine(PanelLoader(prices)).engel_granger(screens=[])
+        # engel_granger keeps whichever direction tests stronger
+        cointegrated = {frozenset(d.split("~")) for d in results.loc[results["is cointegrated"], "direction"]}
+        assert {frozenset((pair.dependent, pair.independent)) for pair in planted} <= cointegrated
+
+        estimates = results.drop_duplicates("direction").set_index("direction")["hedge ratio"]
+        for pair in planted:
+            direction = f"{pair.dependent}~{pair.independent}"
+            if direction in estimates:
+                assert abs(estimates[direction] - pair.hedge_ratio) < 0.05
+
+    def test_filings_carry_most_paragraphs_over(self):
+        rows = synthetic_filings(2, filings_per_ticker=3, paragraphs_per_filing=10, seed=1)
+        assert len(rows) == 6 and len({row["accession_number"] for row in rows}) == 6
+        assert set(rows[0]) == {"filing_date", "report_date", "accession_number", "risk_factor"}
+
+        first, second = (set(row["risk_factor"].split("\n\n")) for row in rows[:2])
+        assert len(first & second) >= 5
+
+
+class TestUnitBenchmarkSuite:
+
+    def test_writes_json_report(self, tmp_path):
+        output = tmp_path / "report.json"
+        report = run_benchmarks(
+            (20,), output, n_days=120, pairs_per_ticker=2, filings_per_ticker=2, repeats=1
+        )
+        assert json.loads(output.read_text()) == json.loads(json.dumps(report))
+
+        scale, = report["scales"]
+        assert scale["n_tickers"] == 20 and scale["pairs_tested"] == 40
+        assert set(scale["stages"]) == set(STAGES)
+        for timing in scale["stages"].values():
+            assert timing["seconds"] > 0 and timing["peak_bytes"] >= 0
+        assert 0 <= scale["planted_pairs_recovered"] <= scale["planted_pairs"] == 2
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.features.pair_screens import CorrelationScreen, DistanceScreen, GroupScreen, PairScreen
+
+
+class SyntheticLoader:
+    # offline stand-in for DataLoader serving a seeded random-walk price panel
+
+    def __init__(self, n_tickers=8, n_days=600, seed=7):
+        rng = np.random.default_rng(seed)
+        dates = pd.bdate_range("2020-01-01", periods=n_days, name="Date")
+        walks = np.cumsum(rng.normal(0, 0.01, size=(n_days, n_tickers)), axis=0)
+        # plant a cointegrated pair on the first two tickers
+        walks[:, 1] = 0.8 * walks[:, 0] + rng.normal(0, 0.005, size=n_days)
+        tickers = [f"T{i:02d}" for i in range(n_tickers)]
+        self._prices = pd.DataFrame(np.exp(walks + 3.0), index=dates, columns=tickers)
+
+    def load_data_nyse(self):
+        return self._prices.copy()
+
+
+class TestUnitBatchedEngelGranger:
+    def setup_class(self) -> None:
+        self.__loader = SyntheticLoader()
+        self.__reference = CointegrationEngine(self.__loader).engel_granger(is_batched=False)
+        self.__batched = CointegrationEngine(self.__loader).engel_granger()
+
+    def test_same_frame_layout(self) -> None:
+        assert self.__batched.columns.tolist() == self.__reference.columns.tolist()
+        assert self.__batched.index.equals(self.__reference.index)
+        assert (self.__batched["direction"] == self.__reference["direction"]).all()
+        assert (self.__batched["is cointegrated"] == self.__reference["is cointegrated"]).all()
+
+    @pytest.mark.parametrize("column", ["p", "constant", "hedge ratio", "t_statistic", "half_life"])
+    def test_matches_statsmodels(self, column) -> None:
+        np.testing.assert_allclose(
+            self.__batched[column].to_numpy(dtype=float),
+            self.__reference[column].to_numpy(dtype=float),
+            rtol=1e-6,
+            atol=1e-9,
+        )
+
+    def test_planted_pair_is_cointegrated(self) -> None:
+        assert self.__batched.loc[("T00", "T01"), "is cointegrated"]
+
+
+class TestUnitParallelEngelGranger:
+    def setup_class(self) -> None:
+        self.__loader = SyntheticLoader(n_tickers=12, n_days=400, seed=11)
+        self.__serial = CointegrationEngine(self.__loader).engel_granger()
+
+    @pytest.mark.parametrize("n_workers", [2, 3])
+    def test_independent_of_worker_count(self, n_workers) -> None:
+        parallel = CointegrationEngine(self.__loader).engel_granger(n_workers=n_workers)
+        pd.testing.assert_frame_equal(parallel, self.__serial, check_exact=True)
+
+
+class TestUnitPairScreens:
+    def setup_class(self) -> None:
+        self.__engine = CointegrationEngine(SyntheticLoader(n_tickers=10, n_days=400, seed=3))
+        self.__full = self.__engine.engel_granger()
+
+    def test_unordered_pairs_match_ordered_results(self) -> None:
+        screened = self.__engine.engel_granger(screens=[])
+        assert len(screened) == 10 * 9 // 2
+        assert all(a != b and (b, a) not in screened.index for a, b in screened.index)
+        pd.testing.assert_frame_equal(screened, self.__full.loc[screened.index])
+
+    def test_correlation_screen_matches_stack_threshold(self) -> None:
+        _, candidates = self.__engine.screen_candidate_pairs([CorrelationScreen(0.7)])
+        _, stack = self.__engine.conduct_log_transformations_on_prices(True)
+        assert {frozenset(pair) for pair in candidates.index} == {frozenset(pair) for pair in stack.index}
+
+    def test_group_and_distance_screens(self) -> None:
+        groups = {"T00": "energy", "T01": "energy", "T02": "energy", "T03": "tech", "T04": "tech"}
+        _, candidates = self.__engine.screen_candidate_pairs([GroupScreen(groups), DistanceScreen(2)])
+        assert len(candidates) == 2
+        assert all(groups[a] == groups[b] for a, b in candidates.index)
+        # the planted pair has by far the closest normalised prices
+        assert {"T00", "T01"} in [set(pair) for pair in candidates.index]
+
+    def test_screens_must_implement_keep(self) -> None:
+        with pytest.raises(TypeError):
+            PairScreen()
+
+
+class TestUnitRollingEngelGranger:
+    def setup_class(self) -> None:
+        self.__loader = SyntheticLoader(n_tickers=4, n_days=300, seed=5)
+        self.__prices = np.log(self.__loader.load_data_nyse())
+        self.__panel = CointegrationEngine(self.__loader).rolling_engel_granger(
+            60, pairs=[("T01", "T00"), ("T02", "T03")]
+        )
+
+    def test_panel_shape(self) -> None:
+        assert self.__panel.shape[0] == (300 - 60 + 1) * 2
+        assert self.__panel.index.get_level_values("Date")[0] == self.__prices.index[59]
+
+    @pytest.mark.parametrize("end", [59, 150, 299])
+    def test_matches_refit_per_window(self, end) -> None:
+        window = self.__prices.iloc[end - 59: end + 1]
+        for dependent, independent in [("T01", "T00"), ("T02", "T03")]:
+            model = sm.OLS(window[dependent], sm.add_constant(window[independent])).fit()
+            residual = model.resid.to_numpy()
+            df = sm.OLS(np.diff(residual), sm.add_constant(residual[:-1])).fit()
+            row = self.__panel.loc[(window.index[-1], f"{dependent}~{independent}")]
+
+            np.testing.assert_allclose(row["hedge ratio"], model.params[independent], rtol=1e-8)
+            np.testing.assert_allclose(row["constant"], model.params["const"], rtol=1e-8)
+            np.testing.assert_allclose(row["t_statistic"], df.tvalues[1], rtol=1e-7)
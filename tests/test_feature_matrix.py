@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from earnings_predictor.src.features.feature_matrix import METADATA_COLUMNS, FilingFeatureMatrix
+from earnings_predictor.src.features.nlp_extractor import NLPExtractor
+from tests.test_nlp_extractor import FakeLoader, make_filings
+from utils.synthetic_market import synthetic_filings
+
+
+def sklearn_rows(rows, feature_names):
+    # get_top_n_words' vectorizer, its columns put in the matrix's order
+    vectorizer = TfidfVectorizer(
+        lowercase=True, stop_words="english", token_pattern=r"(?u)\b[A-Za-z]{3,}\b",
+        max_df=0.8, min_df=2, norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=True,
+    )
+    dense = vectorizer.fit_transform([row["risk_factor"] for row in rows]).toarray()
+    positions = {term : i for i, term in enumerate(feature_names)}
+    expected = np.zeros((len(rows), len(feature_names)))
+    for column, term in enumerate(vectorizer.get_feature_names_out()):
+        expected[:, positions[term]] = dense[:, column]
+    return expected
+
+
+def memory_mapped(values):
+    while values is not None and not isinstance(values, np.memmap):
+        values = values.base
+    return isinstance(values, np.memmap)
+
+
+class TestUnitFilingFeatureMatrix:
+
+    def setup_class(self):
+        self.rows = synthetic_filings(6, filings_per_ticker=4, paragraphs_per_filing=4, words_per_paragraph=30, seed=4)
+
+    def test_terms_match_tfidf_vectorizer(self):
+        features = FilingFeatureMatrix()
+        assert features.add(self.rows) == len(self.rows)
+
+        matrix = features.matrix()
+        names = features.feature_names()
+        assert matrix.shape == (len(self.rows), features.n_terms + len(METADATA_COLUMNS))
+        assert names[-len(METADATA_COLUMNS):] == list(METADATA_COLUMNS)
+        np.testing.assert_allclose(
+            matrix[:, : features.n_terms].toarray(), sklearn_rows(self.rows, names[: features.n_terms]), atol=1e-12
+        )
+
+        metadata = matrix[:, features.n_terms:].toarray()
+        np.testing.assert_allclose(metadata[:, 1], 46)
+        np.testing.assert_allclose(metadata[:4, 0], 2011 + 45 / 365.25 + np.arange(4))
+
+    def test_incremental_adds_equal_one_build(self):
+        at_once = FilingFeatureMatrix()
+        at_once.add(self.rows)
+        grown = FilingFeatureMatrix()
+        grown.add(self.rows[:10])
+        assert grown.add(self.rows) == len(self.rows) - 10
+
+        assert grown.vocabulary == at_once.vocabulary and grown.accessions == at_once.accessions
+        assert (grown.matrix() != at_once.matrix()).nnz == 0
+        assert grown.data_hash == at_once.data_hash
+
+    def test_persisted_matrix_reloads_memory_mapped(self, tmp_path):
+        built = FilingFeatureMatrix(tmp_path / "features")
+        built.add(self.rows[:12])
+        data_hash = built.data_hash
+
+        reloaded = FilingFeatureMatrix(tmp_path / "features")
+        assert reloaded.data_hash == data_hash and reloaded.accessions == built.accessions
+        assert memory_mapped(reloaded.matrix().data) and memory_mapped(reloaded.matrix().indices)
+        assert reloaded.add(self.rows[:12]) == 0 and reloaded.data_hash == data_hash
+
+        wanted = [self.rows[5]["accession_number"], self.rows[2]["accession_number"]]
+        assert (reloaded.rows(wanted) != built.matrix()[[5, 2]]).nnz == 0
+        assert reloaded.filing_dates()[2] == np.datetime64("2013-02-15")
+
+        reloaded.add(self.rows)
+        at_once = FilingFeatureMatrix()
+        at_once.add(self.rows)
+        assert FilingFeatureMatrix(tmp_path / "features").data_hash == at_once.data_hash
+
+    def test_changed_text_replaces_its_row(self, tmp_path):
+        built = FilingFeatureMatrix(tmp_path / "features")
+        built.add(self.rows)
+        rewritten = [{**row, "risk_factor" : self.rows[0]["risk_factor"]} if row is self.rows[3] else row for row in self.rows]
+        assert built.add(rewritten) == 1
+
+        expected = FilingFeatureMatrix()
+        expected.add(self.rows[:3] + [rewritten[3]] + self.rows[4:])
+        reloaded = FilingFeatureMatrix(tmp_path / "features")
+        assert reloaded.accessions == expected.accessions
+        # the replaced text's terms keep their columns, with no filing left using them
+        columns = [reloaded.vocabulary[term] for term in expected.feature_names()[: expected.n_terms]]
+        np.testing.assert_allclose(
+            reloaded.matrix()[:, columns].toarray(), expected.matrix()[:, : expected.n_terms].toarray(), atol=1e-12
+        )
+        assert reloaded.matrix()[:, : reloaded.n_terms].nnz == expected.matrix()[:, : expected.n_terms].nnz
+        assert reloaded.add(rewritten) == 0
+
+    def test_extractor_builds_matrix_under_data_dir(self, tmp_path):
+        extractor = NLPExtractor(FakeLoader(tmp_path, make_filings()), max_workers=1)
+        features = extractor.build_feature_matrix(["AAPL"])
+
+        assert features.root == tmp_path / "earnings_feature_matrix"
+        assert features.accessions == ["0000320193-22", "0000320193-23", "0000320193-24"]
+        assert {filing["ticker"] for filing in features.filings} == {"AAPL"}
+        assert extractor.build_feature_matrix(["AAPL"]).data_hash == features.data_hash
+
+    def test_interrupted_save_keeps_previous_matrix(self, tmp_path, monkeypatch):
+        built = FilingFeatureMatrix(tmp_path / "features")
+        built.add(self.rows[:12])
+        data_hash = built.data_hash
+
+        def crash(*args):
+            raise OSError("disk full")
+
+        # the new generation is on disk but meta.json is never swapped in
+        monkeypatch.setattr(os, "replace", crash)
+        with pytest.raises(OSError):
+            built.add(self.rows)
+        monkeypatch.undo()
+
+        reopened = FilingFeatureMatrix(tmp_path / "features")
+        assert reopened.data_hash == data_hash and reopened.matrix().shape[0] == 12
+        reopened.add(self.rows)
+        at_once = FilingFeatureMatrix()
+        at_once.add(self.rows)
+        assert reopened.data_hash == at_once.data_hash
+        assert [path.name for path in (tmp_path / "features").glob("filings*")] == ["filings_00001.json"]
+
+    def test_rejects_other_versions(self, tmp_path):
+        FilingFeatureMatrix(tmp_path).add(self.rows[:3])
+        (tmp_path / "meta.json").write_text('{"version": 0}')
+        with pytest.raises(ValueError):
+            FilingFeatureMatrix(tmp_path)
+
+    def test_extractor_keeps_one_matrix_per_source(self, tmp_path):
+        extractor = NLPExtractor(FakeLoader(tmp_path, make_filings()), max_workers=1)
+        edgar = extractor.build_feature_matrix(["AAPL"])
+        local_rows = [
+            {"accession_number" : accession, "filing_date" : "2024-01-01", "report_date" : None,
+             "risk_factor" : "Item 1A. Liquidity risk and liquidity shortfalls"}
+            for accession in edgar.accessions
+        ]
+        extractor.extract_features_from_local_filings = lambda ticker: local_rows
+        local = extractor.build_feature_matrix(["AAPL"], local_filings=True)
+
+        assert local.root == tmp_path / "earnings_feature_matrix_local"
+        assert "liquidity" in local.vocabulary and "liquidity" not in edgar.vocabulary
+        assert FilingFeatureMatrix(tmp_path / "earnings_feature_matrix").data_hash == edgar.data_hash
@@ -0,0 +1,63 @@
+import os
+
+from utils.data_loader import DataLoader
+
+HTML_FILING = "<SEC-DOCUMENT>\n<DOCUMENT>\n<TYPE>10-K\n<TEXT>\n<html><body>FORM 10-K</body></html>\n"
+SGML_FILING = "<SEC-DOCUMENT>\n<DOCUMENT>\n<TYPE>10-K\n<TEXT>\nFORM 10-K plain text filing\n"
+
+
+def write_filing(data_dir, ticker, accession, content):
+    path = data_dir / "sec-edgar-filings" / ticker / "10-K" / accession / "full-submission.txt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return path
+
+
+class TestUnitFilingManifest:
+
+    def setup_method(self):
+        self._opened = []
+
+    def test_manifest_keys_and_formats(self, tmp_path):
+        write_filing(tmp_path, "AAPL", "0000320193-24-000123", HTML_FILING)
+        write_filing(tmp_path, "AAPL", "0000320193-07-000004", SGML_FILING)
+        write_filing(tmp_path, "MSFT", "0000950170-24-087843", HTML_FILING)
+        loader = DataLoader(tmp_path)
+
+        filings = loader.load_data_sec_filings_ticker("AAPL")
+        assert set(filings) == {"AAPL_0000320193-24-000123", "AAPL_0000320193-07-000004"}
+        assert filings["AAPL_0000320193-24-000123"][0] == "html"
+        assert filings["AAPL_0000320193-07-000004"][0] == "sgml"
+        assert loader.load_data_sec_filings()["MSFT_0000950170-24-087843"] == HTML_FILING
+
+    def test_lazy_mapping_opens_on_access(self, tmp_path, monkeypatch):
+        write_filing(tmp_path, "AAPL", "0000320193-24-000123", HTML_FILING)
+        write_filing(tmp_path, "MSFT", "0000950170-24-087843", SGML_FILING)
+        filings = DataLoader(tmp_path).open_data_sec_filings()
+
+        real_open = open
+
+        def tracking_open(path, *args, **kwargs):
+            self._opened.append(str(path))
+            return real_open(path, *args, **kwargs)
+
+        monkeypatch.setattr("builtins.open", tracking_open)
+        assert len(filings) == 2
+        assert not self._opened
+        assert filings["MSFT_0000950170-24-087843"] == SGML_FILING
+        assert len(self._opened) == 1
+
+    def test_refresh_tracks_changes(self, tmp_path):
+        path = write_filing(tmp_path, "AAPL", "0000320193-24-000123", SGML_FILING)
+        loader = DataLoader(tmp_path)
+        assert loader.filing_manifest.refresh() == 1
+        assert loader.filing_manifest.refresh() == 0
+
+        path.write_text(HTML_FILING + "padding")
+        os.utime(path, ns=(0, 10**18))
+        assert loader.filing_manifest.refresh() == 1
+        assert loader.filing_manifest.entries()[0].format == "html"
+
+        path.unlink()
+        assert loader.filing_manifest.refresh() == 1
+        assert loader.filing_manifest.entries() == []
@@ -0,0 +1,106 @@
+from earnings_predictor.src.features.filing_sections import (
+    extract_risk_factors,
+    find_risk_factors,
+    read_filing_header,
+)
+from earnings_predictor.src.features.nlp_extractor import NLPExtractor
+from utils.data_loader import DataLoader
+
+HEADER = (
+    "<SEC-DOCUMENT>0000320193-24-000123.txt : 20241101\n"
+    "<SEC-HEADER>0000320193-24-000123.hdr.sgml : 20241101\n"
+    "ACCESSION NUMBER:\t\t0000320193-24-000123\n"
+    "CONFORMED SUBMISSION TYPE:\t10-K\n"
+    "CONFORMED PERIOD OF REPORT:\t20240928\n"
+    "FILED AS OF DATE:\t\t20241101\n"
+    "</SEC-HEADER>\n"
+)
+
+HTML_DOCUMENT = (
+    "<DOCUMENT>\n<TYPE>10-K\n<SEQUENCE>1\n<FILENAME>aapl-20240928.htm\n<TEXT>\n"
+    "<html><head><style>p {margin: 0}</style></head><body>\n"
+    "<table><tr><td><a href=\"#item1a\">Item&#160;1A.</a></td><td>Risk Factors</td><td>5</td></tr>\n"
+    "<tr><td><a href=\"#item1b\">Item&#160;1B.</a></td><td>Unresolved Staff Comments</td><td>17</td></tr>\n"
+    "<tr><td>Item 2.</td><td>Properties</td><td>17</td></tr></table>\n"
+    "<p>Item 1. Business. The Company designs smartphones. See Part I, Item 1A of this Form 10-K.</p>\n"
+    "<div id=\"item1a\"><b>Item&#160;</b><b>1A.&#160;&#160;&#160;&#160;Risk Factors</b></div>\n"
+    "<p>The Company&#8217;s operations are subject to intense competition.</p>\n"
+    "<p>Supply chain disruptions could <i>adversely</i> affect results.</p>\n"
+    "<div id=\"item1b\"><b>Item 1B.</b> Unresolved Staff Comments</div><p>None.</p>\n"
+    "<div><b>Item 2.</b> Properties</div>\n"
+    "<p>Item 7. Risks are described in Item 1A above.</p>\n"
+    "</body></html>\n</TEXT>\n</DOCUMENT>\n"
+)
+
+SGML_DOCUMENT = (
+    "<DOCUMENT>\n<TYPE>10-K\n<SEQUENCE>1\n<TEXT>\n"
+    "                          TABLE OF CONTENTS\n"
+    "Item 1.   Business .................... 1\n"
+    "Item 1A.  Risk Factors ................ 4\n"
+    "Item 2.   Properties .................. 9\n\n"
+    "ITEM 1A.  RISK FACTORS\n\n"
+    "    Demand for   our products may decline.\n\n\n"
+    "    Commodity prices are volatile.\n\n"
+    "ITEM 2.   PROPERTIES\n\n"
+    "    The Company owns its headquarters.\n"
+    "</TEXT>\n</DOCUMENT>\n"
+)
+
+EXHIBIT = (
+    "<DOCUMENT>\n<TYPE>EX-21.1\n<SEQUENCE>2\n<TEXT>\n"
+    "Item 1A. Risk Factors mentioned in an exhibit that should never be scanned. " * 40
+    + "\nItem 1B.\n</TEXT>\n</DOCUMENT>\n"
+)
+
+
+def write_filing(data_dir, ticker, accession, document):
+    path = data_dir / "sec-edgar-filings" / ticker / "10-K" / accession / "full-submission.txt"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(HEADER + document + EXHIBIT + "</SEC-DOCUMENT>\n")
+    return path
+
+
+class TestUnitFilingSections:
+
+    def test_html_risk_factors(self, tmp_path):
+        text = extract_risk_factors(write_filing(tmp_path, "AAPL", "0000320193-24-000123", HTML_DOCUMENT))
+        assert text.startswith("Item 1A. Risk Factors")
+        assert "The Company’s operations are subject to intense competition." in text
+        assert "Supply chain disruptions could adversely affect results." in text
+        assert "Unresolved" not in text and "<" not in text
+
+    def test_sgml_risk_factors(self, tmp_path):
+        text = extract_risk_factors(write_filing(tmp_path, "XOM", "0000034088-07-000010", SGML_DOCUMENT))
+        assert text == (
+            "ITEM 1A. RISK FACTORS\n\nDemand for our products may decline.\n\nCommodity prices are volatile."
+        )
+
+    def test_cross_reference_inside_section_keeps_it_whole(self, tmp_path):
+        document = SGML_DOCUMENT.replace(
+            "    Commodity prices are volatile.\n",
+            "    Commodity prices, as described in this Item 1A, are volatile.\n",
+        )
+        text = extract_risk_factors(write_filing(tmp_path, "XOM", "0000034088-07-000011", document))
+        assert text.startswith("ITEM 1A. RISK FACTORS\n\nDemand for our products may decline.")
+        assert text.endswith("Commodity prices, as described in this Item 1A, are volatile.")
+
+    def test_missing_section_and_document(self, tmp_path):
+        no_section = SGML_DOCUMENT.replace("1A", "9")
+        assert extract_risk_factors(write_filing(tmp_path, "F", "0000037996-06-000001", no_section)) is None
+        assert extract_risk_factors(write_filing(tmp_path, "F", "0000037996-06-000002", "")) is None
+        assert find_risk_factors(b"Item 1A only, never closed") is None
+
+    def test_header_dates(self, tmp_path):
+        header = read_filing_header(write_filing(tmp_path, "AAPL", "0000320193-24-000123", HTML_DOCUMENT))
+        assert header == ("2024-11-01", "2024-09-28")
+
+    def test_local_features_match_edgar_tools_rows(self, tmp_path):
+        write_filing(tmp_path, "AAPL", "0000320193-24-000123", HTML_DOCUMENT)
+        write_filing(tmp_path, "AAPL", "0000320193-23-000106", SGML_DOCUMENT)
+        extractor = NLPExtractor(DataLoader(tmp_path), max_workers=1)
+
+        rows = extractor.extract_features_from_local_filings("AAPL")
+        assert [row["accession_number"] for row in rows] == ["0000320193-23-000106", "0000320193-24-000123"]
+        assert rows[0]["filing_date"] == "2024-11-01" and rows[0]["report_date"] == "2024-09-28"
+        assert rows[1]["risk_factor"].startswith("Item 1A. Risk Factors")
+        assert extractor.extract_features_from_local_filings("AAPL") == rows
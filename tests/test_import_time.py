@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# modules only the Yahoo / SEC / reference statsmodels paths may load
+HEAVY_MODULES = ["yfinance", "edgar", "sec_edgar_downloader", "dotenv", "statsmodels", "scipy", "sklearn"]
+
+# import cost allowed on top of numpy + pandas, which the fast path genuinely needs
+IMPORT_BUDGET_SECONDS = 0.5
+
+PROBE = """
+import json, sys, time
+import numpy, pandas
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe_import(module):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestUnitImportTime:
+
+    @pytest.mark.parametrize(
+        "module",
+        ["utils.data_loader", "utils.price_store", "stat_arb.src.features.cointegrations"],
+    )
+    def test_fast_path_skips_network_stack(self, module):
+        probe = probe_import(module)
+        assert not probe["loaded"], f"{module} pulled in {probe['loaded']} at import"
+        assert (
+            probe["seconds"] < IMPORT_BUDGET_SECONDS
+        ), f"{module} took {probe['seconds']:.3f}s to import beyond numpy and pandas"
@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from stat_arb.src.features import price_features
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from tests.test_cointegrations import SyntheticLoader
+from utils import instrumentation
+
+
+class TestUnitInstrumentation:
+
+    def setup_method(self) -> None:
+        # memoized features would hide the transform stages
+        price_features._shared_features.clear()
+
+    def test_nothing_is_recorded_when_off(self):
+        assert instrumentation.active() is None
+        instrumentation.count("pairs tested", 10)
+        with instrumentation.stage("anything"):
+            pass
+        assert instrumentation.active() is None
+
+    def test_engine_stages_and_counters(self):
+        with instrumentation.instrument() as recorder:
+            results = CointegrationEngine(SyntheticLoader(n_tickers=6)).engel_granger()
+        assert instrumentation.active() is None
+
+        summary = recorder.summary()
+        stages = summary["stages"]
+        for name in (
+                "CointegrationEngine.__init__",
+                "CointegrationEngine.conduct_log_transformations_on_prices",
+                "CointegrationEngine.engel_granger",
+                "PriceFeatures.correlation_matrix",
+                "engel_granger.ols",
+                "engel_granger.adf",
+        ):
+            assert stages[name]["calls"] >= 1 and stages[name]["total_seconds"] >= 0
+        assert summary["counters"]["pairs tested"] == len(results)
+        assert stages["CointegrationEngine.engel_granger"]["counters"]["pairs tested"] == len(results)
+        # both regression directions of every pair go through the ols kernel
+        assert stages["engel_granger.ols"]["calls"] == 2
+        assert "peak_bytes" not in stages["engel_granger.ols"]
+
+    def test_memory_peaks_include_nested_stages(self):
+        with instrumentation.instrument(memory=True) as recorder:
+            with instrumentation.stage("outer"):
+                with instrumentation.stage("inner"):
+                    block = np.ones(1 << 20)
+                    del block
+                np.ones(1 << 10)
+
+        stages = recorder.summary()["stages"]
+        assert stages["inner"]["peak_bytes"] >= 8 << 20
+        assert stages["outer"]["peak_bytes"] >= stages["inner"]["peak_bytes"]
+
+    def test_nested_recorders_are_isolated(self):
+        with instrumentation.instrument() as outer:
+            instrumentation.count("filings read")
+            with instrumentation.instrument() as inner:
+                instrumentation.count("filings read", 5)
+            instrumentation.count("filings read")
+        assert outer.counters == {"filings read" : 2} and inner.counters == {"filings read" : 5}
+
+    def test_json_and_chrome_trace_export(self, tmp_path):
+        with instrumentation.instrument(output=tmp_path / "run.trace.json") as recorder:
+            with instrumentation.stage("outer"):
+                instrumentation.count("bytes loaded", 64)
+        recorder.write(tmp_path / "run.json")
+
+        trace = json.loads((tmp_path / "run.trace.json").read_text())
+        event, = trace["traceEvents"]
+        assert event["ph"] == "X" and event["name"] == "outer" and event["args"] == {"bytes loaded" : 64}
+        assert json.loads((tmp_path / "run.json").read_text())["counters"] == {"bytes loaded" : 64}
+
+    def test_environment_switch_writes_at_exit(self, tmp_path):
+        output = tmp_path / "nightly.json"
+        script = (
+            "from stat_arb.src.features.cointegrations import CointegrationEngine\n"
+            "from tests.test_cointegrations import SyntheticLoader\n"
+            "CointegrationEngine(SyntheticLoader(n_tickers=4)).engel_granger()\n"
+        )
+        environment = {
+            **os.environ,
+            instrumentation.ENVIRONMENT_SWITCH : "1",
+            instrumentation.ENVIRONMENT_OUTPUT : str(output),
+            "PYTHONPATH" : str(Path(__file__).parent.parent),
+        }
+        subprocess.run([sys.executable, "-c", script], env=environment, check=True, timeout=120)
+        assert json.loads(output.read_text())["counters"]["pairs tested"] == 4 * 3
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from utils.data_loader import DataLoader
+from utils.intraday_store import IntradayBarLoader, IntradayStore
+from utils.synthetic_market import synthetic_prices
+
+
+def minute_bars(n_tickers=4, n_sessions=3, seed=3):
+    # regular sessions of 390 minute bars, stamped at the bar start like yfinance
+    sessions = pd.bdate_range("2024-03-04", periods=n_sessions)
+    index = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(day + pd.Timedelta(hours=9, minutes=30), periods=390, freq="1min", tz="America/New_York")
+        for day in sessions
+    ]), name="Date")
+    prices, planted = synthetic_prices(n_tickers, len(index), n_planted_pairs=1, seed=seed)
+    return prices.set_axis(index), planted
+
+
+class FakeIntradaySource:
+    def __init__(self, bars):
+        self.bars = bars
+        self.requests = []
+
+    def fetch(self, tickers, start, end):
+        self.requests.append((start, end))
+        start, end = start.tz_localize(self.bars.index.tz), end.tz_localize(self.bars.index.tz)
+        return self.bars.loc[(self.bars.index >= start) & (self.bars.index < end), tickers]
+
+
+class TestUnitIntradayStore:
+
+    def test_partitions_per_ticker_and_day(self, tmp_path):
+        bars, _ = minute_bars()
+        store = IntradayStore(tmp_path / "intraday")
+        assert store.write(bars) == 4 * 3
+
+        assert store.timezone == "America/New_York"
+        assert store.tickers == bars.columns.tolist()
+        assert [day.isoformat() for day in store.days()] == ["2024-03-04", "2024-03-05", "2024-03-06"]
+        assert (tmp_path / "intraday" / "S0002" / "2024-03-05.npy").exists()
+        pd.testing.assert_frame_equal(store.read(), bars, check_freq=False)
+
+    def test_resampled_read_matches_pandas(self, tmp_path):
+        bars, _ = minute_bars()
+        bars.iloc[100:110, 1] = np.nan
+        store = IntradayStore(tmp_path / "intraday")
+        store.write(bars)
+
+        for rule in ("5min", "1h"):
+            expected = bars.resample(rule).last().dropna(how="all").ffill()
+            pd.testing.assert_frame_equal(store.read(rule=rule), expected, check_freq=False)
+
+        chunks = list(store.iter_days(tickers=["S0001", "S0003"], rule="1h"))
+        assert len(chunks) == 3 and all(len(chunk) == 7 for chunk in chunks)
+        assert chunks[0].columns.tolist() == ["S0001", "S0003"]
+
+    def test_bounds_and_merging_writes(self, tmp_path):
+        bars, _ = minute_bars()
+        store = IntradayStore(tmp_path / "intraday")
+        store.write(bars.iloc[:500])
+        store.write(bars.iloc[450:] * 1.0)
+        pd.testing.assert_frame_equal(store.read(), bars, check_freq=False)
+
+        revised = bars.iloc[[10]] * 2
+        store.write(revised)
+        assert store.read().iloc[10].equals(revised.iloc[0])
+
+        window = store.read(start="2024-03-05 10:00", end="2024-03-05 11:00")
+        assert window.index[0] == pd.Timestamp("2024-03-05 10:00", tz="America/New_York")
+        assert len(window) == 61
+
+    def test_loader_syncs_in_windows(self, tmp_path):
+        bars, _ = minute_bars()
+        source = FakeIntradaySource(bars)
+        loader = DataLoader(tmp_path, tickers_nyse=bars.columns)
+        written = loader.sync_data_intraday(source, start="2024-03-04", end="2024-03-07", window_days=1)
+
+        assert written == 12 and len(source.requests) == 3
+        pd.testing.assert_frame_equal(loader.intraday_store_nyse.read(), bars, check_freq=False)
+
+    def test_engine_runs_on_resampled_bars(self, tmp_path):
+        bars, planted = minute_bars(n_sessions=5)
+        loader = DataLoader(tmp_path, tickers_nyse=bars.columns)
+        loader.intraday_store_nyse.write(bars)
+
+        intraday = loader.open_data_intraday("5min")
+        assert isinstance(intraday, IntradayBarLoader)
+        results = CointegrationEngine(intraday).engel_granger(screens=[])
+        pair, = planted
+        assert results.loc[(pair.dependent, pair.independent), "is cointegrated"]
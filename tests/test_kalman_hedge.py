@@ -0,0 +1,101 @@
+import numpy as np
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.features.kalman_hedge import KalmanHedgeRatios
+from tests.test_cointegrations import SyntheticLoader
+
+
+def reference_filter(y, x, state, covariance, delta, observation_variance):
+    # textbook matrix Kalman filter for one pair
+    state, covariance = state.copy(), covariance.copy()
+    noise = delta / (1 - delta) * np.eye(2)
+    states, innovations, variances = [], [], []
+    for t in range(len(y)):
+        covariance = covariance + noise
+        observation = np.array([1.0, x[t]])
+        innovation = y[t] - observation @ state
+        variance = observation @ covariance @ observation + observation_variance
+        gain = covariance @ observation / variance
+        state = state + gain * innovation
+        covariance = covariance - np.outer(gain, observation) @ covariance
+        states.append(state.copy())
+        innovations.append(innovation)
+        variances.append(variance)
+    return np.array(states), np.array(innovations), np.array(variances), covariance
+
+
+def drifting_pairs(n_pairs, n_bars, seed=0):
+    # independent legs are random walks, dependents follow a slowly drifting hedge ratio
+    rng = np.random.default_rng(seed)
+    x = 3 + np.cumsum(rng.normal(0, 0.01, size=(n_bars, n_pairs)), axis=0)
+    betas = np.linspace(1.0, 1.5, n_bars)[:, None] * rng.uniform(0.8, 1.2, n_pairs)
+    y = 0.1 + betas * x + rng.normal(0, 0.005, size=(n_bars, n_pairs))
+    log_prices = np.empty((n_bars, 2 * n_pairs))
+    log_prices[:, 0::2], log_prices[:, 1::2] = y, x
+    return log_prices, np.arange(0, 2 * n_pairs, 2), np.arange(1, 2 * n_pairs, 2), betas
+
+
+class TestUnitKalmanHedgeRatios:
+
+    def test_matches_matrix_filter(self):
+        log_prices, dependents, independents, _ = drifting_pairs(5, 200, seed=1)
+        constants = np.full(5, 0.2)
+        hedge_ratios = np.linspace(0.9, 1.1, 5)
+        kalman = KalmanHedgeRatios(dependents, independents, constants, hedge_ratios, delta=1e-3,
+                                   observation_variance=1e-4, initial_variance=1e-2)
+        path = kalman.update_block(log_prices)
+
+        for pair in range(5):
+            states, innovations, variances, covariance = reference_filter(
+                log_prices[:, dependents[pair]], log_prices[:, independents[pair]],
+                np.array([constants[pair], hedge_ratios[pair]]), 1e-2 * np.eye(2), 1e-3, 1e-4,
+            )
+            np.testing.assert_allclose(path.constants[:, pair], states[:, 0], rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(path.hedge_ratios[:, pair], states[:, 1], rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(path.innovations[:, pair], innovations, rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(path.innovation_variances[:, pair], variances, rtol=1e-9)
+            np.testing.assert_allclose(kalman.state_covariances()[pair], covariance, rtol=1e-8, atol=1e-15)
+
+    def test_tracks_drifting_hedge_ratio(self):
+        log_prices, dependents, independents, betas = drifting_pairs(50, 2000, seed=2)
+        kalman = KalmanHedgeRatios(dependents, independents, np.full(50, 0.1), betas[0], delta=1e-5,
+                                   observation_variance=0.005 ** 2)
+        kalman.update_block(log_prices)
+        # the seed is off by about 0.5 by the end, the filter lags the drift by a few hundredths
+        assert np.abs(kalman.hedge_ratios - betas[-1]).max() < 0.1
+        assert np.abs(kalman.hedge_ratios - betas[-1]).mean() < 0.05
+
+    def test_missing_legs_keep_state(self):
+        log_prices, dependents, independents, betas = drifting_pairs(3, 20, seed=3)
+        kalman = KalmanHedgeRatios(dependents, independents, np.zeros(3), betas[0])
+        kalman.update_block(log_prices[:10])
+        before = kalman.hedge_ratios.copy(), kalman.state_covariances()
+
+        bar = log_prices[10].copy()
+        bar[independents[1]] = np.nan
+        innovations, variances = kalman.update(bar)
+        assert np.isnan(innovations[1]) and np.isnan(variances[1])
+        assert kalman.hedge_ratios[1] == before[0][1]
+        np.testing.assert_array_equal(kalman.state_covariances()[1], before[1][1])
+        assert np.isfinite(innovations[[0, 2]]).all() and kalman.hedge_ratios[0] != before[0][0]
+
+    def test_engine_seeds_from_engel_granger(self):
+        engine = CointegrationEngine(SyntheticLoader())
+        results = engine.engel_granger(screens=[])
+        kalman = engine.kalman_hedge_ratios(results, only_cointegrated=False)
+
+        np.testing.assert_array_equal(kalman.constants, results["constant"].to_numpy())
+        np.testing.assert_array_equal(kalman.hedge_ratios, results["hedge ratio"].to_numpy())
+        assert kalman.n_pairs == len(results) and (kalman.observation_variance > 0).all()
+
+        innovations, variances = kalman.update(engine.features.log_price_matrix()[-1])
+        assert np.isfinite(innovations).all() and (variances > 0).all()
+
+    def test_engine_filters_each_direction_once(self):
+        engine = CointegrationEngine(SyntheticLoader())
+        kalman = engine.kalman_hedge_ratios(only_cointegrated=False)
+
+        # the default engel_granger run tests both orders of every pair
+        pairs = engine.engel_granger().drop_duplicates("direction")
+        assert kalman.n_pairs == len(pairs)
+        np.testing.assert_array_equal(kalman.hedge_ratios, pairs["hedge ratio"].to_numpy())
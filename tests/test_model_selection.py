@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from earnings_predictor.src.features.feature_matrix import FilingFeatureMatrix
+from earnings_predictor.src.models import model_selection
+from earnings_predictor.src.models.model_selection import (
+    TimeSeriesModelSelection,
+    best_c,
+    fit_fold,
+    fold_design,
+    time_series_folds,
+)
+from utils.synthetic_market import synthetic_filings
+
+CS = (0.01, 0.1, 1.0, 10.0)
+
+
+def labelled_filings():
+    # 40 tickers filing every February 2011-2015, labelled by whether they mention tariffs
+    rows = synthetic_filings(40, filings_per_ticker=5, paragraphs_per_filing=4, words_per_paragraph=30,
+                             changed_fraction=0.5, seed=3)
+    labels = pd.Series(
+        [float("tariffs" in row["risk_factor"].split()) for row in rows],
+        index=[row["accession_number"] for row in rows],
+    )
+    # a couple of filings without an outcome yet
+    labels.iloc[[3, 17]] = np.nan
+    return rows, labels
+
+
+class TestUnitModelSelection:
+
+    def setup_class(self):
+        self.rows, self.labels = labelled_filings()
+        self.features = FilingFeatureMatrix()
+        self.features.add(self.rows)
+
+    def test_folds_train_before_their_test_period(self):
+        dates = self.features.filing_dates()
+        folds = time_series_folds(dates, "Y", min_train=20)
+        assert [fold.test_start.year for fold in folds] == [2012, 2013, 2014, 2015]
+        for fold in folds:
+            assert (dates[fold.train] < fold.test_start).all()
+            assert ((dates[fold.test] >= fold.test_start) & (dates[fold.test] < fold.test_end)).all()
+            assert len(fold.test) == 40
+
+        gapped = time_series_folds(dates, "Y", gap_days=400, min_train=20)
+        assert [fold.test_start.year for fold in gapped] == [2013, 2014, 2015]
+        assert (dates[gapped[0].train].year == 2011).all()
+
+    def test_fold_features_fit_on_training_filings_only(self):
+        fold = time_series_folds(self.features.filing_dates(), "Y")[1]
+        train_x, test_x, terms, _, _, _ = fold_design(
+            self.features.counts(), self.features.metadata(), fold.train, fold.test
+        )
+        vectorizer = TfidfVectorizer(
+            lowercase=True, stop_words="english", token_pattern=r"(?u)\b[A-Za-z]{3,}\b",
+            max_df=0.8, min_df=2, norm="l2", use_idf=True, smooth_idf=True, sublinear_tf=True,
+        )
+        expected = vectorizer.fit_transform([self.rows[row]["risk_factor"] for row in fold.train]).toarray()
+        names = self.features.feature_names()
+        order = np.argsort(vectorizer.get_feature_names_out())
+        assert sorted(names[term] for term in terms) == sorted(vectorizer.get_feature_names_out())
+
+        by_name = np.argsort([names[term] for term in terms])
+        np.testing.assert_allclose(train_x[:, : len(terms)].toarray()[:, by_name], expected[:, order], atol=1e-12)
+        assert test_x.shape == (len(fold.test), len(terms) + 2)
+        np.testing.assert_allclose(train_x[:, len(terms):].toarray().mean(axis=0), 0, atol=1e-9)
+
+    def test_warm_path_matches_cold_fits(self):
+        selection = TimeSeriesModelSelection(self.features, self.labels, Cs=CS)
+        fold = selection.folds()[-1]
+        counts, metadata = self.features.counts(), self.features.metadata()
+        model = fit_fold(counts, metadata, selection.labels, fold.train, fold.test, Cs=CS, tol=1e-10)
+
+        train_x, _, _, _, _, _ = fold_design(counts, metadata, fold.train, fold.test)
+        for position, C in enumerate(CS):
+            cold = LogisticRegression(C=C, max_iter=5000, tol=1e-10).fit(train_x, selection.labels[fold.train])
+            np.testing.assert_allclose(model.coefficients[position], cold.coef_[0], atol=1e-5)
+            assert model.intercepts[position] == pytest.approx(cold.intercept_[0], abs=1e-5)
+        assert np.nanmax(model.roc_auc) > 0.8
+
+    def test_unlabelled_filings_are_left_out(self):
+        folds = TimeSeriesModelSelection(self.features, self.labels, Cs=CS).folds()
+        used = np.concatenate([folds[-1].train, folds[-1].test])
+        assert 3 not in used and 17 not in used and len(used) == 198
+
+    def test_scores_and_best_c(self):
+        scores = TimeSeriesModelSelection(self.features, self.labels, Cs=CS).run()
+        assert len(scores) == 4 * len(CS)
+        assert scores["n_train"].tolist()[:: len(CS)] == [40, 80, 119, 158]
+        assert (scores["n_iter"] > 0).all() and scores["log loss"].notna().all()
+        assert best_c(scores, "roc auc") in CS
+        assert best_c(scores) == scores.groupby("C")["log loss"].mean().idxmin()
+
+    def test_single_class_training_folds_are_skipped(self):
+        # no filing before 2012 has a positive label, the first fold has nothing to separate
+        early = [row["accession_number"] for row in self.rows if row["filing_date"] < "2012"]
+        labels = self.labels.copy()
+        labels[early] = 0.0
+        scores = TimeSeriesModelSelection(self.features, labels, Cs=CS, n_workers=2).run()
+        assert scores["test start"].dt.year.unique().tolist() == [2013, 2014, 2015]
+
+    def test_new_filings_only_refit_affected_folds(self, tmp_path, monkeypatch):
+        early = FilingFeatureMatrix()
+        early.add([row for row in self.rows if row["filing_date"] < "2015"])
+        first = TimeSeriesModelSelection(early, self.labels, Cs=CS, cache_dir=tmp_path).run()
+        assert len(list(tmp_path.glob("*.npz"))) == 3
+
+        fitted = []
+        real = model_selection.fit_fold
+        monkeypatch.setattr(model_selection, "fit_fold", lambda *args, **kwargs: fitted.append(1) or real(*args, **kwargs))
+        again = TimeSeriesModelSelection(early, self.labels, Cs=CS, cache_dir=tmp_path).run()
+        assert not fitted
+        pd.testing.assert_frame_equal(again, first)
+
+        early.add(self.rows)
+        grown = TimeSeriesModelSelection(early, self.labels, Cs=CS, cache_dir=tmp_path).run()
+        assert len(fitted) == 1 and len(grown) == 4 * len(CS)
+        pd.testing.assert_frame_equal(grown.iloc[: len(first)], first)
+
+        relabelled = self.labels.copy()
+        relabelled.iloc[0] = 1 - relabelled.iloc[0]
+        TimeSeriesModelSelection(early, relabelled, Cs=CS, cache_dir=tmp_path).run()
+        assert len(fitted) == 5
+
+    def test_parallel_matches_serial(self):
+        serial = TimeSeriesModelSelection(self.features, self.labels, Cs=CS).run()
+        parallel = TimeSeriesModelSelection(self.features, self.labels, Cs=CS, n_workers=2).run()
+        pd.testing.assert_frame_equal(parallel, serial)
@@ -0,0 +1,171 @@
+import gc
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from earnings_predictor.src.features.nlp_extractor import NLPExtractor, RISK_FACTORS_SECTION
+from earnings_predictor.src.features.streaming_tfidf import StreamingTfidf
+from utils.section_cache import SectionCache
+
+
+class FakeTenK:
+    def __init__(self, risk_factors):
+        self.risk_factors = risk_factors
+
+
+class FakeFiling:
+    # module level so pool workers can unpickle it
+    def __init__(self, accession_number, risk_factors, broken=False):
+        self.accession_number = accession_number
+        self.filing_date = f"20{accession_number[-2:]}-02-01"
+        self.report_date = f"20{accession_number[-2:]}-01-01"
+        self.risk_factors = risk_factors
+        self.broken = broken
+
+    def obj(self):
+        if self.broken:
+            raise RuntimeError(f"cannot parse {self.accession_number}")
+        return FakeTenK(self.risk_factors)
+
+
+class FakeLoader:
+    def __init__(self, data_dir, filings):
+        self.data_dir = data_dir
+        self.filings = filings
+
+    def load_data_sec_filings_ticker_edgar_tools(self, ticker):
+        return self.filings
+
+
+def make_filings(broken=False):
+    return [
+        FakeFiling("0000320193-22", "Competition is intense.", broken),
+        FakeFiling("0000320193-23", "Competition is intense. Supply chains may fail.", broken),
+        FakeFiling("0000320193-24", None, broken),
+    ]
+
+
+class TestUnitSectionCache:
+
+    def test_round_trip_and_missing_sections(self, tmp_path):
+        cache = SectionCache(tmp_path)
+        cache.put_many({"a": "risk text", "b": None}, RISK_FACTORS_SECTION)
+
+        reopened = SectionCache(tmp_path)
+        assert reopened.get("a", RISK_FACTORS_SECTION) == (True, "risk text")
+        assert reopened.get("b", RISK_FACTORS_SECTION) == (True, None)
+        assert reopened.get("c", RISK_FACTORS_SECTION) == (False, None)
+        assert reopened.get("a", "mdna") == (False, None)
+
+    def test_identical_text_is_stored_once(self, tmp_path):
+        cache = SectionCache(tmp_path)
+        cache.put_many({"a": "same text", "b": "same text"}, RISK_FACTORS_SECTION)
+        assert len(list(tmp_path.rglob("*.z"))) == 1
+
+    def test_least_recently_used_is_evicted(self, tmp_path):
+        cache = SectionCache(tmp_path, max_bytes=10**9)
+        cache.put("old", RISK_FACTORS_SECTION, "old filing " * 50)
+        cache.put("new", RISK_FACTORS_SECTION, "new filing " * 50)
+        cache.get("old", RISK_FACTORS_SECTION)
+
+        cache.max_bytes = cache.size_bytes() - 1
+        cache.put("newest", RISK_FACTORS_SECTION, "newest filing " * 50)
+        assert cache.get("new", RISK_FACTORS_SECTION)[0] is False
+        assert cache.get("newest", RISK_FACTORS_SECTION)[0] is True
+        assert cache.size_bytes() <= cache.max_bytes
+
+
+class TestUnitExtractFeaturesFromEdgarTools:
+
+    def test_second_run_is_served_from_cache(self, tmp_path):
+        first = NLPExtractor(FakeLoader(tmp_path, make_filings()), max_workers=2).extract_features_from_edgar_tools("AAPL")
+        assert [row["accession_number"] for row in first] == ["0000320193-22", "0000320193-23", "0000320193-24"]
+        assert first[1]["risk_factor"] == "Competition is intense. Supply chains may fail."
+        assert first[2]["risk_factor"] is None
+
+        # every filing would now fail to parse, so anything returned came from the cache
+        second = NLPExtractor(FakeLoader(tmp_path, make_filings(broken=True)), max_workers=1).extract_features_from_edgar_tools("AAPL")
+        assert second == first
+
+    def test_failed_filings_are_skipped_and_not_cached(self, tmp_path):
+        filings = make_filings()
+        filings[0].broken = True
+        extractor = NLPExtractor(FakeLoader(tmp_path, filings), max_workers=1)
+        assert len(extractor.extract_features_from_edgar_tools("AAPL")) == 2
+        assert extractor.section_cache.get("0000320193-22", RISK_FACTORS_SECTION)[0] is False
+
+
+def synthetic_risk_rows(n_documents, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array(["".join(rng.choice(list("abcdefghijklmnop"), rng.integers(3, 9))) for _ in range(400)])
+    weights = 1 / np.arange(1, words.size + 1)
+    weights /= weights.sum()
+    return [
+        {
+            "accession_number": f"0000000000-{i:06d}",
+            "risk_factor": " ".join(rng.choice(words, rng.integers(5, 400), p=weights)) if i % 17 else None,
+        }
+        for i in range(n_documents)
+    ]
+
+
+class TestUnitStreamingTopNWords:
+
+    def test_matches_batch_vectorizer(self, tmp_path):
+        rows = synthetic_risk_rows(120)
+        extractor = NLPExtractor(FakeLoader(tmp_path, []), max_workers=1)
+        expected = extractor.get_top_n_words(10, rows)
+        streamed = extractor.get_top_n_words_streaming(10, iter(rows), chunk_size=16)
+
+        assert list(streamed["word"]) == list(expected["word"])
+        np.testing.assert_allclose(streamed["tfdif score"], expected["tfdif score"], rtol=1e-12)
+
+    def test_unrooted_index_spills_blocks_to_disk(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        index = StreamingTfidf()
+        index.partial_fit(iter(synthetic_risk_rows(40)), chunk_size=16)
+        [spill] = tmp_path.glob("streaming_tfidf_*")
+        assert len(list(spill.glob("counts_*.npz"))) == 3
+
+        del index
+        gc.collect()
+        assert not spill.exists()
+
+    def test_persisted_index_only_adds_new_filings(self, tmp_path):
+        rows = synthetic_risk_rows(90)
+        extractor = NLPExtractor(FakeLoader(tmp_path, []), max_workers=1)
+        index = StreamingTfidf(tmp_path / "tfidf")
+        assert index.partial_fit(iter(rows[:60]), chunk_size=16) == 60
+
+        reopened = StreamingTfidf(tmp_path / "tfidf")
+        assert reopened.partial_fit(iter(rows), chunk_size=16) == 30
+        assert reopened.n_documents == 90
+
+        expected = extractor.get_top_n_words(10, rows)
+        scores = reopened.scores()
+        assert list(scores["word"]) == list(expected["word"])
+        np.testing.assert_allclose(scores["tfdif score"], expected["tfdif score"], rtol=1e-12)
+
+    def test_interrupted_save_keeps_previous_index(self, tmp_path, monkeypatch):
+        rows = synthetic_risk_rows(60)
+        index = StreamingTfidf(tmp_path / "tfidf")
+        index.partial_fit(iter(rows[:32]), chunk_size=16)
+        before = StreamingTfidf(tmp_path / "tfidf").scores()
+
+        def crash(*args):
+            raise OSError("disk full")
+
+        # the new generation is on disk but meta.json is never swapped in
+        monkeypatch.setattr(os, "replace", crash)
+        with pytest.raises(OSError):
+            index.partial_fit(iter(rows), chunk_size=16)
+        monkeypatch.undo()
+
+        reopened = StreamingTfidf(tmp_path / "tfidf")
+        assert reopened.n_documents == 32
+        pd.testing.assert_frame_equal(reopened.scores(), before)
+        assert reopened.partial_fit(iter(rows), chunk_size=16) == 28
+        assert sorted(path.name for path in (tmp_path / "tfidf").glob("vocabulary*")) == ["vocabulary_00004.json"]
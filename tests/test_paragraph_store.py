@@ -0,0 +1,193 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from earnings_predictor.src.features.nlp_extractor import NLPExtractor
+from earnings_predictor.src.features.paragraph_store import ParagraphStore, split_paragraphs
+from earnings_predictor.src.features.streaming_tfidf import default_analyzer
+from tests.test_feature_matrix import memory_mapped
+from tests.test_nlp_extractor import FakeLoader, make_filings
+from utils.synthetic_market import synthetic_filings
+
+SUPPLY = "supply chain disruptions could delay shipments from overseas suppliers and raise component costs"
+REVISED = "supply chain disruptions could delay shipments from overseas suppliers and raise freight costs"
+CYBER = "cybersecurity breaches could expose customer data and damage our reputation with regulators"
+CLIMATE = "climate regulation may increase compliance spending across manufacturing plants worldwide"
+RATES = "rising interest rates would raise borrowing costs on floating rate credit facilities"
+
+
+def filing(accession, date, *paragraphs, ticker="ACME"):
+    return {"accession_number" : accession, "filing_date" : date, "report_date" : None,
+            "ticker" : ticker, "risk_factor" : "\n\n".join(paragraphs)}
+
+
+def counted_analyzer(calls):
+    analyzer = default_analyzer()
+
+    def analyze(text):
+        calls.append(text)
+        return analyzer(text)
+
+    return analyze
+
+
+class TestUnitParagraphStore:
+
+    def setup_class(self):
+        self.rows = synthetic_filings(5, filings_per_ticker=6, paragraphs_per_filing=12, words_per_paragraph=40, seed=5)
+
+    def test_split_paragraphs(self):
+        text = "  first   line\nwraps here \n\n\n second\t paragraph \n   \n\nthird"
+        assert split_paragraphs(text) == ["first line wraps here", "second paragraph", "third"]
+        assert split_paragraphs(None) == [] and split_paragraphs("   ") == []
+
+    def test_filing_counts_match_whole_text(self):
+        store = ParagraphStore()
+        assert store.add(self.rows) == len(self.rows)
+
+        vectorizer = CountVectorizer(lowercase=True, stop_words="english", token_pattern=r"(?u)\b[A-Za-z]{3,}\b")
+        expected = vectorizer.fit_transform([row["risk_factor"] for row in self.rows]).toarray()
+        positions = [store.vocabulary[term] for term in vectorizer.get_feature_names_out()]
+        counts = store.filing_counts()
+        assert counts.shape[1] == len(positions)
+        np.testing.assert_array_equal(counts.toarray()[:, positions], expected)
+
+    def test_only_unseen_paragraphs_are_tokenized(self):
+        calls = []
+        store = ParagraphStore(analyzer=counted_analyzer(calls))
+        store.add(self.rows)
+        distinct = {paragraph for row in self.rows for paragraph in split_paragraphs(row["risk_factor"])}
+        total = sum(len(split_paragraphs(row["risk_factor"])) for row in self.rows)
+        assert len(calls) == store.n_paragraphs == len(distinct) < total / 2
+
+        assert store.add(self.rows) == 0 and len(calls) == len(distinct)
+        latest = self.rows[5]["risk_factor"].split("\n\n")
+        store.add([filing("NEXT-1", "2017-02-15", *latest[:-1], CLIMATE, ticker="S0000")])
+        assert calls[len(distinct):] == [CLIMATE]
+
+    def test_changes_against_previous_filing(self):
+        store = ParagraphStore()
+        store.add([
+            filing("ACME-2", "2021-02-15", SUPPLY, CYBER, CLIMATE),
+            filing("ACME-3", "2022-02-15", REVISED, CYBER, RATES, CYBER),
+            filing("OTHER-1", "2021-03-01", CYBER, ticker="OTHER"),
+        ])
+        store.add([filing("ACME-1", "2020-02-15", SUPPLY, CYBER)])
+        changes = store.changes()
+
+        first = changes.loc["ACME-1"]
+        assert first["added"] == 2 and np.isnan(first["changed fraction"]) and np.isnan(first["similarity"])
+        second = changes.loc["ACME-2"]
+        assert (second["unchanged"], second["modified"], second["added"], second["removed"]) == (2, 0, 1, 0)
+        third = changes.loc["ACME-3"]
+        assert (third["paragraphs"], third["unchanged"], third["modified"], third["added"], third["removed"]) == (3, 1, 1, 1, 1)
+        assert third["changed fraction"] == pytest.approx(2 / 3)
+        assert 0 < third["similarity"] < 1
+        assert np.isnan(changes.loc["OTHER-1", "similarity"])
+
+        # the rewritten and the added paragraph are the year's new language
+        new_language = store.change_counts(["ACME-3", "ACME-1"])
+        assert {store.terms()[term] for term in new_language[0].indices} == set(default_analyzer()(REVISED + " " + RATES))
+        assert (new_language[1] != store.filing_counts(["ACME-1"])).nnz == 0
+
+    def test_persisted_store_reloads_memory_mapped(self, tmp_path):
+        store = ParagraphStore(tmp_path / "paragraphs")
+        store.add(self.rows[:12])
+        reloaded = ParagraphStore(tmp_path / "paragraphs")
+        assert reloaded.accessions == store.accessions and reloaded.n_paragraphs == store.n_paragraphs
+        assert memory_mapped(reloaded.paragraph_counts().data) and memory_mapped(reloaded.signatures())
+
+        calls = []
+        grown = ParagraphStore(tmp_path / "paragraphs", analyzer=counted_analyzer(calls))
+        assert grown.add(self.rows) == len(self.rows) - 12
+        at_once = ParagraphStore()
+        at_once.add(self.rows)
+        assert len(calls) == at_once.n_paragraphs - store.n_paragraphs
+        np.testing.assert_array_equal(grown.signatures(), at_once.signatures())
+        pd.testing.assert_frame_equal(ParagraphStore(tmp_path / "paragraphs").changes(), at_once.changes())
+
+    def test_changed_text_is_split_again(self, tmp_path):
+        store = ParagraphStore(tmp_path / "paragraphs")
+        store.add([filing("ACME-1", "2020-02-15", SUPPLY, CYBER), filing("ACME-2", "2021-02-15", SUPPLY, CYBER)])
+        rewritten = [filing("ACME-1", "2020-02-15", SUPPLY, CYBER), filing("ACME-2", "2021-02-15", REVISED, RATES)]
+        assert store.add(rewritten) == 1
+
+        expected = ParagraphStore()
+        expected.add(rewritten)
+        reloaded = ParagraphStore(tmp_path / "paragraphs")
+        assert reloaded.accessions == expected.accessions
+        assert reloaded.vocabulary == expected.vocabulary
+        assert (reloaded.filing_counts() != expected.filing_counts()).nnz == 0
+        pd.testing.assert_frame_equal(reloaded.changes(), expected.changes())
+        assert reloaded.add(rewritten) == 0
+
+    def test_interrupted_save_keeps_previous_store(self, tmp_path, monkeypatch):
+        store = ParagraphStore(tmp_path / "paragraphs")
+        store.add(self.rows[:12])
+        before = ParagraphStore(tmp_path / "paragraphs").changes()
+
+        def crash(*args):
+            raise OSError("disk full")
+
+        # the new generation is on disk but meta.json is never swapped in
+        monkeypatch.setattr(os, "replace", crash)
+        with pytest.raises(OSError):
+            store.add(self.rows)
+        monkeypatch.undo()
+
+        reopened = ParagraphStore(tmp_path / "paragraphs")
+        pd.testing.assert_frame_equal(reopened.changes(), before)
+        assert reopened.add(self.rows) == len(self.rows) - 12
+        assert [path.name for path in (tmp_path / "paragraphs").glob("filings*")] == ["filings_00001.json"]
+
+    def test_rejects_other_versions(self, tmp_path):
+        ParagraphStore(tmp_path).add(self.rows[:2])
+        (tmp_path / "meta.json").write_text('{"version": 0}')
+        with pytest.raises(ValueError):
+            ParagraphStore(tmp_path)
+
+
+class TestUnitNLPExtractorParagraphs:
+
+    def test_top_words_from_paragraphs_match_vectorizer(self, tmp_path):
+        rows = synthetic_filings(6, filings_per_ticker=5, paragraphs_per_filing=8, words_per_paragraph=40, seed=9)
+        extractor = NLPExtractor(FakeLoader(tmp_path, make_filings()), max_workers=1)
+        expected = extractor.get_top_n_words(10, rows)
+
+        store = ParagraphStore()
+        scored = extractor.get_top_n_words(10, rows[:20], paragraph_store=store)
+        assert len(scored) > 0
+        scored = extractor.get_top_n_words(10, rows, paragraph_store=store)
+        assert set(scored["word"]) == set(expected["word"])
+        merged = expected.merge(scored, on="word")
+        np.testing.assert_allclose(merged["tfdif score_x"], merged["tfdif score_y"], rtol=1e-12)
+        np.testing.assert_allclose(scored["tfdif score"], expected["tfdif score"], rtol=1e-12)
+
+    def test_filing_changes_under_data_dir(self, tmp_path):
+        extractor = NLPExtractor(FakeLoader(tmp_path, make_filings()), max_workers=1)
+        changes = extractor.filing_changes(["AAPL"])
+
+        assert changes.index.tolist() == ["0000320193-22", "0000320193-23", "0000320193-24"]
+        assert (tmp_path / "risk_factor_paragraphs" / "meta.json").exists()
+        assert changes["paragraphs"].tolist() == [1, 1, 0]
+        # two of five terms shared, below the rewrite threshold
+        assert tuple(changes.loc["0000320193-23", ["modified", "added", "removed"]]) == (0, 1, 1)
+        assert extractor.filing_changes(["AAPL"]).equals(changes)
+
+    def test_filing_changes_keeps_one_store_per_source(self, tmp_path):
+        extractor = NLPExtractor(FakeLoader(tmp_path, make_filings()), max_workers=1)
+        edgar = extractor.filing_changes(["AAPL"])
+        local_rows = [
+            {"accession_number" : accession, "filing_date" : "2024-01-01", "report_date" : None,
+             "risk_factor" : "Liquidity risk\n\nCredit risk"}
+            for accession in edgar.index
+        ]
+        extractor.extract_features_from_local_filings = lambda ticker: local_rows
+        local = extractor.filing_changes(["AAPL"], local_filings=True)
+
+        assert (tmp_path / "risk_factor_paragraphs_local" / "meta.json").exists()
+        assert local["paragraphs"].tolist() == [2, 2, 2]
+        assert extractor.filing_changes(["AAPL"]).equals(edgar)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from stat_arb.src.backtest.pairs_backtest import PairsBacktester, backtest_positions
+from stat_arb.src.backtest.parameter_sweep import ParameterSweep, expand_grid, portfolio_metrics
+from stat_arb.src.features import spread_signals
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from tests.test_cointegrations import SyntheticLoader
+
+GRID = {"window": [20, 40], "entry_z": [1.5, 2.0], "exit_z": [0.0, 0.5], "stop_z": [3.5], "max_p": [0.05, 1.0]}
+
+
+class TestUnitParameterSweep:
+
+    def setup_class(self):
+        self.loader = SyntheticLoader(n_tickers=6, n_days=500, seed=13)
+        self.results = CointegrationEngine(self.loader).engel_granger(screens=[])
+
+    def test_expand_grid_drops_invalid_bands(self):
+        points = expand_grid({"entry_z": [1.0, 2.0], "exit_z": [1.5], "stop_z": [3.0]})
+        assert [point["entry_z"] for point in points] == [2.0]
+        assert points[0]["window"] == spread_signals.DEFAULT_WINDOW
+
+    def test_matches_direct_backtest(self):
+        sweep = ParameterSweep(self.loader, self.results)
+        frame = sweep.run(GRID)
+        assert len(frame) == 16
+
+        row = frame[(frame["window"] == 40) & (frame["entry_z"] == 2.0) & (frame["exit_z"] == 0.5) & (frame["max_p"] == 1.0)].iloc[0]
+        pairs = self.results.drop_duplicates("direction")
+        prices = self.loader.load_data_nyse()
+        columns = {ticker: i for i, ticker in enumerate(prices.columns)}
+        dependents = np.array([columns[d.split("~")[0]] for d in pairs["direction"]])
+        independents = np.array([columns[d.split("~")[1]] for d in pairs["direction"]])
+        log_prices = np.log(prices.to_numpy())
+        spreads = spread_signals.pair_spreads(
+            log_prices, dependents, independents, pairs["constant"].to_numpy(), pairs["hedge ratio"].to_numpy()
+        )
+        zscores = spread_signals.rolling_zscores(spreads, 40)
+        positions, entries, _, _ = spread_signals.zscore_positions(zscores, 2.0, 0.5, 3.5)
+        result = backtest_positions(prices.to_numpy(), positions, dependents, independents, pairs["hedge ratio"].to_numpy())
+        expected = portfolio_metrics(result.pair_returns, result.turnover, entries, 252)
+
+        for metric, value in expected.items():
+            assert row[metric] == pytest.approx(value, nan_ok=True)
+
+    def test_metrics_agree_with_backtester(self):
+        # a book losing from its first bar, its worst drawdown is the final P&L
+        prices = np.column_stack([100 * 0.99 ** np.arange(30), np.full(30, 50.0)])
+        positions = np.ones((30, 1), dtype=np.int8)
+        result = backtest_positions(prices, positions, np.array([0]), np.array([1]), np.array([0.0]))
+        metrics = portfolio_metrics(result.pair_returns, result.turnover, positions[:1], 252)
+
+        summary = PairsBacktester(self.loader).pair_summary(result, ["T00~T01"]).iloc[0]
+        assert metrics["max drawdown"] == pytest.approx(summary["max drawdown"])
+        assert metrics["max drawdown"] == pytest.approx(result.portfolio_pnl[-1])
+        assert metrics["sharpe"] == pytest.approx(summary["sharpe"])
+
+    def test_cache_only_runs_new_points(self, tmp_path, monkeypatch):
+        first = ParameterSweep(self.loader, self.results, cache_dir=tmp_path).run(GRID)
+        assert len(list(tmp_path.glob("*.json"))) == 16
+
+        calls = []
+        real = ParameterSweep.spreads
+        monkeypatch.setattr(ParameterSweep, "spreads", lambda self: calls.append(1) or real(self))
+        again = ParameterSweep(self.loader, self.results, cache_dir=tmp_path).run(GRID)
+        assert not calls
+        assert again.equals(first)
+
+        grown = ParameterSweep(self.loader, self.results, cache_dir=tmp_path).run({**GRID, "window": [20, 40, 60]})
+        assert len(calls) == 1 and len(grown) == 24
+        assert len(list(tmp_path.glob("*.json"))) == 24
+
+    def test_data_change_misses_cache(self, tmp_path):
+        ParameterSweep(self.loader, self.results, cache_dir=tmp_path).run(GRID)
+        changed = SyntheticLoader(n_tickers=6, n_days=500, seed=13)
+        changed._prices.iloc[-1] *= 1.01
+        assert ParameterSweep(changed, self.results, cache_dir=tmp_path)._cached(expand_grid(GRID)[0]) is None
+
+    def test_parallel_matches_serial(self):
+        serial = ParameterSweep(self.loader, self.results).run(GRID)
+        parallel = ParameterSweep(self.loader, self.results, n_workers=2).run(GRID)
+        assert parallel.equals(serial)
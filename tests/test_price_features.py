@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.features.price_features import PriceFeatures
+from tests.test_cointegrations import SyntheticLoader
+
+
+class TestUnitPriceFeatures:
+
+    def setup_method(self) -> None:
+        self.__prices = SyntheticLoader(n_tickers=6, n_days=300, seed=5).load_data_nyse()
+
+    def test_matches_pandas_transforms_in_column_order(self) -> None:
+        features = PriceFeatures(self.__prices)
+        log_prices = features.log_prices()
+
+        assert log_prices.columns.tolist() == self.__prices.columns.tolist()
+        pd.testing.assert_frame_equal(log_prices, np.log(self.__prices))
+        pd.testing.assert_frame_equal(
+            features.log_returns(),
+            np.log(self.__prices / self.__prices.shift(1)).fillna(0),
+        )
+        np.testing.assert_allclose(features.correlation_matrix(), log_prices.corr().to_numpy(), atol=1e-12)
+        pd.testing.assert_series_equal(
+            features.correlation_stack(), np.log(self.__prices).corr().stack(), atol=1e-12
+        )
+
+    def test_memoized_across_instances_and_read_only(self) -> None:
+        first = PriceFeatures(self.__prices)
+        second = PriceFeatures(self.__prices.copy())
+        assert second.log_price_matrix() is first.log_price_matrix()
+        assert second.correlation_matrix() is first.correlation_matrix()
+        with pytest.raises(ValueError):
+            first.log_price_matrix()[0, 0] = 0.0
+
+    def test_update_invalidates_only_on_change(self) -> None:
+        features = PriceFeatures(self.__prices)
+        before = features.log_price_matrix()
+        assert not features.update(self.__prices.copy())
+        assert features.log_price_matrix() is before
+
+        changed = self.__prices.copy()
+        changed.iloc[-1, 0] *= 1.01
+        assert features.update(changed)
+        assert features.log_price_matrix()[-1, 0] == pytest.approx(np.log(changed.iloc[-1, 0]))
+
+    def test_float32_features(self) -> None:
+        features = PriceFeatures(self.__prices, dtype=np.float32)
+        assert features.log_price_matrix().dtype == np.float32
+        assert features.log_return_matrix().flags.c_contiguous
+        np.testing.assert_allclose(features.correlation_matrix(), np.log(self.__prices).corr().to_numpy(), atol=1e-5)
+
+    def test_engine_reload_data(self) -> None:
+        loader = SyntheticLoader(n_tickers=4, n_days=200, seed=9)
+        engine = CointegrationEngine(loader)
+        log_returns = engine.compute_log_returns()
+        assert not engine.reload_data()
+        pd.testing.assert_frame_equal(engine.compute_log_returns(), log_returns)
+
+        loader._prices.iloc[-1] *= 1.02
+        assert engine.reload_data()
+        assert engine.compute_log_returns().iloc[-1, 0] != log_returns.iloc[-1, 0]
+
+    def test_engine_frames_are_writable_copies(self) -> None:
+        loader = SyntheticLoader(n_tickers=4, n_days=200, seed=9)
+        engine = CointegrationEngine(loader)
+        expected = engine.engel_granger(screens=[])
+
+        log_prices, _ = engine.conduct_log_transformations_on_prices(False)
+        log_prices["x"] = 0.0
+        log_returns = engine.compute_log_returns()
+        log_returns.iloc[0] = 1.0
+
+        # a second engine on the same data reads the shared features the writes must not reach
+        fresh = CointegrationEngine(loader)
+        pd.testing.assert_frame_equal(fresh.engel_granger(screens=[]), expected)
+        assert (fresh.compute_log_returns().iloc[0] == 0).all()
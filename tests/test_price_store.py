@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_loader import DataLoader
+from utils.price_sources import PriceSource
+from utils.price_store import PriceStore
+
+
+def synthetic_prices(n_tickers=6, n_days=50, start="2021-01-01", seed=1):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=n_days, name="Date")
+    values = np.exp(3 + np.cumsum(rng.normal(0, 0.01, size=(n_days, n_tickers)), axis=0))
+    return pd.DataFrame(values, index=dates, columns=[f"T{i:02d}" for i in range(n_tickers)])
+
+
+class TestUnitPriceStore:
+
+    def test_round_trip_is_zero_copy(self, tmp_path):
+        prices = synthetic_prices()
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices)
+
+        loaded = store.read()
+        pd.testing.assert_frame_equal(loaded, prices, check_freq=False)
+        base = loaded.to_numpy()
+        while base is not None and not isinstance(base, np.memmap):
+            base = base.base
+        assert isinstance(base, np.memmap), "full read copied the segment"
+
+    def test_column_and_date_selection(self, tmp_path):
+        prices = synthetic_prices()
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices)
+
+        loaded = store.read(tickers=["T03", "T01"], start=prices.index[10], end=prices.index[19])
+        pd.testing.assert_frame_equal(
+            loaded, prices.loc[prices.index[10]: prices.index[19], ["T03", "T01"]], check_freq=False
+        )
+
+    def test_append_adds_segment(self, tmp_path):
+        prices = synthetic_prices(n_days=60)
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices.iloc[:40])
+        store.append(prices.iloc[40:, ::-1])
+
+        assert store.last_date() == prices.index[-1]
+        pd.testing.assert_frame_equal(store.read(), prices, check_freq=False)
+        pd.testing.assert_frame_equal(
+            store.read(start=prices.index[35], end=prices.index[45]),
+            prices.iloc[35:46],
+            check_freq=False,
+        )
+
+    def test_iter_segments_are_memory_mapped(self, tmp_path):
+        prices = synthetic_prices(n_days=60)
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices.iloc[:40])
+        store.append(prices.iloc[40:])
+
+        segments = list(store.iter_segments(tickers=["T02", "T00"], start=prices.index[30]))
+        assert [len(segment) for segment in segments] == [10, 20]
+        pd.testing.assert_frame_equal(pd.concat(segments), prices.iloc[30:, [2, 0]], check_freq=False)
+        # all tickers, so no column selection copies the slice
+        for segment in store.iter_segments(start=prices.index[30]):
+            base = segment.to_numpy()
+            while base is not None and not isinstance(base, np.memmap):
+                base = base.base
+            assert isinstance(base, np.memmap), "segment was copied"
+
+    def test_loader_migrates_csv_once(self, tmp_path):
+        prices = synthetic_prices(n_tickers=49, n_days=1100)
+        prices.to_csv(tmp_path / "nyse_50_stocks.csv")
+        loader = DataLoader(tmp_path)
+
+        loaded = loader.load_data_nyse()
+        assert loader.price_store_nyse.exists()
+        pd.testing.assert_frame_equal(loaded, prices, check_freq=False, check_names=False)
+
+        (tmp_path / "nyse_50_stocks.csv").unlink()
+        assert loader.load_data_nyse(tickers=["T05"]).shape == (1100, 1)
+
+
+class FakePriceSource:
+    # local stand-in for yfinance serving slices of a fixed raw panel and recording every request
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.requests = []
+
+    def fetch(self, tickers, start, end):
+        self.requests.append((tuple(tickers), start, end))
+        columns = [ticker for ticker in tickers if ticker in self.raw.columns]
+        window = self.raw.loc[(self.raw.index >= start) & (self.raw.index < end), columns]
+        return window.dropna(axis=1, how="all")
+
+
+class TestUnitIncrementalSync:
+
+    def setup_method(self):
+        self._truth = synthetic_prices(n_tickers=4, n_days=80, start="2020-01-01")
+        self._dates = self._truth.index
+
+    def test_sync_only_fetches_missing_tail(self, tmp_path):
+        loader = DataLoader(tmp_path, tickers_nyse=["T00", "T01", "T02"])
+
+        # first sync: T02 has not printed its last three days yet
+        stale = self._truth.copy()
+        stale.loc[self._dates[57]:, "T02"] = np.nan
+        loader.sync_data_nyse(FakePriceSource(stale), end=self._dates[60])
+        expected = stale.iloc[:60, :3].ffill().bfill()
+        pd.testing.assert_frame_equal(loader.load_data_nyse(), expected, check_freq=False)
+
+        source = FakePriceSource(self._truth)
+        loader.sync_data_nyse(source, end=self._dates[-1] + pd.Timedelta(days=1))
+        pd.testing.assert_frame_equal(
+            loader.load_data_nyse(), self._truth.iloc[:, :3], check_freq=False, check_names=False
+        )
+        starts = {tickers: start for tickers, start, _ in source.requests}
+        assert starts[("T00", "T01")] == self._dates[59] + pd.Timedelta(days=1)
+        assert starts[("T02",)] == self._dates[56] + pd.Timedelta(days=1)
+
+    def test_sync_backfills_new_tickers_only(self, tmp_path):
+        DataLoader(tmp_path, tickers_nyse=["T00", "T01"]).sync_data_nyse(
+            FakePriceSource(self._truth), end=self._dates[-1] + pd.Timedelta(days=1)
+        )
+
+        source = FakePriceSource(self._truth)
+        loader = DataLoader(tmp_path, tickers_nyse=["T00", "T01", "T03"])
+        loader.sync_data_nyse(source, end=self._dates[-1] + pd.Timedelta(days=1))
+
+        assert [tickers for tickers, _, _ in source.requests] == [("T00", "T01"), ("T03",)]
+        pd.testing.assert_frame_equal(
+            loader.load_data_nyse(),
+            self._truth[["T00", "T01", "T03"]],
+            check_freq=False,
+            check_names=False,
+        )
+
+    def test_sources_must_implement_fetch(self):
+        with pytest.raises(TypeError):
+            PriceSource()
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.features.kalman_hedge import KalmanHedgeRatios
+from stat_arb.src.features.spread_signals import zscore_positions
+from stat_arb.src.replay.replay_engine import (
+    END_TO_END,
+    ReplayEngine,
+    Stage,
+    price_store_bars,
+    strategy_stages,
+)
+from tests.test_cointegrations import SyntheticLoader
+from utils.price_store import PriceStore
+
+
+def counting_bars(n_bars, n_tickers=3, spacing="1s"):
+    pulled = []
+    index = pd.date_range("2024-01-02 09:30", periods=n_bars, freq=spacing)
+
+    def bars():
+        for sequence, timestamp in enumerate(index):
+            pulled.append(sequence)
+            yield timestamp, np.full(n_tickers, 100.0 + sequence)
+
+    return bars(), pulled
+
+
+class TestUnitReplayEngine:
+
+    def test_bars_flow_through_every_stage_in_order(self):
+        bars, _ = counting_bars(50)
+        seen = []
+        stages = [
+            Stage("double", lambda bar, closes: closes * 2),
+            Stage("total", lambda bar, doubled: float(doubled.sum())),
+        ]
+        report = ReplayEngine(bars, stages, on_output=lambda bar, total: seen.append((bar.sequence, total))).run()
+
+        assert report.bars == 50 and report.bars_per_second > 0
+        assert seen == [(sequence, 6 * (100.0 + sequence)) for sequence in range(50)]
+        assert set(report.latencies) == {"double", "total", END_TO_END}
+        for summary in report.latencies.values():
+            assert summary["count"] == 50 and summary["p50"] <= summary["p99"] <= summary["max"]
+
+    def test_slow_consumer_applies_backpressure(self):
+        bars, pulled = counting_bars(40)
+        backlog = []
+
+        async def slow(bar, closes):
+            backlog.append(len(pulled) - bar.sequence)
+            await asyncio.sleep(0.001)
+            return closes
+
+        ReplayEngine(bars, [Stage("fast", lambda bar, closes: closes), Stage("slow", slow)], queue_size=2).run()
+        # two queues of two, plus a bar in each stage and one blocked in the source
+        assert max(backlog) <= 2 * 2 + 3
+
+    def test_paced_replay_follows_the_clock(self):
+        bars, _ = counting_bars(6, spacing="1s")
+        started = time.perf_counter()
+        report = ReplayEngine(bars, [Stage("noop", lambda bar, closes: closes)], speed=50).run()
+        assert time.perf_counter() - started >= 5 / 50
+        assert report.seconds >= 5 / 50
+
+    def test_stage_errors_propagate(self):
+        bars, _ = counting_bars(5)
+
+        def broken(bar, closes):
+            raise ValueError("bad bar")
+
+        with pytest.raises(ExceptionGroup):
+            ReplayEngine(bars, [Stage("broken", broken)]).run()
+
+    def test_strategy_replay_matches_batch(self, tmp_path):
+        loader = SyntheticLoader(n_tickers=6, n_days=300)
+        prices = loader.load_data_nyse()
+        results = CointegrationEngine(loader).engel_granger(screens=[])
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices)
+
+        outputs = []
+        stages = strategy_stages(prices.columns.tolist(), results, decay=None)
+        report = ReplayEngine(
+            price_store_bars(store, chunk_rows=64), stages, on_output=lambda bar, out: outputs.append(out)
+        ).run()
+        assert report.bars == len(prices) and set(report.latencies) == {"features", "signals", "risk", END_TO_END}
+
+        pairs = results.drop_duplicates("direction")
+        positions = {ticker : i for i, ticker in enumerate(prices.columns)}
+        legs = [direction.split("~") for direction in pairs["direction"]]
+        kalman = KalmanHedgeRatios(
+            [positions[a] for a, _ in legs], [positions[b] for _, b in legs],
+            pairs["constant"].to_numpy(), pairs["hedge ratio"].to_numpy(),
+        )
+        path = kalman.update_block(np.log(prices.to_numpy()))
+        expected, _, _, _ = zscore_positions(path.innovations / np.sqrt(path.innovation_variances), 2.0, 0.5, 4.0)
+
+        np.testing.assert_array_equal(np.stack([out["positions"] for out in outputs]), expected)
+        assert outputs[0]["volatility"] == 0 and np.isfinite([out["volatility"] for out in outputs]).all()
+
+    def test_price_store_bars_walk_every_segment(self, tmp_path):
+        prices = SyntheticLoader(n_tickers=3, n_days=100).load_data_nyse()
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices.iloc[:40])
+        store.append(prices.iloc[40:70])
+        store.append(prices.iloc[70:])
+
+        bars = list(price_store_bars(store, start=prices.index[10], chunk_rows=16))
+        assert [timestamp for timestamp, _ in bars] == prices.index[10:].tolist()
+        np.testing.assert_array_equal(np.stack([closes for _, closes in bars]), prices.iloc[10:].to_numpy())
+
+    def test_strategy_stages_use_the_engine_filter(self, tmp_path):
+        loader = SyntheticLoader(n_tickers=6, n_days=300)
+        prices = loader.load_data_nyse()
+        engine = CointegrationEngine(loader)
+        results = engine.engel_granger()
+        store = PriceStore(tmp_path / "prices")
+        store.write(prices)
+
+        outputs = []
+        kalman = engine.kalman_hedge_ratios(results, only_cointegrated=False)
+        assert not np.allclose(kalman.observation_variance, kalman.observation_variance[0])
+        stages = strategy_stages(prices.columns.tolist(), results, decay=None, kalman=kalman)
+        ReplayEngine(price_store_bars(store), stages, on_output=lambda bar, out: outputs.append(out)).run()
+
+        # the same seeds and per pair residual variances run over the whole history at once
+        batch = engine.kalman_hedge_ratios(results, only_cointegrated=False)
+        path = batch.update_block(np.log(prices.to_numpy()))
+        expected, _, _, _ = zscore_positions(path.innovations / np.sqrt(path.innovation_variances), 2.0, 0.5, 4.0)
+        np.testing.assert_array_equal(np.stack([out["positions"] for out in outputs]), expected)
+
+        with pytest.raises(AssertionError):
+            strategy_stages(prices.columns.tolist(), results, kalman=engine.kalman_hedge_ratios(results))
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from sklearn.covariance import ledoit_wolf
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.risk.risk_engine import RiskEngine, spread_returns
+from tests.test_cointegrations import SyntheticLoader
+
+
+def make_engine(n_pairs=12, n_tickers=8, decay=0.94, shrink=True, seed=0):
+    rng = np.random.default_rng(seed)
+    dependents = rng.integers(0, n_tickers, n_pairs)
+    independents = (dependents + rng.integers(1, n_tickers, n_pairs)) % n_tickers
+    tickers = [f"T{i:02d}" for i in range(n_tickers)]
+    return RiskEngine(tickers, dependents, independents, rng.uniform(0.5, 1.5, n_pairs), decay, shrink)
+
+
+class TestUnitRiskEngine:
+
+    def test_streaming_ewma_matches_direct_sum(self):
+        rng = np.random.default_rng(1)
+        returns = rng.normal(0, 0.01, size=(300, 12)) @ rng.normal(size=(12, 12))
+        streamed, blocked = make_engine(), make_engine()
+        for bar in returns:
+            streamed.update_returns(bar)
+        blocked.update_returns(returns[:100])
+        blocked.update_returns(returns[100:])
+
+        weights = 0.94 ** np.arange(299, -1, -1)
+        expected = (returns * weights[:, None]).T @ returns / weights.sum()
+        np.testing.assert_allclose(streamed.covariance(shrink=False), expected, rtol=1e-10)
+        np.testing.assert_allclose(blocked.covariance(shrink=False), expected, rtol=1e-10)
+        assert streamed.shrinkage_intensity() == pytest.approx(blocked.shrinkage_intensity())
+
+    def test_equal_weights_match_sklearn_ledoit_wolf(self):
+        rng = np.random.default_rng(2)
+        returns = rng.normal(0, 0.01, size=(60, 12))
+        engine = make_engine(decay=None)
+        for bar in returns:
+            engine.update_returns(bar)
+
+        shrunk, intensity = ledoit_wolf(returns, assume_centered=True)
+        assert engine.shrinkage_intensity() == pytest.approx(intensity, rel=1e-10)
+        np.testing.assert_allclose(engine.covariance(), shrunk, rtol=1e-10)
+
+    def test_risk_contributions(self):
+        rng = np.random.default_rng(3)
+        engine = make_engine()
+        engine.update_returns(rng.normal(0, 0.01, size=(200, 12)))
+        positions = rng.integers(-1, 2, 12).astype(float)
+        engine.set_positions(positions, capital_per_pair=1e5)
+
+        volatility = engine.portfolio_volatility()
+        assert engine.risk_contributions().sum() == pytest.approx(volatility)
+
+        bumped = positions.copy()
+        bumped[0] += 1e-6
+        engine.set_positions(bumped, capital_per_pair=1e5)
+        numeric = (engine.portfolio_volatility() - volatility) / (1e-6 * 1e5)
+        engine.set_positions(positions, capital_per_pair=1e5)
+        assert engine.marginal_contributions()[0] == pytest.approx(numeric, rel=1e-4)
+
+    def test_covariance_is_a_copy(self):
+        rng = np.random.default_rng(4)
+        engine = make_engine()
+        engine.update_returns(rng.normal(0, 0.01, size=(200, 12)))
+        positions = rng.integers(-1, 2, 12).astype(float)
+        engine.set_positions(positions)
+        volatility = engine.portfolio_volatility()
+
+        for shrink in (True, False):
+            engine.covariance(shrink)[:] = 0
+        # recomputed from the cached estimates the writes above must not have reached
+        engine.set_positions(positions)
+        assert engine.portfolio_volatility() == volatility > 0
+
+    def test_ticker_exposure(self):
+        engine = RiskEngine(["A", "B", "C"], [0, 2], [1, 1], [1.0, 3.0])
+        engine.set_positions([1, -1], capital_per_pair=100)
+        exposure = engine.ticker_exposure()
+        assert exposure.to_dict() == pytest.approx({"A": 50.0, "B": -50.0 + 75.0, "C": -25.0})
+
+    def test_prices_feed_and_cointegration_results(self):
+        loader = SyntheticLoader()
+        prices = loader.load_data_nyse()
+        results = CointegrationEngine(loader).engel_granger(screens=[])
+        engine = RiskEngine.from_cointegration_results(prices.columns.tolist(), results)
+        reference = RiskEngine.from_cointegration_results(prices.columns.tolist(), results)
+
+        values = prices.to_numpy()
+        engine.update_prices(values[:300])
+        for bar in values[300:]:
+            engine.update_prices(bar)
+        reference.update_returns(spread_returns(values, reference.dependents, reference.independents, reference.hedge_ratios))
+
+        assert engine.n_updates == len(values) - 1
+        np.testing.assert_allclose(engine.covariance(), reference.covariance(), rtol=1e-10)
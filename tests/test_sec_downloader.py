@@ -0,0 +1,146 @@
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.sec_downloader import HttpClient, SecFilingDownloader, TokenBucket
+
+COMPANIES = {
+    "0": {"cik_str": 320193, "ticker": "AAPL", "title": "Apple Inc."},
+    "1": {"cik_str": 789019, "ticker": "MSFT", "title": "Microsoft Corp"},
+}
+
+FILINGS = {
+    # cik: [(accession, form, filing date)] split over the recent block and one older page
+    320193: (
+        [("0000320193-24-000123", "10-K", "2024-11-01"),
+         ("0000320193-24-000081", "10-Q", "2024-08-02"),
+         ("0000320193-23-000106", "10-K", "2023-11-03")],
+        [("0000320193-06-000117", "10-K", "2006-12-29"),
+         ("0000320193-05-000007", "10-K", "2005-01-10")],
+    ),
+    789019: (
+        [("0000950170-24-087843", "10-K", "2024-07-30")],
+        [],
+    ),
+}
+
+
+def submissions_page(filings):
+    return {
+        "accessionNumber": [accession for accession, _, _ in filings],
+        "form": [form for _, form, _ in filings],
+        "filingDate": [filed for _, _, filed in filings],
+    }
+
+
+def build_routes():
+    routes = {"/files/company_tickers.json": json.dumps(COMPANIES).encode()}
+    for cik, (recent, older) in FILINGS.items():
+        files = [{"name": f"CIK{cik:010d}-submissions-001.json"}] if older else []
+        routes[f"/submissions/CIK{cik:010d}.json"] = json.dumps(
+            {"filings": {"recent": submissions_page(recent), "files": files}}
+        ).encode()
+        if older:
+            routes[f"/submissions/CIK{cik:010d}-submissions-001.json"] = json.dumps(submissions_page(older)).encode()
+        for accession, _, _ in recent + older:
+            routes[f"/Archives/edgar/data/{cik}/{accession.replace('-', '')}/{accession}.txt"] = (
+                f"<SEC-DOCUMENT>{accession}\nFORM 10-K\n".encode()
+            )
+    return routes
+
+
+class StubSecHandler(BaseHTTPRequestHandler):
+    routes = {}
+    failures = {}
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        if self.failures.get(self.path, 0) > 0:
+            self.failures[self.path] -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path not in self.routes:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = self.routes[self.path]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_sec():
+    StubSecHandler.routes = build_routes()
+    StubSecHandler.failures = {"/Archives/edgar/data/320193/000032019324000123/0000320193-24-000123.txt": 2}
+    StubSecHandler.hits = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSecHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def make_downloader(url, root):
+    return SecFilingDownloader(
+        "Test Runner test@example.com",
+        root,
+        max_workers=4,
+        requests_per_second=200,
+        backoff_seconds=0.01,
+        sec_url=url,
+        data_url=url,
+        progress=None,
+    )
+
+
+class TestUnitSecFilingDownloader:
+
+    def test_downloads_retries_and_resumes(self, stub_sec, tmp_path):
+        report = make_downloader(stub_sec, tmp_path).download(["AAPL", "MSFT"], after=date(2005, 12, 1))
+
+        assert report.failed == []
+        assert report.downloaded == 4
+        assert report.retries == 2
+        written = sorted(p.relative_to(tmp_path).parts[:3] for p in tmp_path.rglob("full-submission.txt"))
+        assert written == [
+            ("AAPL", "10-K", "0000320193-06-000117"),
+            ("AAPL", "10-K", "0000320193-23-000106"),
+            ("AAPL", "10-K", "0000320193-24-000123"),
+            ("MSFT", "10-K", "0000950170-24-087843"),
+        ]
+        assert not list(tmp_path.rglob("*.part"))
+
+        StubSecHandler.hits.clear()
+        again = make_downloader(stub_sec, tmp_path).download(["AAPL", "MSFT"], after=date(2005, 12, 1))
+        assert (again.downloaded, again.skipped) == (0, 4)
+        assert not [hit for hit in StubSecHandler.hits if hit.startswith("/Archives")]
+
+    def test_unknown_ticker_is_reported(self, stub_sec, tmp_path):
+        report = make_downloader(stub_sec, tmp_path).download(["ZZZZ"])
+        assert report.failed == [("ZZZZ", "ticker not in SEC company list")]
+
+    def test_clients_must_implement_get(self):
+        with pytest.raises(TypeError):
+            HttpClient()
+
+
+class TestUnitTokenBucket:
+
+    def test_rate_is_enforced(self):
+        clock = [0.0]
+        bucket = TokenBucket(10, capacity=1, clock=lambda: clock[0], sleep=lambda s: clock.__setitem__(0, clock[0] + s))
+        for _ in range(21):
+            bucket.acquire()
+        assert clock[0] == pytest.approx(2.0)
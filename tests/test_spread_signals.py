@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.features.spread_signals import (
+    StreamingBands,
+    half_life_windows,
+    rolling_mean_std,
+    rolling_zscores,
+    zscore_positions,
+)
+from tests.test_cointegrations import SyntheticLoader
+
+
+def reference_positions(zscores, entry_z, exit_z, stop_z):
+    # straightforward per bar state machine the vectorized rules must reproduce
+    positions = np.zeros(zscores.shape, dtype=np.int8)
+    for pair in range(zscores.shape[1]):
+        position, locked = 0, False
+        for t, z in enumerate(zscores[:, pair]):
+            if not np.isnan(z):
+                if abs(z) >= stop_z:
+                    position, locked = 0, True
+                elif abs(z) <= exit_z:
+                    position, locked = 0, False
+                elif abs(z) >= entry_z and not locked:
+                    position = -int(np.sign(z))
+            positions[t, pair] = position
+    return positions
+
+
+class TestUnitSpreadSignals:
+
+    def test_rolling_stats_match_pandas(self):
+        rng = np.random.default_rng(0)
+        values = np.cumsum(rng.normal(size=(300, 4)), axis=0) + 1e4
+        windows = np.array([5, 20, 60, 300])
+        mean, std = rolling_mean_std(values, windows)
+        for pair, window in enumerate(windows):
+            rolling = pd.Series(values[:, pair]).rolling(window)
+            np.testing.assert_allclose(mean[:, pair], rolling.mean(), rtol=1e-10)
+            np.testing.assert_allclose(std[:, pair], rolling.std(), rtol=1e-7)
+
+    def test_positions_match_state_machine(self):
+        rng = np.random.default_rng(1)
+        zscores = np.cumsum(rng.normal(0, 0.6, size=(2000, 12)), axis=0) % 9 - 4.5
+        zscores[:30] = np.nan
+        positions, entries, exits, stops = zscore_positions(zscores, 2.0, 0.5, 4.0)
+
+        np.testing.assert_array_equal(positions, reference_positions(zscores, 2.0, 0.5, 4.0))
+        previous = np.vstack([np.zeros((1, 12), dtype=np.int8), positions[:-1]])
+        assert not (stops & exits).any()
+        np.testing.assert_array_equal(exits | stops, (positions == 0) & (previous != 0))
+        assert entries.sum() > 0 and stops.sum() > 0
+
+    def test_streaming_bands_match_batch(self):
+        rng = np.random.default_rng(2)
+        zscores = np.cumsum(rng.normal(0, 0.6, size=(500, 8)), axis=0) % 9 - 4.5
+        zscores[:10] = np.nan
+        expected = zscore_positions(zscores, 2.0, 0.5, 4.0)
+
+        bands = StreamingBands(8, 2.0, 0.5, 4.0)
+        rows = [bands.update(row) for row in zscores]
+        for field, batch in enumerate(expected):
+            np.testing.assert_array_equal(np.stack([row[field] for row in rows]), batch)
+
+    def test_half_life_windows(self):
+        windows = half_life_windows(np.array([3.0, 40.0, 500.0, np.inf, -2.0, np.nan]), multiplier=2.0)
+        np.testing.assert_array_equal(windows, [10, 80, 250, 60, 60, 60])
+
+    def test_engine_signals_frame(self):
+        engine = CointegrationEngine(SyntheticLoader())
+        # screens=[] keeps one row per unordered pair, so every direction is a unique column
+        results = engine.engel_granger(screens=[])
+        frame = engine.spread_signals(results, window=30)
+
+        directions = results.loc[results["is cointegrated"].astype(bool), "direction"].tolist()
+        assert frame["position"].columns.tolist() == directions
+        assert set(frame.columns.get_level_values(0)) == {"spread", "zscore", "position", "entry", "exit", "stop"}
+
+        direction = directions[0]
+        dependent, independent = direction.split("~")
+        row = results[results["direction"] == direction].iloc[0]
+        log_prices = np.log(SyntheticLoader().load_data_nyse())
+        spread = log_prices[dependent] - row["hedge ratio"] * log_prices[independent] - row["constant"]
+        np.testing.assert_allclose(frame[("spread", direction)], spread, atol=1e-12)
+        expected = (spread - spread.rolling(30).mean()) / spread.rolling(30).std()
+        np.testing.assert_allclose(frame[("zscore", direction)], expected, rtol=1e-7, atol=1e-9)
+
+    def test_engine_default_results_give_one_column_per_direction(self):
+        engine = CointegrationEngine(SyntheticLoader())
+        frame = engine.spread_signals(window=30)
+
+        # the default engel_granger run tests both orders of every pair
+        results = engine.engel_granger()
+        directions = results.loc[results["is cointegrated"].astype(bool), "direction"].drop_duplicates().tolist()
+        assert not frame.columns.duplicated().any()
+        assert frame["position"].columns.tolist() == directions
+
+    def test_zscore_of_flat_spread_is_nan(self):
+        assert np.isnan(rolling_zscores(np.ones((10, 1)), 3)).all()
+
+    def test_rejects_unordered_bands(self):
+        with pytest.raises(AssertionError):
+            zscore_positions(np.zeros((3, 1)), entry_z=1.0, exit_z=2.0, stop_z=3.0)
@@ -0,0 +1,225 @@
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from earnings_predictor.src.features.nlp_extractor import NLPExtractor
+from stat_arb.src.features import price_features
+from stat_arb.src.features.cointegrations import CointegrationEngine
+from stat_arb.src.features.pair_screens import DistanceScreen
+from utils.data_loader import DataLoader
+from utils.synthetic_market import synthetic_filings, synthetic_prices
+
+
+DEFAULT_TICKER_COUNTS : tuple[int, ...] = (50, 500, 3000)
+DEFAULT_DAYS : int = 1260
+# engel_granger over every pair of 3000 tickers is 4.5M regressions, larger panels are bounded
+# by a distance screen keeping this many candidate pairs per ticker
+DEFAULT_PAIRS_PER_TICKER : int = 10
+DEFAULT_FILINGS_PER_TICKER : int = 4
+# next to DataLoader's default data_dir rather than wherever the suite is started from
+DEFAULT_OUTPUT : Path = Path(__file__).parent.parent / "data" / "benchmark_results.json"
+
+STAGES : tuple[str, ...] = (
+    "load_data_nyse",
+    "conduct_log_transformations_on_prices",
+    "engel_granger",
+    "get_top_n_words",
+)
+
+
+def measure(
+        run : Callable[[], Any],
+        setup : Callable[[], Any] | None = None,
+        repeats : int = 3,
+        profile_memory : bool = True,
+) -> dict[str, float | None]:
+    '''
+    best of repeats wall time of run, then one more run under tracemalloc for its peak traced
+    allocation (numpy buffers included), kept apart so tracing never inflates the timings.
+    setup runs untimed before every call
+    '''
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    peak_bytes = None
+    if profile_memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "seconds" : min(timings),
+        "mean_seconds" : float(np.mean(timings)),
+        "peak_bytes" : peak_bytes,
+    }
+
+
+def _cold_engine(loader : DataLoader, engines : list[CointegrationEngine]) -> None:
+    # engines share memoized features by data hash, every timed call must start from none
+    price_features._shared_features.clear()
+    engines[:] = [CointegrationEngine(loader)]
+
+
+def benchmark_scale(
+        n_tickers : int,
+        n_days : int = DEFAULT_DAYS,
+        pairs_per_ticker : int | None = DEFAULT_PAIRS_PER_TICKER,
+        filings_per_ticker : int = DEFAULT_FILINGS_PER_TICKER,
+        repeats : int = 3,
+        profile_memory : bool = True,
+        seed : int = 0,
+) -> dict[str, Any]:
+    '''
+    every STAGES entry on one seeded synthetic market of n_tickers x n_days, written to a
+    PriceStore in a temporary data directory so load_data_nyse reads it like real data.
+    pairs_per_ticker=None tests every pair in engel_granger
+    '''
+    prices, planted = synthetic_prices(n_tickers, n_days, seed=seed)
+    filings = synthetic_filings(n_tickers, filings_per_ticker, seed=seed)
+    pair_budget = None if pairs_per_ticker is None else pairs_per_ticker * n_tickers
+    screens = None if pair_budget is None else [DistanceScreen(pair_budget)]
+
+    stages : dict[str, dict[str, float | None]] = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        loader = DataLoader(data_dir, tickers_nyse=prices.columns)
+        loader.price_store_nyse.write(prices)
+
+        stages["load_data_nyse"] = measure(loader.load_data_nyse, None, repeats, profile_memory)
+
+        engines : list[CointegrationEngine] = []
+        stages["conduct_log_transformations_on_prices"] = measure(
+            lambda: engines[0].conduct_log_transformations_on_prices(),
+            lambda: _cold_engine(loader, engines),
+            repeats,
+            profile_memory,
+        )
+        engine = engines[0]
+        # the log transform is memoized by then, engel_granger is timed on its own work
+        stages["engel_granger"] = measure(
+            lambda: engine.engel_granger(screens=screens),
+            engine.conduct_log_transformations_on_prices,
+            repeats,
+            profile_memory,
+        )
+        results = engine.engel_granger(screens=screens)
+
+        extractor = NLPExtractor(loader, max_workers=1)
+        stages["get_top_n_words"] = measure(
+            lambda: extractor.get_top_n_words(20, filings), None, repeats, profile_memory
+        )
+
+    directions = set(results.loc[results["is cointegrated"], "direction"])
+    recovered = sum(f"{pair.dependent}~{pair.independent}" in directions for pair in planted)
+    return {
+        "n_tickers" : n_tickers,
+        "n_days" : n_days,
+        "n_filings" : len(filings),
+        "pair_budget" : pair_budget,
+        "pairs_tested" : len(results),
+        "planted_pairs" : len(planted),
+        "planted_pairs_recovered" : recovered,
+        "stages" : stages,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def _package_version() -> str | None:
+    try:
+        return metadata.version("quant-portfolio")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def run_benchmarks(
+        ticker_counts : tuple[int, ...] = DEFAULT_TICKER_COUNTS,
+        output : Path | str | None = DEFAULT_OUTPUT,
+        **scale_options : Any,
+) -> dict[str, Any]:
+    '''
+    benchmark_scale for every ticker count, the report carries the code and library versions
+    so runs of different commits can be diffed. written as json to output unless it is None
+    '''
+    report = {
+        "created" : datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "versions" : {
+            "package" : _package_version(),
+            "git_commit" : _git_commit(),
+            "python" : platform.python_version(),
+            "numpy" : np.__version__,
+            "pandas" : pd.__version__,
+        },
+        "machine" : {"platform" : platform.platform(), "processor" : platform.processor()},
+        "options" : scale_options,
+        "scales" : [benchmark_scale(n_tickers, **scale_options) for n_tickers in ticker_counts],
+    }
+
+    if output is not None:
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        partial = output.with_suffix(".part")
+        partial.write_text(json.dumps(report, indent=1))
+        partial.replace(output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="offline benchmarks on a synthetic market")
+    parser.add_argument("--tickers", type=int, nargs="+", default=list(DEFAULT_TICKER_COUNTS))
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--pairs-per-ticker", type=int, default=DEFAULT_PAIRS_PER_TICKER,
+                        help="distance screen budget for engel_granger, 0 tests every pair")
+    parser.add_argument("--filings-per-ticker", type=int, default=DEFAULT_FILINGS_PER_TICKER)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    arguments = parser.parse_args()
+
+    report = run_benchmarks(
+        tuple(arguments.tickers),
+        arguments.output,
+        n_days=arguments.days,
+        pairs_per_ticker=arguments.pairs_per_ticker or None,
+        filings_per_ticker=arguments.filings_per_ticker,
+        repeats=arguments.repeats,
+        profile_memory=not arguments.no_memory,
+        seed=arguments.seed,
+    )
+    for scale in report["scales"]:
+        for stage, timing in scale["stages"].items():
+            peak = "" if timing["peak_bytes"] is None else f", peak {timing['peak_bytes'] / 2**20:.1f} MiB"
+            print(f"{scale['n_tickers']:>5} tickers  {stage:<40} {timing['seconds']:.3f}s{peak}")
@@ -1,30 +1,43 @@
-import datetime
+from __future__ import annotations
+
 import os
-import re
+from datetime import date
 from pathlib import Path
-from typing import Any
-
-from edgar.entity import EntityFilings
-from scipy.constants import year
-from sec_edgar_downloader import Downloader
-from dotenv import load_dotenv
-from edgar import Filing, use_local_storage, set_identity, Company
-from datetime import datetime
-import yfinance as yf
+from typing import Any, TYPE_CHECKING
+
 import numpy as np
 import pandas as pd
 
-import glob
+from utils import instrumentation
+from utils.filing_manifest import FilingManifest, LazyFilings
+from utils.intraday_store import IntradayBarLoader, IntradayStore
+from utils.price_sources import PriceSource, YahooPriceSource
+from utils.price_store import PriceStore
+from utils.sec_downloader import SecFilingDownloader
+
+# yfinance, edgartools, sec_edgar_downloader and dotenv are imported inside the methods that
+# talk to Yahoo / SEC, loading cached prices never pays for them
+if TYPE_CHECKING:
+    from edgar.entity import EntityFilings
 
 
 class DataLoader:
-    def __init__(self, data_dir=None):
+    def __init__(self, data_dir=None, tickers_nyse=None):
 
         if data_dir is None:
             self.data_dir = Path(__file__).parent.parent / "data"
         else:
             self.data_dir = Path(data_dir).resolve()
 
+        self.price_store_nyse = PriceStore(self.data_dir / "nyse_50_stocks")
+        self.intraday_store_nyse = IntradayStore(self.data_dir / "nyse_intraday")
+        self.filing_manifest = FilingManifest(
+            self.data_dir / "sec-edgar-filings",
+            self.data_dir / "sec_filings_manifest.sqlite",
+        )
+        # edgartools Company lookups and filing listings are remote calls, keep one per ticker
+        self.__edgar_filings : dict[str, EntityFilings] = {}
+
         # top 50 NYSE stock tickers with the most trade volume as of: 02/02/2026
         self.__tickers_nyse = [
             "VZ",
@@ -78,6 +91,11 @@ class DataLoader:
             "TGT",
         ]
 
+        if tickers_nyse is not None:
+            self.__tickers_nyse = list(tickers_nyse)
+
+        self.__start_date_nyse = pd.Timestamp("2020-01-01")
+
         self.__tickers_sp_500 = [
             "NVDA",
             "AAPL",
@@ -101,52 +119,186 @@ class DataLoader:
             "PG"
         ]
 
-    def source_data_nyse(self):
-
-        start_and_end_date = np.array(["2020-01-01", "2026-01-31"])
+    @instrumentation.instrumented()
+    def source_data_nyse(self, price_source=None):
 
-        datas_nyse = yf.download(
-            tickers=self.__tickers_nyse,
-            start=start_and_end_date[0],
-            end=start_and_end_date[1],
-            interval="1d",
-            progress=False,
-            auto_adjust=False,
-            actions=False,
+        price_source = price_source or YahooPriceSource()
+        raw_nyse = self._fetch_batched_nyse(
+            price_source,
+            self.__tickers_nyse,
+            self.__start_date_nyse,
+            pd.Timestamp("2026-01-31"),
+            len(self.__tickers_nyse),
         )
+        datas_nyse = raw_nyse.ffill().bfill()
 
-        datas_nyse = datas_nyse["Adj Close"]
+        datas_nyse.to_csv(self.data_dir / "nyse_50_stocks.csv")
+        self.price_store_nyse.write(datas_nyse, last_observed=self._last_observed(raw_nyse))
+        return datas_nyse
 
-        if not isinstance(datas_nyse.index, pd.DatetimeIndex):
-            datas_nyse.index = pd.to_datetime(datas_nyse.index)
+    @instrumentation.instrumented()
+    def sync_data_nyse(self, price_source=None, end=None, batch_size=25):
 
-        datas_nyse = datas_nyse.dropna(axis=1, how="all")
-        datas_nyse = datas_nyse.ffill().bfill()
+        # fetches only what the store is missing: each ticker's days after its last real
+        # observation plus the full history of tickers new to the universe
+        price_source = price_source or YahooPriceSource()
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+        store = self.price_store_nyse
 
-        datas_nyse.to_csv(self.data_dir / "nyse_50_stocks.csv")
-        return datas_nyse
+        if not store.exists():
+            raw_nyse = self._fetch_batched_nyse(
+                price_source, self.__tickers_nyse, self.__start_date_nyse, end, batch_size
+            )
+            datas_nyse = raw_nyse.ffill().bfill()
+            store.write(datas_nyse, last_observed=self._last_observed(raw_nyse))
+            return datas_nyse
+
+        stored_tickers = store.tickers
+        last_observed = store.last_observed()
+        new_tickers = [ticker for ticker in self.__tickers_nyse if ticker not in last_observed]
+
+        # tickers that stopped on the same day share requests
+        resume_groups = {}
+        for ticker, observed in last_observed.items():
+            resume_groups.setdefault(observed, []).append(ticker)
+
+        fresh_parts = []
+        for observed, tickers in sorted(resume_groups.items()):
+            fresh_parts.append(self._fetch_batched_nyse(
+                price_source, tickers, observed + pd.Timedelta(days=1), end, batch_size
+            ))
+        if new_tickers:
+            fresh_parts.append(self._fetch_batched_nyse(
+                price_source, new_tickers, store.first_date(), end, batch_size
+            ))
+
+        fresh = pd.concat(fresh_parts, axis=1).dropna(axis=0, how="all") if fresh_parts else pd.DataFrame()
+        fresh = fresh.dropna(axis=1, how="all")
+        if fresh.empty:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"))
+
+        # rows from the earliest fresh observation onwards get refilled, older rows are untouched
+        added_tickers = [ticker for ticker in new_tickers if ticker in fresh.columns]
+        tail_start = store.first_date() if added_tickers else fresh.index.min()
+        stored_tail = store.read(start=tail_start).copy()
+        # any stored row is already clean, the last one before the tail seeds the forward fill
+        before_tail = tail_start - pd.Timedelta(nanoseconds=1)
+        seed = store.read(start=tail_start - pd.Timedelta(days=31), end=before_tail).tail(1)
+        if seed.empty:
+            seed = store.read(end=before_tail).tail(1)
+
+        # forward filled values past a ticker's last observation are stale, blank them before refilling
+        for ticker in stored_tickers:
+            stored_tail.loc[stored_tail.index > last_observed[ticker], ticker] = np.nan
+
+        tail = fresh.combine_first(stored_tail)[stored_tickers + added_tickers]
+        tail = pd.concat([seed, tail]).ffill().iloc[len(seed):].bfill()
+        tail.index.name = "Date"
+
+        observed = {ticker : date for ticker, date in last_observed.items()}
+        observed.update(self._last_observed(fresh))
+
+        if added_tickers or tail_start <= store.first_date():
+            store.write(tail, last_observed=observed)
+        else:
+            store.truncate(tail_start)
+            store.append(tail, last_observed=observed)
 
-    def load_data_nyse(self):
+        return tail
 
-        try:
-            datas = pd.read_csv(self.data_dir / "nyse_50_stocks.csv")
-            # checker if there is really 50 tickers in the data
-            tickers_row = datas.iloc[0]
-            tickers = set(tickers_row.dropna())
-            assert len(tickers) == 50, f"Expected == 50 tickers got {len(tickers)}"
-            # checker of observations if greater than 1000
-            assert (
-                datas.shape[0] > 1000
-            ), f"Expected >1000 trading days got {datas.shape[0]}"
-            datas["Date"] = pd.to_datetime(datas["Date"])
-            datas.set_index("Date", inplace=True)
-            return datas
+    @instrumentation.instrumented()
+    def _fetch_batched_nyse(self, price_source: PriceSource, tickers, start, end, batch_size):
 
-        except FileNotFoundError:
-            self.source_data_nyse()
-            return self.load_data_nyse()
+        batches = [
+            price_source.fetch(tickers[i: i + batch_size], start, end)
+            for i in range(0, len(tickers), batch_size)
+        ]
+        datas = pd.concat(batches, axis=1) if batches else pd.DataFrame()
+        datas = datas.dropna(axis=1, how="all").sort_index()
+        datas.index.name = "Date"
+        instrumentation.count("tickers fetched", datas.shape[1])
+        return datas
+
+    def _last_observed(self, raw_prices: pd.DataFrame):
+
+        return {
+            ticker : raw_prices[ticker].last_valid_index()
+            for ticker in raw_prices.columns
+            if raw_prices[ticker].last_valid_index() is not None
+        }
+
+    @instrumentation.instrumented()
+    def load_data_nyse(self, tickers=None, start=None, end=None):
+
+        # the binary store is memory-mapped, only the selected columns / dates are paged in
+        if not self.price_store_nyse.exists():
+            try:
+                self.convert_csv_nyse_to_store()
+            except FileNotFoundError:
+                self.source_data_nyse()
+
+        prices = self.price_store_nyse.read(tickers=tickers, start=start, end=end)
+        instrumentation.count("price bytes loaded", prices.size * 8)
+        return prices
+
+    @instrumentation.instrumented()
+    def sync_data_intraday(self, price_source=None, interval="1m", start=None, end=None, window_days=7, batch_size=25):
+
+        # intraday history is fetched window_days at a time (Yahoo serves minute bars a week per
+        # request) and every window goes straight to its day partitions, nothing accumulates
+        price_source = price_source or YahooPriceSource(interval=interval)
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+        if start is None:
+            stored_days = self.intraday_store_nyse.days()
+            start = (
+                pd.Timestamp(stored_days[-1]) if stored_days
+                else end - pd.Timedelta(days=window_days)
+            )
+        start = pd.Timestamp(start)
+
+        written = 0
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + pd.Timedelta(days=window_days), end)
+            bars = self._fetch_batched_nyse(price_source, self.__tickers_nyse, window_start, window_end, batch_size)
+            if not bars.empty:
+                written += self.intraday_store_nyse.write(bars)
+            window_start = window_end
+        instrumentation.count("intraday partitions written", written)
+        return written
+
+    def open_data_intraday(self, rule="5min", tickers=None, start=None, end=None) -> IntradayBarLoader:
+
+        # a loader CointegrationEngine accepts in place of this one, bars resampled per day
+        return IntradayBarLoader(self.intraday_store_nyse, rule, tickers, start, end)
+
+    @instrumentation.instrumented()
+    def convert_csv_nyse_to_store(self):
+
+        # one time migration of a csv written before the binary store existed
+        csv_path = self.data_dir / "nyse_50_stocks.csv"
+        datas = pd.read_csv(
+            csv_path,
+            index_col="Date",
+            parse_dates=["Date"],
+        )
+        # checker if all the tickers made it into the data
+        assert (
+            datas.shape[1] == len(self.__tickers_nyse)
+        ), f"Expected == {len(self.__tickers_nyse)} tickers got {datas.shape[1]}"
+        # checker of observations if greater than 1000
+        assert (
+            datas.shape[0] > 1000
+        ), f"Expected >1000 trading days got {datas.shape[0]}"
+        instrumentation.count("csv bytes read", csv_path.stat().st_size)
+
+        self.price_store_nyse.write(datas)
+        return datas
+
+    @instrumentation.instrumented()
+    def source_data_sec_filings(self, http_client=None, max_workers=8):
+        from dotenv import load_dotenv
 
-    def source_data_sec_filings(self):
         try:
             load_dotenv()
             full_name = os.getenv("SEC_EDGAR_USER_NAME")
@@ -154,26 +306,32 @@ class DataLoader:
             assert full_name is not None, f"'SEC_EDGAR_USER_NAME' is not set"
             assert email is not None, f"'SEC_EDGAR_USER_EMAIL' is not set"
 
-            downloader = Downloader(
-                full_name,
-                email,
-                self.data_dir
+            # all tickers share one rate limited pool, filings already on disk are skipped
+            downloader = SecFilingDownloader(
+                f"{full_name} {email}",
+                self.data_dir / "sec-edgar-filings",
+                http_client=http_client,
+                max_workers=max_workers,
             )
+            report = downloader.download(
+                self.__tickers_sp_500,
+                "10-K",
+                after=date(2005,12,1)
+            )
+            print(f"[SEC]: {report.summary()}")
+            for failed, reason in report.failed:
+                print(f"[ERROR]: {failed} {reason}")
 
-            for ticker in self.__tickers_sp_500:
-                downloader.get(
-                    "10-K",
-                    ticker,
-                    after=datetime.date(2005,12,1)
-                )
-
-            return downloader
+            return report
         except FileNotFoundError:
             print(
                 "[ERROR]: The .env file was not found. Please create one at root directory of the project."
             )
 
     def source_data_sec_filings_fragment(self, ticker):
+        from dotenv import load_dotenv
+        from sec_edgar_downloader import Downloader
+
         try:
             load_dotenv()
             full_name = os.getenv("SEC_EDGAR_USER_NAME")
@@ -188,69 +346,42 @@ class DataLoader:
                 "[ERROR]: The .env file was not found. Please create one at root directory of the project."
             )
 
-    def load_data_sec_filings(self) -> dict[str, str]:
-        try:
-            pattern = str(self.data_dir / "sec-edgar-filings/**/*.txt")
-            fillings_dict = {}
-            txt_files = glob.glob(
-                pattern,
-                recursive=True
-            )
-
-            for file_paths in txt_files:
-                p = Path(file_paths)
-                ticker = p.parts[7]
-                numericals = p.parts[9]
-                identification = f"{ticker}_{numericals}"
+    @instrumentation.instrumented()
+    def open_data_sec_filings(self, ticker=None, form_type=None) -> LazyFilings:
 
-                with open(p, "r", encoding="utf-8", errors="replace") as f:
-                    content = f.read()
-                    fillings_dict[identification] = content
+        # manifest refresh is stat-only, files are opened when a filing is looked up
+        self.filing_manifest.refresh()
+        entries = self.filing_manifest.entries(ticker=ticker, form_type=form_type)
+        instrumentation.count("filings listed", len(entries))
+        return LazyFilings(entries)
 
-        except FileNotFoundError:
-            self.source_data_sec_filings()
-            return self.load_data_sec_filings()
+    @instrumentation.instrumented()
+    def load_data_sec_filings(self) -> dict[str, str]:
 
-        finally:
-            return fillings_dict
+        # eager variant kept for callers that want every filing in memory,
+        # prefer open_data_sec_filings for anything corpus sized
+        return dict(self.open_data_sec_filings())
 
+    @instrumentation.instrumented()
     def load_data_sec_filings_ticker(self, ticker : str) -> dict[str, tuple[str, str]] | None:
-        try:
-            files : str = "sec-edgar-filings/" + ticker + "/**/*.txt"
-            pattern : str = str(self.data_dir / files)
-            fillings_dict : dict[str, tuple[str, str]] = {}
-            txt_files = glob.glob(
-                pattern,
-                recursive=True
-            )
-
-            for file_paths in txt_files:
-                p = Path(file_paths)
-                ticker = p.parts[7]
-                numericals = p.parts[9]
-                identification = f"{ticker}_{numericals}"
-                with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                    head = f.read(2000)
-
-                if re.search(r"<(html|!DOCTYPE\s+html)",head):
-                    tag = "html"
-                else:
-                    tag = "sgml"
-
-                fillings_dict[identification] = (
-                    tag,
-                    str(p)
-                )
 
-            return fillings_dict
-
-        except FileNotFoundError:
-            print(f"{ticker} not found on local data.")
+        self.filing_manifest.refresh()
+        return {
+            entry.key : (entry.format, entry.path)
+            for entry in self.filing_manifest.entries(ticker=ticker)
+        }
 
+    @instrumentation.instrumented()
     def load_data_sec_filings_ticker_edgar_tools(
             self,
             ticker : str
     ) -> EntityFilings | None:
+        if ticker in self.__edgar_filings:
+            return self.__edgar_filings[ticker]
+
+        from dotenv import load_dotenv
+        from edgar import Company, set_identity
+
         try:
             load_dotenv()
             identification : str = f"{os.getenv("SEC_EDGAR_USER_NAME")} {os.getenv("SEC_EDGAR_USER_EMAIL")}"
@@ -258,6 +389,7 @@ class DataLoader:
             company : Company = Company(ticker)
             years : list[int] = list(np.arange(2006, 2026, 1))
             tenk_filings = company.get_filings(form="10-K", year=years)
+            self.__edgar_filings[ticker] = tenk_filings
             return tenk_filings
         except Exception as e:
             print(f"error {e}")
@@ -0,0 +1,185 @@
+import os
+import re
+import sqlite3
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+
+class FilingEntry(NamedTuple):
+    key: str
+    ticker: str
+    form_type: str
+    accession: str
+    format: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+def sniff_filing_format(path: Path | str) -> str:
+    # same 2000 character sniff DataLoader always used to tell html filings from plain sgml ones
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        head = f.read(2000)
+
+    if re.search(r"<(html|!DOCTYPE\s+html)", head):
+        return "html"
+    return "sgml"
+
+
+class FilingManifest:
+    '''
+    sqlite index of the local sec-edgar-filings tree: ticker, form type, accession, html / sgml
+    format, size and mtime of every filing
+
+    layout is <root>/<TICKER>/<FORM>/<ACCESSION>/<file>.txt as written by sec_edgar_downloader,
+    positions are taken relative to root so the data directory can live anywhere. refresh only
+    stats files, a filing is re-sniffed when its size or mtime changes and dropped when it vanishes
+    '''
+
+    def __init__(
+            self,
+            root: Path | str,
+            database: Path | str,
+            max_workers: int = 8,
+    ) -> None:
+        self.root = Path(root)
+        self.database = Path(database)
+        self.max_workers = max_workers
+
+    def _connect(self) -> sqlite3.Connection:
+        self.database.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.database)
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS filings (
+                path TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                form_type TEXT NOT NULL,
+                accession TEXT NOT NULL,
+                format TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            )
+            """
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS filings_ticker ON filings (ticker, form_type)")
+        return connection
+
+    @staticmethod
+    def _scan_ticker(ticker_dir: Path) -> list[tuple[str, int, int]]:
+        found : list[tuple[str, int, int]] = []
+        for directory, _, files in os.walk(ticker_dir):
+            for name in files:
+                if name.endswith(".txt"):
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    found.append((path, stat.st_size, stat.st_mtime_ns))
+        return found
+
+    def _entry(self, path: str, size: int, mtime_ns: int, file_format: str) -> tuple | None:
+        parts = Path(path).relative_to(self.root).parts
+        if len(parts) < 4:
+            return None
+        ticker, form_type, accession = parts[0], parts[1], parts[2]
+        return (path, f"{ticker}_{accession}", ticker, form_type, accession, file_format, size, mtime_ns)
+
+    def refresh(self) -> int:
+        '''
+        brings the manifest in line with the filesystem, returns how many rows changed
+        '''
+        # nothing downloaded and nothing indexed yet, do not create files just by looking
+        if not self.root.exists() and not self.database.exists():
+            return 0
+
+        ticker_dirs = [entry for entry in self.root.iterdir() if entry.is_dir()] if self.root.exists() else []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            scanned = {
+                path : (size, mtime_ns)
+                for found in pool.map(self._scan_ticker, ticker_dirs)
+                for path, size, mtime_ns in found
+            }
+
+            connection = self._connect()
+            try:
+                known = {
+                    path : (size, mtime_ns)
+                    for path, size, mtime_ns in connection.execute("SELECT path, size, mtime_ns FROM filings")
+                }
+                changed = [path for path, stat in scanned.items() if known.get(path) != stat]
+                vanished = [(path,) for path in known if path not in scanned]
+                formats = list(pool.map(sniff_filing_format, changed))
+
+                rows = [
+                    row for row in (
+                        self._entry(path, *scanned[path], file_format)
+                        for path, file_format in zip(changed, formats)
+                    )
+                    if row is not None
+                ]
+                with connection:
+                    connection.executemany("DELETE FROM filings WHERE path = ?", vanished)
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                    )
+            finally:
+                connection.close()
+
+        return len(rows) + len(vanished)
+
+    def entries(
+            self,
+            ticker: str | None = None,
+            form_type: str | None = None,
+    ) -> list[FilingEntry]:
+        if not self.database.exists():
+            return []
+
+        query = "SELECT key, ticker, form_type, accession, format, path, size, mtime_ns FROM filings"
+        clauses : list[str] = []
+        parameters : list[str] = []
+        if ticker is not None:
+            clauses.append("ticker = ?")
+            parameters.append(ticker)
+        if form_type is not None:
+            clauses.append("form_type = ?")
+            parameters.append(form_type)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(query + " ORDER BY ticker, accession", parameters).fetchall()
+        finally:
+            connection.close()
+        return [FilingEntry(*row) for row in rows]
+
+
+class LazyFilings(Mapping):
+    '''
+    read-only {TICKER_ACCESSION: filing text} mapping that opens a filing only when it is looked
+    up, so iterating a corpus keeps one filing in memory at a time
+    '''
+
+    def __init__(self, entries: list[FilingEntry]) -> None:
+        self.__entries : dict[str, FilingEntry] = {entry.key : entry for entry in entries}
+
+    def __getitem__(self, key: str) -> str:
+        with open(self.__entries[key].path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__entries)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def entry(self, key: str) -> FilingEntry:
+        return self.__entries[key]
+
+    def iter_filings(self) -> Iterator[tuple[FilingEntry, str]]:
+        for key, entry in self.__entries.items():
+            yield entry, self[key]
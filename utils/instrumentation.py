@@ -0,0 +1,250 @@
+import atexit
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+
+# QUANT_INSTRUMENT=1 records wall time and counters from import on, =memory adds per stage
+# tracemalloc peaks. QUANT_INSTRUMENT_OUTPUT names the file written at exit, a .trace.json
+# suffix writes a Chrome trace and anything else the JSON summary
+ENVIRONMENT_SWITCH : str = "QUANT_INSTRUMENT"
+ENVIRONMENT_OUTPUT : str = "QUANT_INSTRUMENT_OUTPUT"
+CHROME_TRACE_SUFFIX : str = ".trace.json"
+
+Function = TypeVar("Function", bound=Callable[..., Any])
+
+
+class _Frame:
+    __slots__ = ("name", "start_ns", "start_bytes", "carried_peak", "counters")
+
+    def __init__(self, name : str, start_bytes : int) -> None:
+        self.name = name
+        self.start_ns = time.perf_counter_ns()
+        self.start_bytes = start_bytes
+        self.carried_peak = start_bytes
+        self.counters : dict[str, float] = {}
+
+
+class Recorder:
+    '''
+    per stage wall time, traced peak memory and counters of one instrumented run
+
+    stages nest per thread. a stage's peak_bytes is the highest traced allocation above what was
+    live when it started, nested stages included, tracemalloc only keeps one global peak so it is
+    reset at every stage boundary and the running maximum is carried up the stack. counters add
+    to every open stage of the calling thread and to the run totals
+    '''
+
+    def __init__(self, memory : bool = False) -> None:
+        self.memory = memory
+        self.events : list[dict[str, Any]] = []
+        self.counters : dict[str, float] = {}
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__origin_ns = time.perf_counter_ns()
+        self.__started_tracing = False
+
+    def start(self) -> None:
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__started_tracing = True
+
+    def stop(self) -> None:
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+    def _stack(self) -> list[_Frame]:
+        if not hasattr(self.__local, "stack"):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def _traced(self) -> tuple[int, int]:
+        return tracemalloc.get_traced_memory() if self.memory and tracemalloc.is_tracing() else (0, 0)
+
+    @contextmanager
+    def stage(self, name : str) -> Iterator[None]:
+        stack = self._stack()
+        current, peak = self._traced()
+        if stack:
+            stack[-1].carried_peak = max(stack[-1].carried_peak, peak)
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+
+        frame = _Frame(name, current)
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            end_ns = time.perf_counter_ns()
+            stack.pop()
+            _, peak = self._traced()
+            peak = max(frame.carried_peak, peak)
+            if stack:
+                stack[-1].carried_peak = max(stack[-1].carried_peak, peak)
+            if self.memory and tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+
+            event : dict[str, Any] = {
+                "name" : name,
+                "start_ns" : frame.start_ns - self.__origin_ns,
+                "duration_ns" : end_ns - frame.start_ns,
+                "thread" : threading.get_ident(),
+                "depth" : len(stack),
+                "counters" : frame.counters,
+            }
+            if self.memory:
+                event["peak_bytes"] = peak - frame.start_bytes
+            with self.__lock:
+                self.events.append(event)
+
+    def count(self, name : str, value : float = 1) -> None:
+        for frame in self._stack():
+            frame.counters[name] = frame.counters.get(name, 0) + value
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict[str, Any]:
+        '''
+        calls, total / max seconds, max peak_bytes and summed counters per stage name, plus the
+        run's counter totals
+        '''
+        stages : dict[str, dict[str, Any]] = {}
+        for event in self.events:
+            stage = stages.setdefault(event["name"], {
+                "calls" : 0, "total_seconds" : 0.0, "max_seconds" : 0.0, "counters" : {},
+            })
+            seconds = event["duration_ns"] / 1e9
+            stage["calls"] += 1
+            stage["total_seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            if "peak_bytes" in event:
+                stage["peak_bytes"] = max(stage.get("peak_bytes", 0), event["peak_bytes"])
+            for counter, value in event["counters"].items():
+                stage["counters"][counter] = stage["counters"].get(counter, 0) + value
+        return {"stages" : stages, "counters" : dict(self.counters)}
+
+    def chrome_trace(self) -> dict[str, Any]:
+        # complete ("X") events in microseconds, loadable in chrome://tracing or Perfetto
+        pid = os.getpid()
+        return {
+            "traceEvents" : [
+                {
+                    "name" : event["name"],
+                    "cat" : event["name"].split(".")[0],
+                    "ph" : "X",
+                    "ts" : event["start_ns"] / 1e3,
+                    "dur" : event["duration_ns"] / 1e3,
+                    "pid" : pid,
+                    "tid" : event["thread"],
+                    "args" : {
+                        **event["counters"],
+                        **({"peak_bytes" : event["peak_bytes"]} if "peak_bytes" in event else {}),
+                    },
+                }
+                for event in sorted(self.events, key=lambda event: event["start_ns"])
+            ],
+            "displayTimeUnit" : "ms",
+        }
+
+    def write(self, path : Path | str) -> None:
+        '''
+        a Chrome trace when path ends in .trace.json, the summary otherwise
+        '''
+        path = Path(path)
+        payload = self.chrome_trace() if path.name.endswith(CHROME_TRACE_SUFFIX) else self.summary()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".part")
+        partial.write_text(json.dumps(payload, indent=1))
+        partial.replace(path)
+
+
+# the hot path only ever checks this for None
+_recorder : Recorder | None = None
+
+
+def active() -> Recorder | None:
+    return _recorder
+
+
+@contextmanager
+def instrument(
+        memory : bool = False,
+        output : Path | str | None = None,
+) -> Iterator[Recorder]:
+    '''
+    records every instrumented stage run inside the block, optionally writing it to output on
+    exit. blocks nest, the inner one records on its own and the outer resumes afterwards
+    '''
+    global _recorder
+    previous = _recorder
+    recorder = Recorder(memory)
+    recorder.start()
+    _recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _recorder = previous
+        recorder.stop()
+        if output is not None:
+            recorder.write(output)
+
+
+@contextmanager
+def stage(name : str) -> Iterator[None]:
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    with recorder.stage(name):
+        yield
+
+
+def count(name : str, value : float = 1) -> None:
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+
+def instrumented(name : str | None = None) -> Callable[[Function], Function]:
+    '''
+    records every call of the decorated function as a stage, named after its qualified name
+    unless given. when nothing is recording the call goes straight through
+    '''
+    def decorate(function : Function) -> Function:
+        stage_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args : Any, **kwargs : Any) -> Any:
+            recorder = _recorder
+            if recorder is None:
+                return function(*args, **kwargs)
+            with recorder.stage(stage_name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def _enable_from_environment() -> None:
+    global _recorder
+    switch = os.environ.get(ENVIRONMENT_SWITCH, "").strip().lower()
+    if switch in ("", "0", "false", "off"):
+        return
+
+    _recorder = Recorder(memory=switch == "memory")
+    _recorder.start()
+    output = os.environ.get(ENVIRONMENT_OUTPUT)
+    # spawned pool workers inherit the environment, only the main process owns the file
+    if output and multiprocessing.parent_process() is None:
+        atexit.register(_recorder.write, output)
+
+
+_enable_from_environment()
@@ -0,0 +1,259 @@
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+import pandas as pd
+
+
+# one row per bar: its start as int64 ns since the epoch (UTC when the store has a timezone) and
+# the close observed over it
+BAR_DTYPE : np.dtype = np.dtype([("time", "<i8"), ("close", "<f8")])
+
+
+class IntradayStore:
+    '''
+    on-disk intraday closes partitioned per ticker and per trading day
+
+    every (ticker, day) is one small .npy of BAR_DTYPE rows sorted by time under
+    <root>/<ticker>/<YYYY-MM-DD>.npy, so a sync only rewrites the days it touched and a reader
+    only ever maps the partitions of the days it is on. days are local to the timezone of the
+    first tz-aware write (the exchange's, as yfinance reports it), kept in meta.json
+
+    iter_days streams one (bars x tickers) frame per day, optionally resampled, and read builds
+    a panel from those chunks, so minute history is never materialised when the caller asks for
+    5-minute or hourly bars. resampling is per day, any rule that divides a session works
+    '''
+
+    META_FILE : str = "meta.json"
+    VERSION : int = 1
+
+    def __init__(self, root : Path | str) -> None:
+        self.root = Path(root)
+
+    def exists(self) -> bool:
+        return (self.root / self.META_FILE).exists()
+
+    def _read_meta(self) -> dict[str, Any]:
+        if not self.exists():
+            return {"version" : self.VERSION, "timezone" : None}
+        with open(self.root / self.META_FILE, "r") as f:
+            return json.load(f)
+
+    def _write_meta(self, meta : dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        temporary = self.root / f"{self.META_FILE}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(temporary, self.root / self.META_FILE)
+
+    @property
+    def timezone(self) -> str | None:
+        return self._read_meta()["timezone"]
+
+    @property
+    def tickers(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if path.is_dir())
+
+    def _partition_path(self, ticker : str, day : date) -> Path:
+        return self.root / ticker / f"{day.isoformat()}.npy"
+
+    def days(
+            self,
+            tickers : list[str] | None = None,
+            start : Any = None,
+            end : Any = None,
+    ) -> list[date]:
+        '''
+        sorted days with bars for any of the tickers, between the dates of start and end inclusive
+        '''
+        first = pd.Timestamp(start).date() if start is not None else None
+        last = pd.Timestamp(end).date() if end is not None else None
+        found : set[date] = set()
+        for ticker in self.tickers if tickers is None else tickers:
+            for path in (self.root / ticker).glob("*.npy"):
+                day = date.fromisoformat(path.stem)
+                if (first is None or day >= first) and (last is None or day <= last):
+                    found.add(day)
+        return sorted(found)
+
+    def _local_index(self, times : np.ndarray, timezone : str | None) -> pd.DatetimeIndex:
+        index = pd.DatetimeIndex(times.astype("datetime64[ns]"))
+        return index.tz_localize("UTC").tz_convert(timezone) if timezone else index
+
+    def write(self, bars : pd.DataFrame) -> int:
+        '''
+        merges a (timestamps x tickers) frame of closes into the store, NaN meaning no bar.
+        bars already stored at the same timestamp are replaced. returns the partitions written
+        '''
+        assert isinstance(bars.index, pd.DatetimeIndex), "bars must be indexed by timestamp"
+        meta = self._read_meta()
+        timezone = meta["timezone"]
+        index = bars.index
+        if index.tz is not None:
+            if timezone is None:
+                timezone = str(index.tz)
+                meta["timezone"] = timezone
+            local = index.tz_convert(timezone)
+            times = index.tz_convert("UTC").tz_localize(None).asi8
+        else:
+            assert timezone is None, f"store is in {timezone}, bars must be tz-aware"
+            local = index
+            times = index.asi8
+        self._write_meta(meta)
+
+        local_days = local.normalize().tz_localize(None).date if timezone else local.normalize().date
+        written = 0
+        for ticker in bars.columns:
+            closes = bars[ticker].to_numpy(dtype=np.float64)
+            observed = ~np.isnan(closes)
+            for day in np.unique(local_days[observed]):
+                rows = observed & (local_days == day)
+                fresh = np.empty(int(rows.sum()), dtype=BAR_DTYPE)
+                fresh["time"] = times[rows]
+                fresh["close"] = closes[rows]
+                self._write_partition(str(ticker), day, fresh)
+                written += 1
+        return written
+
+    def _write_partition(self, ticker : str, day : date, fresh : np.ndarray) -> None:
+        path = self._partition_path(ticker, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            stored = np.load(path)
+            # the fresh bar wins a timestamp both carry
+            fresh = np.concatenate([stored[~np.isin(stored["time"], fresh["time"])], fresh])
+        fresh = fresh[np.argsort(fresh["time"], kind="stable")]
+
+        partial = path.with_suffix(".part")
+        with open(partial, "wb") as f:
+            np.save(f, fresh)
+        os.replace(partial, path)
+
+    def read_day(
+            self,
+            day : date,
+            tickers : list[str] | None = None,
+    ) -> pd.DataFrame:
+        '''
+        every bar of one day as a (timestamps x tickers) frame on the union of the tickers'
+        timestamps, NaN where a ticker has no bar
+        '''
+        tickers = self.tickers if tickers is None else list(tickers)
+        partitions : list[np.ndarray | None] = []
+        for ticker in tickers:
+            path = self._partition_path(ticker, day)
+            partitions.append(np.load(path, mmap_mode="r") if path.exists() else None)
+
+        present = [partition["time"] for partition in partitions if partition is not None]
+        times = np.unique(np.concatenate(present)) if present else np.empty(0, dtype=np.int64)
+        values = np.full((len(times), len(tickers)), np.nan)
+        for column, partition in enumerate(partitions):
+            if partition is not None:
+                values[np.searchsorted(times, partition["time"]), column] = partition["close"]
+
+        index = self._local_index(times, self.timezone)
+        index.name = "Date"
+        return pd.DataFrame(values, index=index, columns=pd.Index(tickers))
+
+    def iter_days(
+            self,
+            tickers : list[str] | None = None,
+            start : Any = None,
+            end : Any = None,
+            rule : str | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        '''
+        one frame per stored day between start and end inclusive, resampled to the last close
+        of every rule bucket (e.g. "5min", "1h") when rule is given. only that day is in memory
+        '''
+        tickers = self.tickers if tickers is None else list(tickers)
+        timezone = self.timezone
+        start = None if start is None else _localized(pd.Timestamp(start), timezone)
+        end = None if end is None else _localized(pd.Timestamp(end), timezone)
+
+        for day in self.days(tickers, start, end):
+            bars = self.read_day(day, tickers)
+            if start is not None:
+                bars = bars[bars.index >= start]
+            if end is not None:
+                bars = bars[bars.index <= end]
+            if rule is not None:
+                bars = bars.resample(rule).last().dropna(how="all")
+            if len(bars):
+                yield bars
+
+    def read(
+            self,
+            tickers : list[str] | None = None,
+            start : Any = None,
+            end : Any = None,
+            rule : str | None = None,
+    ) -> pd.DataFrame:
+        '''
+        the iter_days chunks as one panel, gaps forward filled across days and leading gaps
+        back filled like the daily loader does
+        '''
+        tickers = self.tickers if tickers is None else list(tickers)
+        chunks : list[pd.DataFrame] = []
+        carried : pd.DataFrame | None = None
+        for bars in self.iter_days(tickers, start, end, rule):
+            # each chunk is filled on its own, seeded with the previous chunk's last row
+            if carried is not None:
+                bars = pd.concat([carried, bars]).ffill().iloc[1:]
+            else:
+                bars = bars.ffill()
+            carried = bars.iloc[-1:]
+            chunks.append(bars)
+
+        if not chunks:
+            index = self._local_index(np.empty(0, dtype=np.int64), self.timezone)
+            index.name = "Date"
+            return pd.DataFrame(index=index, columns=pd.Index(tickers), dtype=np.float64)
+        return pd.concat(chunks).bfill()
+
+
+def _localized(timestamp : pd.Timestamp, timezone : str | None) -> pd.Timestamp:
+    # naive bounds are read as local exchange time
+    if timezone is None:
+        return timestamp.tz_localize(None) if timestamp.tz is not None else timestamp
+    return timestamp.tz_localize(timezone) if timestamp.tz is None else timestamp.tz_convert(timezone)
+
+
+class IntradayBarLoader:
+    '''
+    serves resampled bars of an IntradayStore through load_data_nyse, so anything written against
+    DataLoader, CointegrationEngine in particular, runs on intraday data unchanged. each load
+    streams the partitions again, a reload_data picks new days up
+    '''
+
+    def __init__(
+            self,
+            store : IntradayStore,
+            rule : str | None = "5min",
+            tickers : list[str] | None = None,
+            start : Any = None,
+            end : Any = None,
+    ) -> None:
+        self.store = store
+        self.rule = rule
+        self.tickers = None if tickers is None else list(tickers)
+        self.start = start
+        self.end = end
+
+    def load_data_nyse(
+            self,
+            tickers : list[str] | None = None,
+            start : Any = None,
+            end : Any = None,
+    ) -> pd.DataFrame:
+        return self.store.read(
+            tickers=tickers if tickers is not None else self.tickers,
+            start=start if start is not None else self.start,
+            end=end if end is not None else self.end,
+            rule=self.rule,
+        )
@@ -0,0 +1,58 @@
+import abc
+from typing import Any
+
+import pandas as pd
+
+
+class PriceSource(abc.ABC):
+    '''
+    where DataLoader pulls daily adjusted closes from
+
+    fetch returns a (dates x tickers) frame of adjusted closes observed in [start, end),
+    NaN where a ticker has no print and no column for tickers the source does not know
+    '''
+
+    @abc.abstractmethod
+    def fetch(
+            self,
+            tickers: list[str],
+            start: pd.Timestamp,
+            end: pd.Timestamp,
+    ) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class YahooPriceSource(PriceSource):
+
+    def __init__(self, interval: str = "1d") -> None:
+        self.interval = interval
+
+    def fetch(
+            self,
+            tickers: list[str],
+            start: pd.Timestamp,
+            end: pd.Timestamp,
+    ) -> pd.DataFrame:
+        import yfinance as yf
+
+        datas: Any = yf.download(
+            tickers=tickers,
+            start=start.strftime("%Y-%m-%d"),
+            end=end.strftime("%Y-%m-%d"),
+            interval=self.interval,
+            progress=False,
+            auto_adjust=False,
+            actions=False,
+        )
+        if datas is None or datas.empty:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"))
+
+        datas = datas["Adj Close"]
+        if isinstance(datas, pd.Series):
+            datas = datas.to_frame(tickers[0])
+
+        if not isinstance(datas.index, pd.DatetimeIndex):
+            datas.index = pd.to_datetime(datas.index)
+        datas.columns.name = None
+
+        return datas.dropna(axis=1, how="all")
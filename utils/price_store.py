@@ -0,0 +1,238 @@
+import json
+import os
+from pathlib import Path
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+class PriceStore:
+    '''
+    columnar on-disk store of a (dates x tickers) adjusted close panel
+
+    rows live in one or more segments, each a column-major float64 .npy matrix plus an int64
+    .npy of its dates, described by a small meta.json sidecar. segments are memory-mapped on
+    read, so selecting a few tickers or a date range only touches those columns' pages and a
+    full single-segment read is zero-copy. maps are copy-on-write, edits to a loaded frame
+    never reach the files
+
+    the sidecar also remembers each ticker's last real (not forward filled) observation,
+    which incremental syncs resume from
+    '''
+
+    META_FILE : str = "meta.json"
+    VERSION : int = 1
+
+    def __init__(self, root: Path | str) -> None:
+        self.root = Path(root)
+
+    def exists(self) -> bool:
+        return (self.root / self.META_FILE).exists()
+
+    def _read_meta(self) -> dict[str, Any]:
+        with open(self.root / self.META_FILE, "r") as f:
+            return json.load(f)
+
+    def _write_meta(self, meta: dict[str, Any]) -> None:
+        # replace atomically so readers never see a half written sidecar
+        temporary = self.root / f"{self.META_FILE}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(temporary, self.root / self.META_FILE)
+
+    @property
+    def tickers(self) -> list[str]:
+        return self._read_meta()["tickers"]
+
+    def last_observed(self) -> dict[str, pd.Timestamp]:
+        meta = self._read_meta()
+        observed = meta.get("last_observed", {})
+        end = meta["segments"][-1]["end"]
+        return {ticker : pd.Timestamp(observed.get(ticker, end)) for ticker in meta["tickers"]}
+
+    def first_date(self) -> pd.Timestamp:
+        return pd.Timestamp(self._read_meta()["segments"][0]["start"])
+
+    def last_date(self) -> pd.Timestamp:
+        return pd.Timestamp(self._read_meta()["segments"][-1]["end"])
+
+    def _segment_paths(self, name: str) -> tuple[Path, Path]:
+        return self.root / f"prices_{name}.npy", self.root / f"dates_{name}.npy"
+
+    def _write_segment(self, name: str, prices: pd.DataFrame) -> dict[str, Any]:
+        values_path, dates_path = self._segment_paths(name)
+        np.save(values_path, np.asfortranarray(prices.to_numpy(dtype=np.float64)))
+        np.save(dates_path, prices.index.values.astype("datetime64[ns]").astype(np.int64))
+        return {
+            "name" : name,
+            "rows" : int(prices.shape[0]),
+            "start" : prices.index[0].isoformat(),
+            "end" : prices.index[-1].isoformat(),
+        }
+
+    def _remove_segments(self, segments: list[dict[str, Any]]) -> None:
+        for segment in segments:
+            for path in self._segment_paths(segment["name"]):
+                path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _validated(prices: pd.DataFrame) -> pd.DataFrame:
+        assert isinstance(prices.index, pd.DatetimeIndex), "prices must be indexed by date"
+        assert prices.index.is_monotonic_increasing, "prices must be sorted by date"
+        assert not prices.index.has_duplicates, "prices has duplicated dates"
+        return prices
+
+    @staticmethod
+    def _observed_dates(last_observed: dict[str, pd.Timestamp] | None) -> dict[str, str]:
+        return {str(ticker) : pd.Timestamp(date).isoformat() for ticker, date in (last_observed or {}).items()}
+
+    def write(
+            self,
+            prices: pd.DataFrame,
+            last_observed: dict[str, pd.Timestamp] | None = None,
+    ) -> None:
+        # replaces whatever the store held with a single segment
+        prices = self._validated(prices)
+        self.root.mkdir(parents=True, exist_ok=True)
+        previous = self._read_meta()["segments"] if self.exists() else []
+        name = f"{max([int(s['name']) for s in previous], default=-1) + 1:05d}"
+
+        segment = self._write_segment(name, prices)
+        self._write_meta({
+            "version" : self.VERSION,
+            "tickers" : [str(ticker) for ticker in prices.columns],
+            "segments" : [segment],
+            "last_observed" : self._observed_dates(last_observed),
+        })
+        self._remove_segments(previous)
+
+    def append(
+            self,
+            prices: pd.DataFrame,
+            last_observed: dict[str, pd.Timestamp] | None = None,
+    ) -> None:
+        # adds rows strictly after the last stored date as a new segment
+        prices = self._validated(prices)
+        if not self.exists():
+            self.write(prices, last_observed)
+            return
+
+        meta = self._read_meta()
+        assert set(prices.columns) == set(meta["tickers"]), "appended tickers differ from the store"
+        assert prices.index[0] > pd.Timestamp(meta["segments"][-1]["end"]), "appended rows overlap the store"
+
+        name = f"{int(meta['segments'][-1]['name']) + 1:05d}"
+        meta["segments"].append(self._write_segment(name, prices[meta["tickers"]]))
+        meta.setdefault("last_observed", {}).update(self._observed_dates(last_observed))
+        self._write_meta(meta)
+
+    def truncate(self, start: Any) -> None:
+        # drops every row on or after start, only the segment straddling start is rewritten
+        meta = self._read_meta()
+        start = pd.Timestamp(start)
+        kept : list[dict[str, Any]] = []
+        dropped : list[dict[str, Any]] = []
+        next_name = int(meta["segments"][-1]["name"]) + 1
+
+        for segment in meta["segments"]:
+            if pd.Timestamp(segment["end"]) < start:
+                kept.append(segment)
+                continue
+
+            dropped.append(segment)
+            if pd.Timestamp(segment["start"]) < start:
+                values_path, dates_path = self._segment_paths(segment["name"])
+                dates = np.load(dates_path)
+                rows = int(np.searchsorted(dates, start.value, side="left"))
+                head = pd.DataFrame(
+                    np.load(values_path, mmap_mode="r")[:rows],
+                    index=pd.DatetimeIndex(dates[:rows].astype("datetime64[ns]"), name="Date"),
+                    columns=meta["tickers"],
+                )
+                kept.append(self._write_segment(f"{next_name:05d}", head))
+                next_name += 1
+
+        assert kept, "truncate would empty the store, use write instead"
+        meta["segments"] = kept
+        self._write_meta(meta)
+        self._remove_segments(dropped)
+
+    def _columns(self, meta: dict[str, Any], tickers: list[str] | None) -> tuple[list[int] | None, list[str]]:
+        stored : list[str] = meta["tickers"]
+        if tickers is None:
+            return None, stored
+        positions = {ticker: i for i, ticker in enumerate(stored)}
+        missing = [ticker for ticker in tickers if ticker not in positions]
+        assert not missing, f"tickers not in the store: {missing}"
+        return [positions[ticker] for ticker in tickers], list(tickers)
+
+    def _segment_parts(
+            self,
+            meta: dict[str, Any],
+            columns: list[int] | None,
+            start: Any,
+            end: Any,
+    ) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        # (values, dates) of every segment overlapping [start, end], memory-mapped
+        start_ns = pd.Timestamp(start).value if start is not None else None
+        end_ns = pd.Timestamp(end).value if end is not None else None
+        for segment in meta["segments"]:
+            if start_ns is not None and pd.Timestamp(segment["end"]).value < start_ns:
+                continue
+            if end_ns is not None and pd.Timestamp(segment["start"]).value > end_ns:
+                continue
+
+            values_path, dates_path = self._segment_paths(segment["name"])
+            dates = np.load(dates_path, mmap_mode="c")
+            first = 0 if start_ns is None else int(np.searchsorted(dates, start_ns, side="left"))
+            last = len(dates) if end_ns is None else int(np.searchsorted(dates, end_ns, side="right"))
+
+            values = np.load(values_path, mmap_mode="c")[first:last]
+            if columns is not None:
+                values = values[:, columns]
+            yield values, np.asarray(dates[first:last])
+
+    @staticmethod
+    def _frame(values: np.ndarray, dates: np.ndarray, names: list[str]) -> pd.DataFrame:
+        index = pd.DatetimeIndex(dates.astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame(values, index=index, columns=pd.Index(names), copy=False)
+
+    def read(
+            self,
+            tickers: list[str] | None = None,
+            start: Any = None,
+            end: Any = None,
+    ) -> pd.DataFrame:
+        '''
+        prices for the requested tickers between start and end inclusive, all of them by default
+        '''
+        meta = self._read_meta()
+        columns, names = self._columns(meta, tickers)
+        parts = list(self._segment_parts(meta, columns, start, end))
+
+        if not parts:
+            values = np.empty((0, len(names)))
+            dates = np.empty(0, dtype=np.int64)
+        elif len(parts) == 1:
+            values, dates = parts[0]
+        else:
+            values = np.concatenate([values for values, _ in parts])
+            dates = np.concatenate([dates for _, dates in parts])
+        return self._frame(values, dates, names)
+
+    def iter_segments(
+            self,
+            tickers: list[str] | None = None,
+            start: Any = None,
+            end: Any = None,
+    ) -> Iterator[pd.DataFrame]:
+        '''
+        read's rows one segment at a time, each frame a view of its memory-mapped segment, so
+        a panel grown by many appends is never copied into one array
+        '''
+        meta = self._read_meta()
+        columns, names = self._columns(meta, tickers)
+        for values, dates in self._segment_parts(meta, columns, start, end):
+            yield self._frame(values, dates, names)
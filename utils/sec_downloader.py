@@ -0,0 +1,256 @@
+import abc
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+
+# SEC fair access policy allows 10 requests per second per client, stay a little under it
+SEC_REQUESTS_PER_SECOND : float = 8.0
+RETRY_STATUSES : frozenset[int] = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    '''
+    thread-safe token bucket, acquire blocks until a token is free so every thread together
+    stays under rate requests per second with bursts of at most capacity
+    '''
+
+    def __init__(
+            self,
+            rate: float,
+            capacity: float = 1.0,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__tokens = capacity
+        self.__updated = clock()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.__lock:
+                now = self.__clock()
+                self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.rate)
+                self.__updated = now
+                # tolerance so float rounding right below one token cannot spin forever
+                if self.__tokens >= 1 - 1e-9:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.rate
+            self.__sleep(wait)
+
+
+class HttpClient(abc.ABC):
+    '''
+    transport the downloader talks through, get returns (status code, body) and only raises
+    on connection level failures
+    '''
+
+    @abc.abstractmethod
+    def get(self, url: str, headers: dict[str, str]) -> tuple[int, bytes]:
+        raise NotImplementedError
+
+
+class UrllibHttpClient(HttpClient):
+
+    def __init__(self, timeout: float = 30.0) -> None:
+        self.timeout = timeout
+
+    def get(self, url: str, headers: dict[str, str]) -> tuple[int, bytes]:
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class FilingJob(NamedTuple):
+    ticker: str
+    cik: int
+    form_type: str
+    accession: str
+    filing_date: str
+
+
+class DownloadReport:
+
+    def __init__(self) -> None:
+        self.requests : int = 0
+        self.retries : int = 0
+        self.downloaded : int = 0
+        self.skipped : int = 0
+        self.failed : list[tuple[str, str]] = []
+        self.bytes : int = 0
+        self.started : float = time.perf_counter()
+        self.finished : float | None = None
+        self.lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def summary(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"{self.downloaded} downloaded, {self.skipped} skipped, {len(self.failed)} failed | "
+            f"{self.requests} requests ({self.retries} retries) in {elapsed:.1f}s | "
+            f"{self.requests / elapsed:.2f} req/s, {self.bytes / elapsed / 1e6:.2f} MB/s"
+        )
+
+
+class SecFilingDownloader:
+    '''
+    concurrent EDGAR full-submission downloader writing the sec_edgar_downloader layout
+    <filings_root>/<TICKER>/<FORM>/<ACCESSION>/full-submission.txt
+
+    every request, from any worker, goes through one token bucket, so a full refresh is bound
+    by the SEC rate cap rather than by serial latency. filings already on disk are skipped and
+    downloads land through a .part file, so an interrupted run resumes where it stopped
+    '''
+
+    def __init__(
+            self,
+            user_agent: str,
+            filings_root: Path | str,
+            http_client: HttpClient | None = None,
+            max_workers: int = 8,
+            requests_per_second: float = SEC_REQUESTS_PER_SECOND,
+            max_retries: int = 5,
+            backoff_seconds: float = 0.5,
+            sec_url: str = "https://www.sec.gov",
+            data_url: str = "https://data.sec.gov",
+            progress: Callable[[str], None] | None = print,
+            progress_every: int = 25,
+    ) -> None:
+        self.filings_root = Path(filings_root)
+        self.http_client = http_client or UrllibHttpClient()
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sec_url = sec_url.rstrip("/")
+        self.data_url = data_url.rstrip("/")
+        self.progress = progress
+        self.progress_every = progress_every
+        self.__headers = {"User-Agent" : user_agent, "Accept-Encoding" : "identity"}
+        self.__bucket = TokenBucket(requests_per_second)
+
+    def _get(self, url: str, report: DownloadReport) -> bytes:
+        for attempt in range(self.max_retries + 1):
+            self.__bucket.acquire()
+            with report.lock:
+                report.requests += 1
+                report.retries += attempt > 0
+
+            try:
+                status, body = self.http_client.get(url, self.__headers)
+            except OSError as e:
+                status, body = None, str(e).encode()
+
+            if status == 200:
+                return body
+            if status is not None and status not in RETRY_STATUSES:
+                raise RuntimeError(f"GET {url} returned {status}")
+            if attempt < self.max_retries:
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+        raise RuntimeError(f"GET {url} failed after {self.max_retries + 1} attempts: {status}")
+
+    def _get_json(self, url: str, report: DownloadReport) -> Any:
+        return json.loads(self._get(url, report))
+
+    def ticker_ciks(self, report: DownloadReport) -> dict[str, int]:
+        companies = self._get_json(f"{self.sec_url}/files/company_tickers.json", report)
+        return {entry["ticker"].upper() : int(entry["cik_str"]) for entry in companies.values()}
+
+    def list_filings(
+            self,
+            ticker: str,
+            cik: int,
+            form_type: str,
+            after: date,
+            report: DownloadReport,
+    ) -> list[FilingJob]:
+        submissions = self._get_json(f"{self.data_url}/submissions/CIK{cik:010d}.json", report)
+        # recent holds the latest ~1000 filings, older ones are paged into extra files
+        pages = [submissions["filings"]["recent"]] + [
+            self._get_json(f"{self.data_url}/submissions/{page['name']}", report)
+            for page in submissions["filings"].get("files", [])
+        ]
+
+        jobs : list[FilingJob] = []
+        for page in pages:
+            for accession, form, filing_date in zip(page["accessionNumber"], page["form"], page["filingDate"]):
+                if form == form_type and date.fromisoformat(filing_date) > after:
+                    jobs.append(FilingJob(ticker, cik, form_type, accession, filing_date))
+        return jobs
+
+    def filing_path(self, job: FilingJob) -> Path:
+        return self.filings_root / job.ticker / job.form_type / job.accession / "full-submission.txt"
+
+    def _download_filing(self, job: FilingJob, report: DownloadReport) -> None:
+        path = self.filing_path(job)
+        if path.exists():
+            with report.lock:
+                report.skipped += 1
+            return
+
+        url = f"{self.sec_url}/Archives/edgar/data/{job.cik}/{job.accession.replace('-', '')}/{job.accession}.txt"
+        body = self._get(url, report)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".txt.part")
+        partial.write_bytes(body)
+        os.replace(partial, path)
+        with report.lock:
+            report.downloaded += 1
+            report.bytes += len(body)
+
+    def download(
+            self,
+            tickers: list[str],
+            form_type: str = "10-K",
+            after: date = date(2005, 12, 1),
+    ) -> DownloadReport:
+        report = DownloadReport()
+        ciks = self.ticker_ciks(report)
+        for ticker in tickers:
+            if ticker.upper() not in ciks:
+                report.failed.append((ticker, "ticker not in SEC company list"))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            listings = {
+                pool.submit(self.list_filings, ticker, ciks[ticker.upper()], form_type, after, report) : ticker
+                for ticker in tickers
+                if ticker.upper() in ciks
+            }
+            jobs : list[FilingJob] = []
+            for future in as_completed(listings):
+                try:
+                    jobs.extend(future.result())
+                except Exception as e:
+                    report.failed.append((listings[future], str(e)))
+
+            downloads = {pool.submit(self._download_filing, job, report) : job for job in jobs}
+            for done, future in enumerate(as_completed(downloads), start=1):
+                try:
+                    future.result()
+                except Exception as e:
+                    report.failed.append((downloads[future].accession, str(e)))
+
+                if self.progress is not None and (done % self.progress_every == 0 or done == len(jobs)):
+                    self.progress(f"[SEC] {done}/{len(jobs)} filings | {report.summary()}")
+
+        report.finished = time.perf_counter()
+        return report
@@ -0,0 +1,188 @@
+import hashlib
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+
+# 1 GiB of compressed sections covers every 10-K of a few hundred tickers
+DEFAULT_MAX_BYTES : int = 1 << 30
+
+
+class SectionCache:
+    '''
+    persistent cache of text sections extracted from filings, keyed by (accession, section)
+
+    section text is stored content-addressed as zlib blobs under <root>/<digest[:2]>/<digest>.z,
+    so the same text shared by several filings is written once, and a sqlite index maps each
+    accession to its blob. filings never change once published, so entries are never invalidated,
+    only evicted least recently used first once the blobs outgrow max_bytes. a section the filing
+    does not have is cached as None so it is not parsed again either
+    '''
+
+    def __init__(
+            self,
+            root: Path | str,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.root = Path(root)
+        self.database = self.root / "index.sqlite"
+        self.max_bytes = max_bytes
+
+    def _connect(self) -> sqlite3.Connection:
+        self.root.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.database)
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sections (
+                accession TEXT NOT NULL,
+                section TEXT NOT NULL,
+                digest TEXT,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (accession, section)
+            )
+            """
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)"
+        )
+        return connection
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.z"
+
+    def get_many(
+            self,
+            accessions: list[str],
+            section: str,
+    ) -> dict[str, str | None]:
+        '''
+        cached text for every accession that has an entry, missing accessions are left out
+        '''
+        if not accessions or not self.database.exists():
+            return {}
+
+        connection = self._connect()
+        try:
+            found : dict[str, str | None] = {}
+            hits : list[tuple[float, str, str]] = []
+            now = time.time()
+            for accession in accessions:
+                row = connection.execute(
+                    "SELECT digest FROM sections WHERE accession = ? AND section = ?", (accession, section)
+                ).fetchone()
+                if row is None:
+                    continue
+
+                digest = row[0]
+                if digest is None:
+                    found[accession] = None
+                else:
+                    path = self._blob_path(digest)
+                    if not path.exists():
+                        continue
+                    found[accession] = zlib.decompress(path.read_bytes()).decode("utf-8")
+                hits.append((now, accession, section))
+
+            with connection:
+                connection.executemany(
+                    "UPDATE sections SET last_access = ? WHERE accession = ? AND section = ?", hits
+                )
+        finally:
+            connection.close()
+        return found
+
+    def get(
+            self,
+            accession: str,
+            section: str,
+    ) -> tuple[bool, str | None]:
+        found = self.get_many([accession], section)
+        return accession in found, found.get(accession)
+
+    def put_many(
+            self,
+            texts: dict[str, str | None],
+            section: str,
+    ) -> None:
+        if not texts:
+            return
+
+        connection = self._connect()
+        try:
+            now = time.time()
+            rows : list[tuple[str, str, str | None, float]] = []
+            blobs : list[tuple[str, int]] = []
+            for accession, text in texts.items():
+                if text is None:
+                    rows.append((accession, section, None, now))
+                    continue
+
+                encoded = text.encode("utf-8")
+                digest = hashlib.sha256(encoded).hexdigest()
+                path = self._blob_path(digest)
+                if not path.exists():
+                    compressed = zlib.compress(encoded, 6)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    partial = path.with_suffix(".part")
+                    partial.write_bytes(compressed)
+                    partial.replace(path)
+                    blobs.append((digest, len(compressed)))
+                rows.append((accession, section, digest, now))
+
+            with connection:
+                connection.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?)", blobs)
+                connection.executemany("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?)", rows)
+            self._evict(connection)
+        finally:
+            connection.close()
+
+    def put(
+            self,
+            accession: str,
+            section: str,
+            text: str | None,
+    ) -> None:
+        self.put_many({accession : text}, section)
+
+    def size_bytes(self) -> int:
+        if not self.database.exists():
+            return 0
+
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        finally:
+            connection.close()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        sizes = dict(connection.execute("SELECT digest, size FROM blobs"))
+        entries = connection.execute(
+            "SELECT accession, section, digest FROM sections WHERE digest IS NOT NULL ORDER BY last_access"
+        ).fetchall()
+        references : dict[str, int] = {}
+        for _, _, digest in entries:
+            references[digest] = references.get(digest, 0) + 1
+
+        dropped_entries : list[tuple[str, str]] = []
+        # orphaned blobs go first, they cost disk and nothing points at them
+        dropped_blobs : list[str] = [digest for digest in sizes if digest not in references]
+        total -= sum(sizes[digest] for digest in dropped_blobs)
+        for accession, section, digest in entries:
+            if total <= self.max_bytes:
+                break
+            dropped_entries.append((accession, section))
+            references[digest] -= 1
+            if references[digest] == 0:
+                dropped_blobs.append(digest)
+                total -= sizes[digest]
+
+        with connection:
+            connection.executemany("DELETE FROM sections WHERE accession = ? AND section = ?", dropped_entries)
+            connection.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest in dropped_blobs])
+        for digest in dropped_blobs:
+            self._blob_path(digest).unlink(missing_ok=True)
@@ -0,0 +1,98 @@
+import sys
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from multiprocessing import get_context, shared_memory
+from typing import Any
+
+import numpy as np
+
+
+class SharedArray:
+    '''
+    numpy array copied once into a named shared memory block so process pool workers
+    can map it instead of unpickling a copy per task
+
+    the creating process owns the block and unlinks it on close, workers only attach
+    '''
+
+    def __init__(self, source: np.ndarray) -> None:
+        source = np.ascontiguousarray(source)
+        self.shape: tuple[int, ...] = source.shape
+        self.dtype: np.dtype = source.dtype
+        self.__memory = shared_memory.SharedMemory(create=True, size=max(source.nbytes, 1))
+        self.array: np.ndarray = np.ndarray(self.shape, dtype=self.dtype, buffer=self.__memory.buf)
+        self.array[...] = source
+
+    @property
+    def name(self) -> str:
+        return self.__memory.name
+
+    def spec(self) -> tuple[str, tuple[int, ...], str]:
+        # picklable handle for pool initializers
+        return self.name, self.shape, self.dtype.str
+
+    def close(self) -> None:
+        del self.array
+        self.__memory.close()
+        self.__memory.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def attach_shared_array(
+        spec: tuple[str, tuple[int, ...], str]
+) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    # the memory handle has to outlive the array view, callers keep both
+    name, shape, dtype = spec
+    if sys.version_info >= (3, 13):
+        memory = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        # pool workers share the creator's resource tracker, registering again is a no-op there
+        memory = shared_memory.SharedMemory(name=name)
+
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
+    array.flags.writeable = False
+    return memory, array
+
+
+# arrays a shared_array_pool worker attached at start up, with the memory handles they live in
+_worker_memory: list[shared_memory.SharedMemory] = []
+_worker_arrays: dict[str, np.ndarray] = {}
+
+
+def _attach_worker_arrays(specs: dict[str, tuple[str, tuple[int, ...], str]]) -> None:
+    for name, spec in specs.items():
+        memory, _worker_arrays[name] = attach_shared_array(spec)
+        _worker_memory.append(memory)
+
+
+def worker_array(name: str) -> np.ndarray:
+    # read-only view of one of the arrays handed to shared_array_pool, inside its workers
+    return _worker_arrays[name]
+
+
+@contextmanager
+def shared_array_pool(
+        arrays: dict[str, np.ndarray],
+        max_workers: int,
+) -> Iterator[ProcessPoolExecutor]:
+    '''
+    process pool whose workers map arrays from shared memory instead of receiving copies,
+    tasks read them by name with worker_array. the arrays are copied into shared memory once
+    and released after the pool shut down. workers are spawned rather than forked, since the
+    parent already runs multi-threaded BLAS
+    '''
+    with ExitStack() as stack:
+        shared = {name : stack.enter_context(SharedArray(values)) for name, values in arrays.items()}
+        with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=get_context("spawn"),
+                initializer=_attach_worker_arrays,
+                initargs=({name : array.spec() for name, array in shared.items()},),
+        ) as pool:
+            yield pool
@@ -0,0 +1,114 @@
+from typing import Any, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+# words that give synthetic risk factor sections the feel of the real ones
+RISK_VOCABULARY : tuple[str, ...] = (
+    "competition", "regulation", "regulatory", "supply", "chain", "litigation", "interest", "rates",
+    "currency", "exchange", "cybersecurity", "breach", "pandemic", "climate", "tariffs", "liquidity",
+    "credit", "demand", "pricing", "labor", "inflation", "recession", "geopolitical", "sanctions",
+    "intellectual", "property", "patents", "suppliers", "customers", "capital", "debt", "covenants",
+    "impairment", "goodwill", "taxation", "compliance", "environmental", "weather", "commodity",
+    "volatility", "reputation", "personnel", "acquisitions", "integration", "technology", "outages",
+)
+
+
+class PlantedPair(NamedTuple):
+    dependent: str
+    independent: str
+    constant: float
+    hedge_ratio: float
+
+
+def synthetic_prices(
+        n_tickers : int,
+        n_days : int,
+        n_planted_pairs : int | None = None,
+        seed : int = 0,
+        start : str = "2015-01-02",
+        mean_reversion : float = 0.9,
+) -> tuple[pd.DataFrame, list[PlantedPair]]:
+    '''
+    seeded (Date, ticker) close panel shaped like load_data_nyse, log prices are random walks
+    except for n_planted_pairs (default a tenth of the tickers, paired off) whose dependent leg
+    is constant + hedge_ratio * independent + an AR(1) residual, so they are cointegrated by
+    construction
+    '''
+    rng = np.random.default_rng(seed)
+    n_planted_pairs = n_tickers // 10 if n_planted_pairs is None else n_planted_pairs
+    assert 2 * n_planted_pairs <= n_tickers, f"Cannot plant {n_planted_pairs} pairs in {n_tickers} tickers"
+
+    log_prices = np.cumsum(rng.normal(0.0002, 0.015, size=(n_days, n_tickers)), axis=0)
+    log_prices += rng.uniform(2.0, 5.0, size=n_tickers)
+
+    tickers = [f"S{i:04d}" for i in range(n_tickers)]
+    planted : list[PlantedPair] = []
+    if n_planted_pairs:
+        shocks = rng.normal(0, 0.01, size=(n_days, n_planted_pairs))
+        residuals = np.zeros_like(shocks)
+        for t in range(1, n_days):
+            residuals[t] = mean_reversion * residuals[t - 1] + shocks[t]
+
+        hedge_ratios = rng.uniform(0.5, 1.5, n_planted_pairs)
+        constants = rng.uniform(-0.5, 0.5, n_planted_pairs)
+        dependents = np.arange(0, 2 * n_planted_pairs, 2)
+        independents = dependents + 1
+        log_prices[:, dependents] = constants + hedge_ratios * log_prices[:, independents] + residuals
+        planted = [
+            PlantedPair(tickers[a], tickers[b], float(c), float(beta))
+            for a, b, c, beta in zip(dependents, independents, constants, hedge_ratios)
+        ]
+
+    dates = pd.bdate_range(start, periods=n_days, name="Date")
+    return pd.DataFrame(np.exp(log_prices), index=dates, columns=tickers), planted
+
+
+def _paragraph(
+        rng : np.random.Generator,
+        vocabulary : np.ndarray,
+        weights : np.ndarray,
+        n_words : int,
+) -> str:
+    return " ".join(rng.choice(vocabulary, size=n_words, p=weights)).capitalize() + "."
+
+
+def synthetic_filings(
+        n_tickers : int,
+        filings_per_ticker : int = 4,
+        paragraphs_per_filing : int = 12,
+        words_per_paragraph : int = 60,
+        changed_fraction : float = 0.2,
+        seed : int = 0,
+        first_year : int = 2010,
+) -> list[dict[str, Any]]:
+    '''
+    seeded risk factor rows shaped like NLPExtractor.extract_features_from_edgar_tools output
+
+    like real 10-Ks each ticker's section is mostly carried over from the previous year: every
+    year changed_fraction of the paragraphs are rewritten and paragraphs are separated by blank
+    lines. words follow a Zipf law over RISK_VOCABULARY plus generated filler terms
+    '''
+    rng = np.random.default_rng(seed)
+    filler = ["".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz"), rng.integers(4, 10))) for _ in range(3000)]
+    vocabulary = np.array(list(RISK_VOCABULARY) + filler)
+    weights = 1 / np.arange(1, vocabulary.size + 1) ** 1.1
+    weights /= weights.sum()
+
+    rows : list[dict[str, Any]] = []
+    for ticker in range(n_tickers):
+        paragraphs = [_paragraph(rng, vocabulary, weights, words_per_paragraph) for _ in range(paragraphs_per_filing)]
+        cik = 1_000_000 + ticker
+        for filing in range(filings_per_ticker):
+            if filing:
+                for position in np.flatnonzero(rng.random(paragraphs_per_filing) < changed_fraction):
+                    paragraphs[position] = _paragraph(rng, vocabulary, weights, words_per_paragraph)
+            year = first_year + filing
+            rows.append({
+                "filing_date" : f"{year + 1}-02-15",
+                "report_date" : f"{year}-12-31",
+                "accession_number" : f"{cik:010d}-{(year + 1) % 100:02d}-{ticker:06d}",
+                "risk_factor" : "\n\n".join(paragraphs),
+            })
+    return rows